@@ -0,0 +1,106 @@
+"""
+Micro-benchmark for the TF-IDF baseline scoring paths.
+
+Compares the original cosine_similarity + argsort implementation (score_dense)
+with the sparse vector-matrix + argpartition engine (score_sparse) and the
+MaxScore inverted-index engine on synthetic L2-normalized TF-IDF matrices, and
+checks that all of them return the same ranking.
+
+Usage:
+    python benchmarks/bench_baseline_topk.py
+"""
+
+import os
+import sys
+import time
+import numpy as np
+import scipy.sparse as sp
+from sklearn.preprocessing import normalize
+
+# Add the project root to Python path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.baseline import score_dense, score_sparse
+from src.inverted_index import InvertedIndex
+
+# --- Configuration ---
+CORPUS_SIZES = [10_000, 100_000, 1_000_000]
+VOCAB_SIZE = 50_000
+TERMS_PER_DOC = 30
+TERMS_PER_QUERY = 4
+N_QUERIES = 20
+N_RESULTS = 10
+SEED = 42
+
+
+def make_tfidf_matrix(n_docs: int, rng: np.random.Generator) -> sp.csr_matrix:
+    """Builds a random N x V CSR matrix with Zipf-distributed terms and L2-normalized rows."""
+    term_probs = 1.0 / np.arange(1, VOCAB_SIZE + 1)
+    term_probs /= term_probs.sum()
+
+    indices = rng.choice(VOCAB_SIZE, size=n_docs * TERMS_PER_DOC, p=term_probs).astype(np.int32)
+    data = rng.random(n_docs * TERMS_PER_DOC).astype(np.float64)
+    indptr = np.arange(0, n_docs * TERMS_PER_DOC + 1, TERMS_PER_DOC, dtype=np.int64)
+
+    matrix = sp.csr_matrix((data, indices, indptr), shape=(n_docs, VOCAB_SIZE))
+    matrix.sum_duplicates()
+    return normalize(matrix, norm='l2', copy=False)
+
+
+def make_queries(rng: np.random.Generator) -> list:
+    """Builds N_QUERIES random 1 x V L2-normalized query vectors."""
+    queries = []
+    for _ in range(N_QUERIES):
+        terms = rng.choice(VOCAB_SIZE // 10, size=TERMS_PER_QUERY, replace=False)
+        row = sp.csr_matrix(
+            (rng.random(TERMS_PER_QUERY), (np.zeros(TERMS_PER_QUERY, dtype=np.int32), terms)),
+            shape=(1, VOCAB_SIZE)
+        )
+        queries.append(normalize(row, norm='l2', copy=False))
+    return queries
+
+
+def time_queries(score_fn, queries, matrix) -> tuple[float, list]:
+    """Returns the mean latency in milliseconds and the per-query results."""
+    results = []
+    start = time.perf_counter()
+    for query_vector in queries:
+        results.append(score_fn(query_vector, matrix, N_RESULTS))
+    elapsed = time.perf_counter() - start
+    return elapsed / len(queries) * 1000, results
+
+
+def main():
+    rng = np.random.default_rng(SEED)
+    queries = make_queries(rng)
+
+    print("-" * 72)
+    print(f"{'docs':>10} {'dense (ms)':>12} {'sparse (ms)':>12} {'inverted (ms)':>14} {'speedup':>9} {'same':>6}")
+    print("-" * 72)
+
+    for n_docs in CORPUS_SIZES:
+        tfidf_matrix = make_tfidf_matrix(n_docs, rng)
+        term_doc_matrix = tfidf_matrix.T.tocsr()
+        inverted = InvertedIndex.from_term_doc_matrix(term_doc_matrix)
+
+        dense_ms, dense_results = time_queries(score_dense, queries, tfidf_matrix)
+        sparse_ms, sparse_results = time_queries(score_sparse, queries, term_doc_matrix)
+        inverted_ms, inverted_results = time_queries(
+            lambda query_vector, index, k: index.search(query_vector.indices, query_vector.data, k),
+            queries, inverted
+        )
+
+        same = all(
+            np.array_equal(d_idx, s_idx) and np.allclose(d_scores, s_scores)
+            and np.array_equal(s_idx, i_idx) and np.allclose(s_scores, i_scores)
+            for (d_idx, d_scores), (s_idx, s_scores), (i_idx, i_scores)
+            in zip(dense_results, sparse_results, inverted_results)
+        )
+        speedup = dense_ms / min(sparse_ms, inverted_ms)
+        print(f"{n_docs:>10} {dense_ms:>12.3f} {sparse_ms:>12.3f} {inverted_ms:>14.3f} {speedup:>8.1f}x {str(same):>6}")
+
+    print("-" * 72)
+
+
+if __name__ == "__main__":
+    main()
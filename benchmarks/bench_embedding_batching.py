@@ -0,0 +1,103 @@
+"""
+Benchmark for the corpus embedding batching strategies on CPU.
+
+Compares the original loop (fixed batches of 64 documents in file order, each
+padded to its longest member) with length-sorted batches under a padded-token
+budget (wsl_scripts/embeddings.py). Reports documents/sec and the fraction of
+encoded tokens that are padding, and checks that both produce the same
+embeddings once the sorted output is put back in file order.
+
+Uses the first N_DOCS documents of the cleaned corpus, or synthetic documents
+with a long-tailed length distribution if the corpus has not been built.
+
+Usage:
+    python benchmarks/bench_embedding_batching.py
+"""
+
+import os
+import sys
+import time
+import numpy as np
+import torch
+from transformers import AutoTokenizer, AutoModel
+
+# Add the project root to Python path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.utils import mean_pooling, iter_jsonl, token_budget_batches, padding_ratio, get_data_path, \
+    MODEL_NAME, CLEAN_DATA_FILE
+
+# --- Configuration ---
+N_DOCS = 1024
+FIXED_BATCH_SIZE = 64
+TOKEN_BUDGETS = [4096, 8192, 16384]
+MAX_BATCH_SIZE = 256
+MAX_LENGTH = 512
+SEED = 42
+
+
+def load_texts() -> list:
+    """Returns N_DOCS corpus documents, or synthetic ones if the corpus is missing."""
+    path = get_data_path(CLEAN_DATA_FILE)
+    if os.path.exists(path):
+        texts = []
+        for record in iter_jsonl(path):
+            texts.append(record['text'])
+            if len(texts) == N_DOCS:
+                break
+        return texts
+
+    rng = np.random.default_rng(SEED)
+    words = ["model", "data", "regression", "variance", "gradient", "feature", "cluster", "learning"]
+    word_counts = np.clip(rng.lognormal(mean=3.5, sigma=0.8, size=N_DOCS), 20, 600).astype(int)
+    return [" ".join(rng.choice(words, size=n)) for n in word_counts]
+
+
+def encode(model, tokenizer, encoded, batches, n_docs) -> tuple[float, np.ndarray]:
+    """Encodes the batches; returns the elapsed seconds and the embeddings in input order."""
+    output = np.zeros((n_docs, model.config.hidden_size), dtype=np.float32)
+    start = time.perf_counter()
+    for batch in batches:
+        inputs = tokenizer.pad({key: [encoded[key][i] for i in batch] for key in encoded.keys()},
+                               return_tensors='pt')
+        with torch.no_grad():
+            outputs = model(**inputs)
+        output[batch] = mean_pooling(outputs, inputs['attention_mask']).numpy()
+    return time.perf_counter() - start, output
+
+
+def main():
+    texts = load_texts()
+    tokenizer = AutoTokenizer.from_pretrained(MODEL_NAME)
+    model = AutoModel.from_pretrained(MODEL_NAME)
+    model.eval()
+
+    encoded = tokenizer(texts, truncation=True, max_length=MAX_LENGTH)
+    lengths = [len(input_ids) for input_ids in encoded['input_ids']]
+    print(f"{len(texts)} documents, {sum(lengths)} tokens, median length {int(np.median(lengths))}, "
+          f"max {max(lengths)}, torch threads {torch.get_num_threads()}")
+
+    # Warm up the model so the first strategy is not charged for lazy initialization
+    encode(model, tokenizer, encoded, [np.arange(min(8, len(texts)))], len(texts))
+
+    fixed = [np.arange(i, min(i + FIXED_BATCH_SIZE, len(texts))) for i in range(0, len(texts), FIXED_BATCH_SIZE)]
+    strategies = [(f"fixed {FIXED_BATCH_SIZE} (file order)", fixed)]
+    for budget in TOKEN_BUDGETS:
+        strategies.append((f"token budget {budget}", token_budget_batches(lengths, budget, MAX_BATCH_SIZE)))
+
+    print("-" * 78)
+    print(f"{'strategy':<28} {'batches':>8} {'padding':>9} {'docs/sec':>10} {'speedup':>9} {'max |diff|':>11}")
+    print("-" * 78)
+    reference = None
+    for name, batches in strategies:
+        elapsed, output = encode(model, tokenizer, encoded, batches, len(texts))
+        if reference is None:
+            reference, reference_elapsed = output, elapsed
+        diff = np.abs(output - reference).max()
+        print(f"{name:<28} {len(batches):>8} {padding_ratio(lengths, batches):>8.1%} "
+              f"{len(texts) / elapsed:>10.1f} {reference_elapsed / elapsed:>8.2f}x {diff:>11.2e}")
+    print("-" * 78)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,99 @@
+"""
+Scaling benchmark for multi-process CPU embedding (wsl_scripts/embeddings.py).
+
+Embeds the same N_DOCS documents with every (workers, threads per worker)
+layout that fits in the machine's cores, and reports documents/sec, the
+speedup over one worker using all cores, and whether the merged matrix
+matches the single-process one. Run it on the embedding machine and set
+EMBED_WORKERS / EMBED_THREADS to the fastest layout.
+
+Uses the first N_DOCS documents of the cleaned corpus, or synthetic documents
+if the corpus has not been built.
+
+Usage:
+    python benchmarks/bench_embedding_workers.py
+"""
+
+import contextlib
+import io
+import json
+import os
+import sys
+import tempfile
+import time
+import numpy as np
+
+# Add the project root and the scripts directory to Python path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.append(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'wsl_scripts'))
+
+from embeddings import create_embeddings
+from src.embedding_artifact import MATRIX_FILE
+from src.utils import iter_jsonl, get_data_path, CLEAN_DATA_FILE
+
+# --- Configuration ---
+N_DOCS = 2048
+WORKER_COUNTS = [1, 2, 4, 8, 16]
+SEED = 42
+
+
+def write_corpus(path: str) -> None:
+    """Writes N_DOCS corpus documents (or synthetic ones) to a jsonl file."""
+    corpus_path = get_data_path(CLEAN_DATA_FILE)
+    if os.path.exists(corpus_path):
+        records = []
+        for record in iter_jsonl(corpus_path):
+            records.append({'id': record['id'], 'text': record['text']})
+            if len(records) == N_DOCS:
+                break
+    else:
+        rng = np.random.default_rng(SEED)
+        words = ["model", "data", "regression", "variance", "gradient", "feature", "cluster", "learning"]
+        word_counts = np.clip(rng.lognormal(mean=3.5, sigma=0.8, size=N_DOCS), 20, 600).astype(int)
+        records = [{'id': f"doc_{i}", 'text': " ".join(rng.choice(words, size=n))}
+                   for i, n in enumerate(word_counts)]
+
+    with open(path, 'w', encoding='utf-8') as f:
+        for record in records:
+            f.write(json.dumps(record) + '\n')
+
+
+def main():
+    cores = os.cpu_count() or 1
+    layouts = []
+    for workers in WORKER_COUNTS:
+        if workers > cores:
+            break
+        layouts.append((workers, cores // workers))
+        if workers > 1 and cores // workers > 1:
+            layouts.append((workers, 1))
+
+    with tempfile.TemporaryDirectory() as tmp:
+        input_path = os.path.join(tmp, "corpus.jsonl")
+        write_corpus(input_path)
+
+        print(f"{N_DOCS} documents, {cores} CPU cores")
+        print("-" * 64)
+        print(f"{'workers':>8} {'threads':>8} {'seconds':>9} {'docs/sec':>10} {'speedup':>9} {'same':>6}")
+        print("-" * 64)
+        reference = None
+        for workers, threads in layouts:
+            artifact_dir = os.path.join(tmp, f"embeddings_{workers}x{threads}")
+            start = time.perf_counter()
+            # Model loading is included: every worker pays it, so it is part of the cost of a layout
+            with contextlib.redirect_stdout(io.StringIO()):
+                version_dir = create_embeddings(input_path, artifact_dir, num_workers=workers,
+                                                threads_per_worker=threads, cache_path="")
+            elapsed = time.perf_counter() - start
+
+            output = np.load(os.path.join(version_dir, MATRIX_FILE))
+            if reference is None:
+                reference, reference_elapsed = output, elapsed
+            same = output.shape == reference.shape and np.allclose(output, reference, atol=1e-5)
+            print(f"{workers:>8} {threads:>8} {elapsed:>9.2f} {N_DOCS / elapsed:>10.1f} "
+                  f"{reference_elapsed / elapsed:>8.2f}x {str(same):>6}")
+        print("-" * 64)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,81 @@
+"""
+Throughput benchmark for ChromaDB ingestion (src/ingest.py) against the
+in-memory stub server.
+
+The stub charges a fixed round-trip latency per request plus a per-record
+cost, and a few requests fail on purpose, so the benchmark exercises the
+concurrent upserter's batching, adaptation and retries without a running
+ChromaDB. Reports records/sec of sequential fixed-size batches (the old
+ingest loop) against the concurrent, adaptive upserter, and checks that every
+record arrived.
+
+Usage:
+    python benchmarks/bench_ingest.py
+"""
+
+import os
+import sys
+import time
+import numpy as np
+
+# Add the project root to Python path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import src.ingest as ingest
+from src.chroma_stub import InMemoryChromaClient
+from src.ingest import ConcurrentUpserter
+
+# --- Configuration ---
+N_RECORDS = 20000
+DIMENSION = 384
+CHUNK_SIZE = 1000
+LATENCY = 0.02  # seconds per request
+LATENCY_PER_RECORD = 0.00002  # seconds per record written
+SERVER_MAX_BATCH_SIZE = 5000
+INJECTED_FAILURES = 3
+SEED = 42
+
+
+def make_records(n: int):
+    rng = np.random.default_rng(SEED)
+    embeddings = rng.standard_normal((n, DIMENSION)).astype(np.float32)
+    ids = [f"doc{i}" for i in range(n)]
+    documents = [f"document {i}" for i in range(n)]
+    metadatas = [{"content_hash": str(i)} for i in range(n)]
+    return [(ids[i:i + CHUNK_SIZE], documents[i:i + CHUNK_SIZE], embeddings[i:i + CHUNK_SIZE],
+             metadatas[i:i + CHUNK_SIZE]) for i in range(0, n, CHUNK_SIZE)]
+
+
+def run(label: str, records, **kwargs) -> None:
+    client = InMemoryChromaClient(latency=LATENCY, max_batch_size=SERVER_MAX_BATCH_SIZE,
+                                  latency_per_record=LATENCY_PER_RECORD)
+    collection = client.create_collection("bench")
+    client.fail_next(INJECTED_FAILURES)
+    stats = ConcurrentUpserter(collection, **kwargs).upsert(records)
+    ok = collection.count() == N_RECORDS
+    print(f"{label:<28} {stats['records_per_sec']:>12.0f} {stats['requests']:>9} {stats['retries']:>8} "
+          f"{stats['final_batch_size']:>11} {'yes' if ok else 'NO':>9}")
+
+
+def main():
+    records = make_records(N_RECORDS)
+    ingest.BACKOFF_INITIAL = 0.05  # keep injected failures from dominating the timings
+
+    print(f"{N_RECORDS} records, dim {DIMENSION}, stub latency {LATENCY * 1000:.0f} ms + "
+          f"{LATENCY_PER_RECORD * 1e6:.0f} us/record, server max batch {SERVER_MAX_BATCH_SIZE}")
+    print("-" * 82)
+    print(f"{'ingester':<28} {'records/sec':>12} {'requests':>9} {'retries':>8} {'final batch':>11} {'complete':>9}")
+    print("-" * 82)
+    start = time.perf_counter()
+    run("sequential, 100/batch", records, max_workers=1, initial_batch_size=100, max_batch_size=100)
+    run("sequential, adaptive", records, max_workers=1, initial_batch_size=100,
+        max_batch_size=SERVER_MAX_BATCH_SIZE, target_latency=0.1)
+    for workers in (2, 4, 8):
+        run(f"{workers} workers, adaptive", records, max_workers=workers, initial_batch_size=100,
+            max_batch_size=SERVER_MAX_BATCH_SIZE, target_latency=0.1)
+    print("-" * 82)
+    print(f"total {time.perf_counter() - start:.1f} s")
+
+
+if __name__ == "__main__":
+    main()
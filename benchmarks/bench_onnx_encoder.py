@@ -0,0 +1,103 @@
+"""
+Throughput benchmark for the encoder backends on CPU.
+
+Compares PyTorch, ONNX Runtime fp32 and ONNX Runtime int8 (src/onnx_encoder.py)
+on bulk encoding (batches of BULK_BATCH_SIZE documents, as in
+wsl_scripts/embeddings.py) and single-query latency (as in the query encoder),
+and reports the cosine deviation of each backend from PyTorch.
+
+Requires the exported models: python wsl_scripts/export_onnx.py
+
+Usage:
+    python benchmarks/bench_onnx_encoder.py
+"""
+
+import os
+import sys
+import time
+import numpy as np
+import torch
+from transformers import AutoTokenizer, AutoModel
+
+# Add the project root to Python path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.onnx_encoder import OnnxEncoder, cosine_deviation, ONNX_MODEL_DIR
+from src.utils import mean_pooling, iter_jsonl, get_data_path, MODEL_NAME, CLEAN_DATA_FILE
+
+# --- Configuration ---
+N_DOCS = 512
+BULK_BATCH_SIZE = 32
+N_QUERIES = 100
+MAX_LENGTH = 512
+SEED = 42
+
+
+def load_texts() -> list:
+    """Returns N_DOCS corpus documents, or synthetic ones if the corpus is missing."""
+    path = get_data_path(CLEAN_DATA_FILE)
+    if os.path.exists(path):
+        texts = []
+        for record in iter_jsonl(path):
+            texts.append(record['text'])
+            if len(texts) == N_DOCS:
+                break
+        return texts
+
+    rng = np.random.default_rng(SEED)
+    words = ["model", "data", "regression", "variance", "gradient", "feature", "cluster", "learning"]
+    return [" ".join(rng.choice(words, size=n)) for n in rng.integers(20, 200, size=N_DOCS)]
+
+
+def make_torch_encoder():
+    tokenizer = AutoTokenizer.from_pretrained(MODEL_NAME)
+    model = AutoModel.from_pretrained(MODEL_NAME)
+    model.eval()
+
+    def encode(texts):
+        inputs = tokenizer(texts, padding=True, truncation=True, return_tensors='pt', max_length=MAX_LENGTH)
+        with torch.no_grad():
+            return mean_pooling(model(**inputs), inputs['attention_mask']).numpy()
+    return encode
+
+
+def time_encoder(encode, texts, queries) -> tuple[float, float, np.ndarray]:
+    """Returns (bulk docs/sec, mean single-query latency in ms, bulk embeddings)."""
+    encode(texts[:BULK_BATCH_SIZE])  # warm-up
+    start = time.perf_counter()
+    embeddings = np.vstack([encode(texts[i:i + BULK_BATCH_SIZE]) for i in range(0, len(texts), BULK_BATCH_SIZE)])
+    docs_per_sec = len(texts) / (time.perf_counter() - start)
+
+    start = time.perf_counter()
+    for query in queries:
+        encode([query])
+    query_ms = (time.perf_counter() - start) * 1000 / len(queries)
+    return docs_per_sec, query_ms, embeddings
+
+
+def main():
+    texts = load_texts()
+    queries = [" ".join(text.split()[:8]) for text in texts[:N_QUERIES]]
+    backends = [
+        ("torch", make_torch_encoder()),
+        ("onnx", lambda batch, encoder=OnnxEncoder(ONNX_MODEL_DIR): encoder.encode(batch, MAX_LENGTH)),
+        ("onnx-int8", lambda batch, encoder=OnnxEncoder(ONNX_MODEL_DIR, quantized=True): encoder.encode(batch, MAX_LENGTH)),
+    ]
+
+    print(f"{len(texts)} documents, {len(queries)} queries, torch threads {torch.get_num_threads()}")
+    print("-" * 74)
+    print(f"{'backend':<10} {'docs/sec':>10} {'speedup':>9} {'query (ms)':>11} {'mean 1-cos':>12} {'max 1-cos':>11}")
+    print("-" * 74)
+    reference = None
+    for name, encode in backends:
+        docs_per_sec, query_ms, embeddings = time_encoder(encode, texts, queries)
+        if reference is None:
+            reference, reference_rate = embeddings, docs_per_sec
+        deviation = cosine_deviation(reference, embeddings)
+        print(f"{name:<10} {docs_per_sec:>10.1f} {docs_per_sec / reference_rate:>8.2f}x {query_ms:>11.2f} "
+              f"{deviation.mean():>12.2e} {deviation.max():>11.2e}")
+    print("-" * 74)
+
+
+if __name__ == "__main__":
+    main()
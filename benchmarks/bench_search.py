@@ -0,0 +1,403 @@
+"""
+Latency and load benchmark for the search paths.
+
+For every corpus size in BENCH_SCALES, generates a synthetic corpus (Zipf
+distributed words) and query set, builds the real on-disk indexes from it
+(the TF-IDF / BM25 index, an embeddings artifact, an in-memory ChromaDB
+stand-in holding the same embeddings) and drives every engine in ENGINES
+through the same functions the app calls:
+
+    cold start   loading the engine from disk plus its first query
+    memory       resident set size added by the engine
+    load         p50/p95/p99/max latency and QPS of N_QUERIES queries, issued
+                 one at a time and from CONCURRENCY client threads
+
+Queries are embedded with a hashing encoder (a fixed random vector per word,
+summed and normalized; the corpus is embedded the same way) so the suite runs
+offline without the transformer; BENCH_ENCODER=model uses the real query
+encoder instead. The ChromaDB stand-in (src/chroma_stub.py) adds
+CHROMA_LATENCY seconds per request to mimic the HTTP round trip. The result
+cache is disabled so every query is searched.
+
+The report is written as JSON to BENCH_OUTPUT and compared with the stored
+baseline BENCH_BASELINE: p95 latency, QPS and cold start worse than the
+baseline by more than REGRESSION_TOLERANCE (BENCH_TOLERANCE) are listed as regressions and
+the script exits with status 1. BENCH_UPDATE_BASELINE=1 stores the run as
+the new baseline. Numbers are only comparable on the same machine, so no
+baseline is committed: record one on each machine first. Without one the
+script refuses to run (status 2) rather than silently skip the check.
+
+To benchmark a new engine, add a (setup, search) pair to ENGINES.
+
+Usage:
+    BENCH_UPDATE_BASELINE=1 python benchmarks/bench_search.py   # once per machine
+    python benchmarks/bench_search.py
+"""
+
+import json
+import os
+import platform
+import re
+import shutil
+import sys
+import tempfile
+import time
+import numpy as np
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Tuple
+from sklearn.feature_extraction.text import CountVectorizer, TfidfVectorizer
+
+# Add the project root to Python path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import src.baseline as baseline
+import src.dense_index as dense_index
+import src.doc_store as doc_store
+import src.query_encoder as query_encoder
+import src.semantic_search as semantic_search
+from src.chroma_stub import InMemoryChromaClient
+from src.embedding_artifact import EmbeddingArtifact, new_version_dir, publish, write_documents_table, MATRIX_FILE, TABLE_FILE
+from src.hybrid_search import hybrid_search
+from src.inverted_index import InvertedIndex
+from src.result_cache import ResultCache, set_result_cache
+from src.tfidf_index import TfidfIndex
+
+# --- Configuration ---
+SCALES = [int(n) for n in os.environ.get("BENCH_SCALES", "1000,10000,50000").split(",")]
+N_QUERIES = int(os.environ.get("BENCH_QUERIES", 200))
+WARMUP_QUERIES = 10
+CONCURRENCY = [1, 4, 16]
+N_RESULTS = 10
+VOCAB_SIZE = 20_000
+WORDS_PER_DOC = 80
+WORDS_PER_QUERY = 4
+DIMENSION = 384
+CHROMA_LATENCY = 0.002  # seconds per stub request
+CHROMA_MAX_DOCS = 10_000  # the stub scans every row per query; larger corpora skip the chroma engine
+ENCODER = os.environ.get("BENCH_ENCODER", "hashing")  # "hashing" or "model"
+RESULTS_DIR = Path(__file__).parent / "results"
+OUTPUT = Path(os.environ.get("BENCH_OUTPUT", RESULTS_DIR / "bench_search.json"))
+BASELINE = Path(os.environ.get("BENCH_BASELINE", RESULTS_DIR / "bench_search_baseline.json"))
+UPDATE_BASELINE = os.environ.get("BENCH_UPDATE_BASELINE") == "1"
+REGRESSION_TOLERANCE = float(os.environ.get("BENCH_TOLERANCE", 0.2))  # relative; concurrent p95 on few cores is noisy
+SEED = 42
+
+
+# --- Synthetic data ---
+
+def make_words(rng: np.random.Generator, n: int, length: int) -> List[str]:
+    """Draws n texts of `length` Zipf-distributed words from a VOCAB_SIZE vocabulary."""
+    probs = 1.0 / np.arange(1, VOCAB_SIZE + 1)
+    probs /= probs.sum()
+    words = rng.choice(VOCAB_SIZE, size=(n, length), p=probs)
+    return [" ".join(f"w{w}" for w in row) for row in words]
+
+
+def make_queries(rng: np.random.Generator) -> List[str]:
+    """Queries draw from the frequent half of the vocabulary so most of them match."""
+    words = rng.integers(0, VOCAB_SIZE // 2, size=(N_QUERIES, WORDS_PER_QUERY))
+    return [" ".join(f"w{w}" for w in row) for row in words]
+
+
+class HashingEncoder:
+    """Embeds a text as the normalized sum of fixed random vectors of its words; stands in for QueryEncoder."""
+
+    def __init__(self):
+        rng = np.random.default_rng(SEED)
+        self.word_vectors = rng.standard_normal((VOCAB_SIZE, DIMENSION)).astype(np.float32)
+
+    def encode_counts(self, counts) -> np.ndarray:
+        """Embeds the rows of a (texts x VOCAB_SIZE) word count matrix."""
+        embeddings = np.asarray(counts @ self.word_vectors, dtype=np.float32)
+        embeddings /= np.maximum(np.linalg.norm(embeddings, axis=1, keepdims=True), 1e-12)
+        return embeddings
+
+    def encode_batch(self, queries: List[str]) -> np.ndarray:
+        embeddings = np.zeros((len(queries), DIMENSION), dtype=np.float32)
+        for i, query in enumerate(queries):
+            words = [int(word) for word in re.findall(r"w(\d+)", query) if int(word) < VOCAB_SIZE]
+            if words:
+                embeddings[i] = self.word_vectors[words].sum(axis=0)
+        embeddings /= np.maximum(np.linalg.norm(embeddings, axis=1, keepdims=True), 1e-12)
+        return embeddings
+
+    def encode(self, query: str) -> np.ndarray:
+        return self.encode_batch([query])[0]
+
+
+def build_workspace(workspace: Path, n_docs: int, rng: np.random.Generator, encoder: HashingEncoder) -> Dict[str, Any]:
+    """
+    Writes a synthetic corpus and builds the indexes the engines load:
+    workspace/corpus.jsonl, workspace/tfidf_index/, workspace/embeddings/
+    and workspace/doc_store/.
+
+    Returns:
+        Build timings in seconds and the corpus embeddings (for the ChromaDB stand-in)
+    """
+    texts = make_words(rng, n_docs, WORDS_PER_DOC)
+    ids = [f"doc{i}" for i in range(n_docs)]
+    corpus_path = workspace / "corpus.jsonl"
+    with open(corpus_path, 'w', encoding='utf-8') as f:
+        for doc_id, text in zip(ids, texts):
+            f.write(json.dumps({'id': doc_id, 'title': doc_id, 'url': None, 'text': text}) + '\n')
+    doc_store.build_doc_store(corpus_path, workspace / "doc_store")
+
+    start = time.perf_counter()
+    vectorizer = TfidfVectorizer()
+    tfidf_matrix = vectorizer.fit_transform(texts)
+    counter = CountVectorizer(analyzer=vectorizer.build_analyzer(), vocabulary=vectorizer.vocabulary_)
+    bm25 = InvertedIndex.build_bm25(counter.transform(texts))
+    TfidfIndex.from_vectorizer(vectorizer, tfidf_matrix, ids, bm25=bm25).save(workspace / "tfidf_index")
+    tfidf_seconds = time.perf_counter() - start
+
+    start = time.perf_counter()
+    word_counts = CountVectorizer(vocabulary={f"w{i}": i for i in range(VOCAB_SIZE)}).transform(texts)
+    embeddings = encoder.encode_counts(word_counts)
+    tmp_dir = new_version_dir(workspace / "embeddings")
+    np.save(tmp_dir / MATRIX_FILE, embeddings)
+    write_documents_table(str(corpus_path), str(tmp_dir / TABLE_FILE))
+    publish(tmp_dir, "hashing", normalized=True)
+    embeddings_seconds = time.perf_counter() - start
+
+    return {'tfidf_seconds': tfidf_seconds, 'embeddings_seconds': embeddings_seconds,
+            'ids': ids, 'texts': texts, 'embeddings': embeddings}
+
+
+# --- Engines ---
+# setup(workspace, build) loads the engine from disk into the process-wide
+# singletons the search functions use; search(query, n_results) runs one query.
+
+def setup_baseline(workspace: Path, build: Dict[str, Any]) -> None:
+    baseline._index = TfidfIndex.load(workspace / "tfidf_index")
+    baseline._index_version = "bench"
+
+
+def setup_semantic_local(workspace: Path, build: Dict[str, Any]) -> None:
+    semantic_search.SEMANTIC_BACKEND = "local"
+    dense_index._index = dense_index.DenseIndex.from_artifact(EmbeddingArtifact.open(workspace / "embeddings"))
+
+
+def setup_semantic_chroma(workspace: Path, build: Dict[str, Any]) -> None:
+    semantic_search.SEMANTIC_BACKEND = "chroma"
+    semantic_search.QUERY_EMBEDDING = "client"
+    client = build['chroma_client']
+    semantic_search.set_connection(semantic_search.ChromaConnection(client_factory=lambda: client))
+
+
+def setup_hybrid(workspace: Path, build: Dict[str, Any]) -> None:
+    setup_baseline(workspace, build)
+    setup_semantic_local(workspace, build)
+    doc_store._store = doc_store.DocStore(workspace / "doc_store")
+
+
+ENGINES: Dict[str, Tuple[Callable[[Path, Dict[str, Any]], None], Callable[[str, int], list]]] = {
+    'baseline': (setup_baseline, lambda query, n: baseline.search_baseline(query, n)),
+    'baseline_inverted': (setup_baseline, lambda query, n: baseline.search_baseline(query, n, engine="inverted")),
+    'baseline_bm25': (setup_baseline,
+                      lambda query, n: baseline.search_baseline(query, n, engine="inverted", scoring="bm25")),
+    'semantic_local': (setup_semantic_local, lambda query, n: semantic_search.semantic_search(query, n)),
+    'semantic_chroma': (setup_semantic_chroma, lambda query, n: semantic_search.semantic_search(query, n)),
+    'hybrid': (setup_hybrid, lambda query, n: hybrid_search(query, n)),
+}
+
+
+def reset_engines() -> None:
+    """Drops every loaded index so the next setup starts cold."""
+    baseline._index = None
+    baseline._index_version = None
+    dense_index._index = None
+    doc_store._store = None
+    semantic_search.SEMANTIC_BACKEND = "local"
+    semantic_search.set_connection(semantic_search.ChromaConnection())
+
+
+def make_chroma_client(build: Dict[str, Any]) -> InMemoryChromaClient:
+    """Loads the corpus embeddings into a ChromaDB stand-in (not part of the timed cold start)."""
+    client = InMemoryChromaClient()
+    collection = client.create_collection(semantic_search.COLLECTION_NAME, metadata={"hnsw:space": "cosine"})
+    for start in range(0, len(build['ids']), 5000):
+        end = start + 5000
+        collection.add(ids=build['ids'][start:end], embeddings=build['embeddings'][start:end],
+                       documents=build['texts'][start:end])
+    client.latency = CHROMA_LATENCY
+    return client
+
+
+# --- Measurement ---
+
+def rss_mb() -> Optional[float]:
+    """Current resident set size in MiB (Linux only; None elsewhere)."""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 2 ** 20
+    except (OSError, ValueError, AttributeError):
+        return None
+
+
+def percentiles(latencies: List[float]) -> Dict[str, float]:
+    ms = np.asarray(latencies) * 1000
+    return {'mean_ms': float(ms.mean()), 'p50_ms': float(np.percentile(ms, 50)),
+            'p95_ms': float(np.percentile(ms, 95)), 'p99_ms': float(np.percentile(ms, 99)), 'max_ms': float(ms.max())}
+
+
+def run_load(search: Callable[[str, int], list], queries: List[str], concurrency: int) -> Dict[str, Any]:
+    """Issues every query once from `concurrency` threads; returns latency percentiles and QPS."""
+    def timed(query):
+        start = time.perf_counter()
+        results = search(query, N_RESULTS)
+        return time.perf_counter() - start, not results
+
+    start = time.perf_counter()
+    if concurrency == 1:
+        outcomes = [timed(query) for query in queries]
+    else:
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            outcomes = list(pool.map(timed, queries))
+    wall = time.perf_counter() - start
+
+    latencies = [latency for latency, _ in outcomes]
+    empty = sum(is_empty for _, is_empty in outcomes)
+    return {'concurrency': concurrency, 'requests': len(queries), 'qps': len(queries) / wall,
+            'empty_results': empty, **percentiles(latencies)}
+
+
+def bench_engine(name: str, workspace: Path, build: Dict[str, Any], queries: List[str]) -> Dict[str, Any]:
+    setup, search = ENGINES[name]
+    reset_engines()
+    rss_before = rss_mb()
+
+    start = time.perf_counter()
+    setup(workspace, build)
+    loaded = time.perf_counter()
+    first_results = search(queries[0], N_RESULTS)
+    first = time.perf_counter()
+    if not first_results:
+        print(f"  warning: {name} returned no results for its first query")
+
+    for query in queries[1:1 + WARMUP_QUERIES]:
+        search(query, N_RESULTS)
+    rss_after = rss_mb()
+
+    return {
+        'engine': name,
+        'cold_start': {'load_ms': (loaded - start) * 1000, 'first_query_ms': (first - loaded) * 1000,
+                       'total_ms': (first - start) * 1000},
+        'memory': {'rss_mb': rss_after,
+                   'rss_delta_mb': rss_after - rss_before if rss_before is not None else None},
+        'load': [run_load(search, queries, concurrency) for concurrency in CONCURRENCY],
+    }
+
+
+# --- Regression check ---
+
+def flatten(report: Dict[str, Any]) -> Dict[str, Dict[str, float]]:
+    """Maps 'scale/engine/cN' (and 'scale/engine/cold_start') to the compared metrics."""
+    metrics = {}
+    for scale in report['scales']:
+        for engine in scale['engines']:
+            prefix = f"{scale['n_docs']}/{engine['engine']}"
+            metrics[f"{prefix}/cold_start"] = {'total_ms': engine['cold_start']['total_ms']}
+            for load in engine['load']:
+                metrics[f"{prefix}/c{load['concurrency']}"] = {'p95_ms': load['p95_ms'], 'qps': load['qps']}
+    return metrics
+
+
+def compare(report: Dict[str, Any], stored: Dict[str, Any], tolerance: float = REGRESSION_TOLERANCE) -> List[Dict[str, Any]]:
+    """Returns the metrics that are worse than the stored baseline by more than `tolerance`."""
+    regressions = []
+    current, previous = flatten(report), flatten(stored)
+    for key, metrics in current.items():
+        for metric, value in metrics.items():
+            old = previous.get(key, {}).get(metric)
+            if not old:
+                continue
+            # QPS regresses when it drops; latencies when they grow
+            change = (old - value) / old if metric == 'qps' else (value - old) / old
+            if change > tolerance:
+                regressions.append({'key': key, 'metric': metric, 'baseline': old, 'current': value,
+                                    'change': change})
+    return regressions
+
+
+def main():
+    if not UPDATE_BASELINE and not BASELINE.exists():
+        print(f"No baseline at {BASELINE}, so regressions cannot be checked. Record one on this machine with\n"
+              f"    BENCH_UPDATE_BASELINE=1 python benchmarks/bench_search.py", file=sys.stderr)
+        sys.exit(2)
+
+    rng = np.random.default_rng(SEED)
+    queries = make_queries(rng)
+    encoder = HashingEncoder()
+    set_result_cache(ResultCache(None))
+    if ENCODER == "hashing":
+        query_encoder._encoder = encoder
+
+    report = {
+        'timestamp': time.strftime("%Y-%m-%dT%H:%M:%S"),
+        'machine': {'platform': platform.platform(), 'python': platform.python_version(),
+                    'cpu_count': os.cpu_count()},
+        'config': {'scales': SCALES, 'queries': N_QUERIES, 'concurrency': CONCURRENCY, 'n_results': N_RESULTS,
+                   'encoder': ENCODER, 'chroma_latency': CHROMA_LATENCY},
+        'scales': [],
+    }
+
+    for n_docs in SCALES:
+        workspace = Path(tempfile.mkdtemp(prefix="bench_search_"))
+        try:
+            print(f"Building a {n_docs}-document corpus...")
+            build = build_workspace(workspace, n_docs, rng, encoder)
+            engines = [name for name in ENGINES if name != 'semantic_chroma' or n_docs <= CHROMA_MAX_DOCS]
+            if 'semantic_chroma' in engines:
+                build['chroma_client'] = make_chroma_client(build)
+
+            scale = {'n_docs': n_docs, 'build': {'tfidf_seconds': build['tfidf_seconds'],
+                                                 'embeddings_seconds': build['embeddings_seconds']},
+                     'engines': []}
+            print("-" * 96)
+            print(f"{'engine':<18} {'cold (ms)':>10} {'RSS +MB':>8} {'clients':>8} {'p50 (ms)':>9} "
+                  f"{'p95 (ms)':>9} {'p99 (ms)':>9} {'QPS':>9} {'empty':>6}")
+            print("-" * 96)
+            for name in engines:
+                result = bench_engine(name, workspace, build, queries)
+                scale['engines'].append(result)
+                delta = result['memory']['rss_delta_mb']
+                for i, load in enumerate(result['load']):
+                    head = (f"{name:<18} {result['cold_start']['total_ms']:>10.1f} "
+                            f"{delta if delta is not None else float('nan'):>8.1f}") if i == 0 else " " * 37
+                    print(f"{head} {load['concurrency']:>8} {load['p50_ms']:>9.3f} {load['p95_ms']:>9.3f} "
+                          f"{load['p99_ms']:>9.3f} {load['qps']:>9.0f} {load['empty_results']:>6}")
+            print("-" * 96)
+            report['scales'].append(scale)
+        finally:
+            reset_engines()
+            shutil.rmtree(workspace, ignore_errors=True)
+
+    regressions = []
+    if not UPDATE_BASELINE:
+        with open(BASELINE, 'r', encoding='utf-8') as f:
+            regressions = compare(report, json.load(f))
+        report['baseline'] = str(BASELINE)
+        report['regressions'] = regressions
+
+    OUTPUT.parent.mkdir(parents=True, exist_ok=True)
+    with open(OUTPUT, 'w', encoding='utf-8') as f:
+        json.dump(report, f, indent=2)
+    print(f"Report written to {OUTPUT}")
+
+    if UPDATE_BASELINE:
+        BASELINE.parent.mkdir(parents=True, exist_ok=True)
+        shutil.copyfile(OUTPUT, BASELINE)
+        print(f"Stored as the baseline in {BASELINE}")
+    elif regressions:
+        print(f"{len(regressions)} regression(s) against {BASELINE} (tolerance {REGRESSION_TOLERANCE:.0%}):")
+        for regression in regressions:
+            print(f"  {regression['key']} {regression['metric']}: {regression['baseline']:.3f} -> "
+                  f"{regression['current']:.3f} ({regression['change']:+.0%})")
+        sys.exit(1)
+    else:
+        print(f"No regressions against {BASELINE}.")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,17 +1,20 @@
 import sys
 import os
-import re
-import unicodedata
+import json
+import multiprocessing
+from collections import Counter, deque
+from concurrent.futures import ProcessPoolExecutor
 
 # Add src directory to path to import utils
 sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'src'))
 
 from utils import (
-    basic_clean, 
-    advanced_clean, 
-    read_jsonl, 
-    write_jsonl, 
+    advanced_clean,
+    normalize_text,
+    token_chunks,
+    length_stats,
     get_data_path,
+    MODEL_NAME,
     MIN_CHAR_LENGTH
 )
 
@@ -19,26 +22,148 @@ from utils import (
 # -----------------------------------------------------------------------------
 INPUT_FILE = get_data_path("ds_corpus.jsonl")
 OUTPUT_FILE = get_data_path("ds_corpus_clean.jsonl")
+STATS_FILE = get_data_path("ds_corpus_clean.stats.json")
 
-# Normalization helpers (one-off dash/encoding fix)
+# "paragraph" keeps every cleaned paragraph of at least MIN_CHAR_LENGTH
+# characters as one chunk. "tokens" packs the sentences of those paragraphs
+# into chunks of at most CHUNK_TOKENS encoder tokens, consecutive chunks
+# sharing up to CHUNK_OVERLAP tokens of whole sentences, so no chunk is
+# truncated at ENCODER_MAX_LENGTH by wsl_scripts/embeddings.py. Token chunks
+# also record their article id and character offsets in the cleaned article.
+CHUNK_STRATEGY = os.environ.get("CHUNK_STRATEGY", "paragraph")
+CHUNK_TOKENS = int(os.environ.get("CHUNK_TOKENS", 256))
+CHUNK_OVERLAP = int(os.environ.get("CHUNK_OVERLAP", 32))
+ENCODER_MAX_LENGTH = 512
+
+# The raw dump is streamed line by line in blocks of BLOCK_SIZE articles; each
+# block is parsed, normalized and chunked by one of CLEAN_WORKERS processes
+# (1 = in this process). At most two blocks per worker are in flight and the
+# results are written in input order, so memory stays flat and the output is
+# identical for any number of workers.
+CLEAN_WORKERS = int(os.environ.get("CLEAN_WORKERS", os.cpu_count() or 1))
+BLOCK_SIZE = 256
+
+# Cleaning
 # -----------------------------------------------------------------------------
-_DASH_RX = re.compile(r"[‐‑‒–—―−]")  # common dash/minus variants
 
-def normalize_text(value: str) -> str:
-    """Normalize unicode text to stabilize IDs/titles across sources.
+_tokenizer = None
+
+def get_tokenizer():
+    """Loads the encoder's tokenizer once per process."""
+    global _tokenizer
+    if _tokenizer is None:
+        from transformers import AutoTokenizer
+        _tokenizer = AutoTokenizer.from_pretrained(MODEL_NAME)
+    return _tokenizer
+
+def clean_article(record: dict, strategy: str = CHUNK_STRATEGY) -> list:
+    """
+    Normalizes one raw article and splits it into chunk records.
+    """
+    # Normalize inputs (IDs, titles, text) to fix dash/encoding inconsistencies
+    base_id = normalize_text(record.get('id', ''))
+    title = normalize_text(record.get('title', ''))
+    text = normalize_text(record.get('text', ''))
+
+    text_chunks = advanced_clean(text, MIN_CHAR_LENGTH)
+
+    if strategy == "tokens":
+        return [
+            {
+                "id": f"{base_id}_{i}",
+                "title": title,
+                "text": chunk['text'],
+                "url": record.get("url"),
+                "article_id": base_id,
+                "char_start": chunk['char_start'],
+                "char_end": chunk['char_end'],
+                "n_tokens": chunk['n_tokens']
+            }
+            for i, chunk in enumerate(token_chunks(text_chunks, get_tokenizer(), CHUNK_TOKENS, CHUNK_OVERLAP))
+        ]
+
+    # Create a new record for each chunk, linking back to the original article
+    chunk_records = []
+    for i, chunk in enumerate(text_chunks):
+        # Also normalize chunk output to ensure consistency end-to-end
+        chunk = normalize_text(chunk)
+        chunk_records.append({
+            "id": f"{base_id}_{i}", # Create a unique ID for each chunk
+            "title": title,
+            "text": chunk,
+            "url": record.get("url")
+        })
+    return chunk_records
+
+def clean_block(lines: list, strategy: str = CHUNK_STRATEGY) -> tuple:
+    """
+    Parses and cleans a block of raw JSONL lines.
 
-    - NFKC normalization
-    - Map all dash/minus variants to ASCII '-'
-    - Replace non-breaking space with regular space
-    - Drop the Unicode replacement character if present
+    Returns:
+        Tuple of (articles read, chunks written, output JSONL text, chunk
+        length histogram in tokens for "tokens" and characters otherwise)
     """
-    if value is None:
-        return ""
-    text = unicodedata.normalize("NFKC", str(value))
-    text = _DASH_RX.sub("-", text)
-    text = text.replace("\u00A0", " ")
-    text = text.replace("�", "")
-    return text.strip()
+    output = []
+    lengths = Counter()
+    articles = 0
+    for line in lines:
+        if not line.strip():
+            continue
+        articles += 1
+        for chunk_record in clean_article(json.loads(line), strategy):
+            output.append(json.dumps(chunk_record) + '\n')
+            lengths[chunk_record.get('n_tokens', len(chunk_record['text']))] += 1
+    return articles, len(output), ''.join(output), lengths
+
+def iter_blocks(file_path: str, block_size: int):
+    """Yields lists of up to block_size raw lines without reading the whole file."""
+    with open(file_path, 'r', encoding='utf-8') as f:
+        block = []
+        for line in f:
+            block.append(line)
+            if len(block) == block_size:
+                yield block
+                block = []
+        if block:
+            yield block
+
+def clean_corpus(input_file: str, output_file: str, workers: int = CLEAN_WORKERS,
+                 strategy: str = CHUNK_STRATEGY) -> tuple:
+    """
+    Streams input_file through clean_block and writes the chunks to output_file
+    in input order.
+
+    Returns:
+        Tuple of (articles read, chunks written, chunk length histogram)
+    """
+    counts = [0, 0]
+    lengths = Counter()
+    tmp_file = output_file + ".tmp"
+    with open(tmp_file, 'w', encoding='utf-8') as out:
+
+        def write(result):
+            n_articles, n_chunks, text, block_lengths = result
+            out.write(text)
+            counts[0] += n_articles
+            counts[1] += n_chunks
+            lengths.update(block_lengths)
+
+        if workers <= 1:
+            for block in iter_blocks(input_file, BLOCK_SIZE):
+                write(clean_block(block, strategy))
+        else:
+            context = multiprocessing.get_context("spawn")
+            with ProcessPoolExecutor(max_workers=workers, mp_context=context) as pool:
+                in_flight = deque()
+                for block in iter_blocks(input_file, BLOCK_SIZE):
+                    in_flight.append(pool.submit(clean_block, block, strategy))
+                    # Write finished blocks in submission order; wait once the window is full
+                    while in_flight and (in_flight[0].done() or len(in_flight) >= 2 * workers):
+                        write(in_flight.popleft().result())
+                while in_flight:
+                    write(in_flight.popleft().result())
+    os.replace(tmp_file, output_file)
+    return counts[0], counts[1], lengths
 
 # Main Function
 # -----------------------------------------------------------------------------
@@ -47,43 +172,43 @@ def main():
     """
     Main function to clean the input file and save the output to a new file.
     """
-    
-    # Read the input data
-    data = read_jsonl(INPUT_FILE)
-    if not data:
+    if not os.path.exists(INPUT_FILE):
+        print(f"Error: File {INPUT_FILE} not found.")
         return
 
-    print(f"Processing {len(data)} docs...")
-    processed_docs = []
-
-    for record in data:
-        # Normalize inputs (IDs, titles, text) to fix dash/encoding inconsistencies
-        base_id = normalize_text(record.get('id', ''))
-        title = normalize_text(record.get('title', ''))
-        text = normalize_text(record.get('text', ''))
-
-        text_chunks = advanced_clean(text, MIN_CHAR_LENGTH)
-        
-        # Create a new record for each chunk, linking back to the original article
-        for i, chunk in enumerate(text_chunks):
-            # Also normalize chunk output to ensure consistency end-to-end
-            chunk = normalize_text(chunk)
-            chunk_record = {
-                "id": f"{base_id}_{i}", # Create a unique ID for each chunk
-                "title": title,
-                "text": chunk,
-                "url": record.get("url")
-            }
-            processed_docs.append(chunk_record)
+    if CHUNK_STRATEGY not in ("paragraph", "tokens"):
+        print(f"Error: Unknown CHUNK_STRATEGY {CHUNK_STRATEGY!r}; expected 'paragraph' or 'tokens'.")
+        return
+
+    workers = max(1, CLEAN_WORKERS)
+    print(f"Processing '{INPUT_FILE}' with {workers} worker(s), {CHUNK_STRATEGY} chunking...")
+    try:
+        articles, chunks, lengths = clean_corpus(INPUT_FILE, OUTPUT_FILE, workers, CHUNK_STRATEGY)
+    except Exception as e:
+        print(f"ERROR: Could not clean the corpus: {e}")
+        return
 
-    print(f"Successfully processed {len(processed_docs)} chunks.")
+    print(f"Successfully processed {articles} docs into {chunks} chunks.")
+    print(f"Wrote processed chunks to '{OUTPUT_FILE}'.")
 
-    # Write the processed chunks to a new .jsonl file.
-    print(f"\nWriting {len(processed_docs)} processed chunks to '{OUTPUT_FILE}'...")
-    if write_jsonl(processed_docs, OUTPUT_FILE):
-        print("SUCCESS: Data cleaning and chunking complete.")
-    else:
-        print("ERROR: Could not write to file.")
+    # Chunk length distribution; tokens past ENCODER_MAX_LENGTH are cut by the encoder
+    unit = "tokens" if CHUNK_STRATEGY == "tokens" else "characters"
+    stats = {
+        'strategy': CHUNK_STRATEGY,
+        'unit': unit,
+        'articles': articles,
+        **length_stats(lengths, ENCODER_MAX_LENGTH if unit == "tokens" else None),
+    }
+    if CHUNK_STRATEGY == "tokens":
+        stats.update(chunk_tokens=CHUNK_TOKENS, chunk_overlap=CHUNK_OVERLAP)
+    with open(STATS_FILE, 'w', encoding='utf-8') as f:
+        json.dump(stats, f, indent=2)
+    print(f"Chunk length ({unit}): mean {stats.get('mean', 0)}, p50 {stats.get('p50', 0)}, "
+          f"p90 {stats.get('p90', 0)}, p99 {stats.get('p99', 0)}, max {stats.get('max', 0)}")
+    if 'over_limit' in stats:
+        print(f"Chunks over the encoder limit of {ENCODER_MAX_LENGTH} tokens: {stats['over_limit']}")
+    print(f"Wrote chunk statistics to '{STATS_FILE}'.")
+    print("SUCCESS: Data cleaning and chunking complete.")
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
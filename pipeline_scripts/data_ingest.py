@@ -1,54 +1,49 @@
-import pickle
+import os
+import sys
 import chromadb
 from tqdm import tqdm
 
+# Add the project root to Python path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.embedding_artifact import EmbeddingArtifact
+from src.ingest import incremental_ingest, server_max_batch_size, INGEST_MANIFEST_PATH
+from src.utils import EMBEDDINGS_ARTIFACT_DIR
+
 # --- Configuration ---
-INPUT_PATH = "models/embeddings.pkl"
+ARTIFACT_DIR = EMBEDDINGS_ARTIFACT_DIR  # the CURRENT version is ingested
+# Anchored to the project root so the app's result cache sees every ingest,
+# whatever directory this script runs from
+MANIFEST_PATH = INGEST_MANIFEST_PATH
+BATCH_SIZE = 100  # records in the first upsert request; adapts to latency and the server limit
+INGEST_WORKERS = int(os.environ.get("INGEST_WORKERS", "4"))  # upsert requests in flight
+# "incremental" upserts only new or changed records and deletes removed ids;
+# "full" drops the collection and ingests everything again
+INGEST_MODE = os.environ.get("INGEST_MODE", "incremental")
 CHROMA_HOST = "localhost"
 CHROMA_PORT = 8000
 COLLECTION_NAME = 'semantic_search_engine'
 
 # --- Main ---
-def load_embeddings_data(file_path):
+def open_artifact(artifact_dir):
     """
-    Load embeddings data from pickle file
+    Opens the current embeddings artifact.
+    Only its manifest is read here; the matrix and the table are memory-mapped
+    when the records are streamed.
     """
-    try:
-        print(f"Loading embeddings from {file_path}...")
-        with open(file_path, 'rb') as f:
-            data = pickle.load(f)
-        
-        # Validate required keys
-        required_keys = ['ids', 'embeddings', 'documents']
-        for key in required_keys:
-            if key not in data:
-                raise KeyError(f"Missing required key '{key}' in pickle file")
-        
-        ids = data['ids']
-        embeddings = data['embeddings']
-        documents = data['documents']
-        
-        # Validate data consistency
-        if not (len(ids) == len(embeddings) == len(documents)):
-            raise ValueError("Inconsistent data lengths: ids, embeddings, and documents must have the same length")
-        
-        print(f"Loaded {len(ids)} documents and embeddings.")
-        return ids, embeddings, documents
-        
-    except FileNotFoundError:
-        print(f"Error: File {file_path} not found.")
-        raise
-    except Exception as e:
-        print(f"Error loading embeddings data: {e}")
-        raise
+    artifact = EmbeddingArtifact.open(artifact_dir)
+    print(f"Found {len(artifact)} documents and embeddings in {artifact.path} "
+          f"({artifact.manifest['model_name']}, dim {artifact.dimension}).")
+    return artifact
 
 def data_ingest():
     """
-    Loads data from a pickle file into ChromaDB collection
+    Streams the embeddings and documents into a ChromaDB collection.
+    Safe to re-run: only the difference to the collection is written.
     """
-    # 1. Load the data from the pickle file
+    # 1. Open the embeddings artifact
     try:
-        ids, embeddings, documents = load_embeddings_data(INPUT_PATH)
+        artifact = open_artifact(ARTIFACT_DIR)
     except Exception as e:
         print(f"Failed to load data: {e}")
         return
@@ -66,6 +61,9 @@ def data_ingest():
 
     try:
         # 3. Create or get the collection
+        if INGEST_MODE == "full" and COLLECTION_NAME in [c.name for c in client.list_collections()]:
+            print(f"Full ingest: deleting collection {COLLECTION_NAME}...")
+            client.delete_collection(name=COLLECTION_NAME)
         print(f"Creating or getting collection {COLLECTION_NAME}...")
         collection = client.get_or_create_collection(
             name=COLLECTION_NAME,
@@ -73,27 +71,27 @@ def data_ingest():
         )
         print(f"Collection {COLLECTION_NAME} created or retrieved.")
         
-        # 4. Add the data to the collection
-        # Convert embeddings to a list as it's the expected format.
+        # 4. Sync the collection with the embeddings files
+        # Records are compared by content hash; only the delta is sent.
+        print(f"Syncing {len(artifact)} documents with {COLLECTION_NAME}...(This may take a while)")
 
-        print(f"Adding {len(ids)} documents to {COLLECTION_NAME}...(This may take a while)")
-        
-        # Add the data in batches to be memory-efficient and provide progress.
-        batch_size = 100
+        with tqdm(desc="Upserting changed documents", unit="docs") as progress:
+            manifest = incremental_ingest(collection, artifact, BATCH_SIZE,
+                                          manifest_path=MANIFEST_PATH, progress=progress.update,
+                                          max_workers=INGEST_WORKERS,
+                                          max_batch_size=server_max_batch_size(client))
 
-        for i in tqdm(range(0, len(ids), batch_size), desc="Adding documents to ChromaDB"):
-            collection.add(
-                ids=ids[i:i+batch_size],
-                documents=documents[i:i+batch_size],
-                embeddings=embeddings[i:i+batch_size]
-            )
-        
-        print(f"Documents added to {COLLECTION_NAME}.")
+        print(f"Upserted {manifest['upserted']}, deleted {manifest['deleted']}, "
+              f"unchanged {manifest['unchanged']} documents in {manifest['total_seconds']:.1f} s.")
+        upsert = manifest['upsert']
+        print(f"Upsert throughput: {upsert['records_per_sec']:.0f} records/sec over {upsert['requests']} requests "
+              f"({upsert['retries']} retries, final batch size {upsert['final_batch_size']}).")
+        print(f"Manifest written to {MANIFEST_PATH}")
         
         # 5. Get final count and close the connection
         count = collection.count()
         print(f"--------------------------------")
-        print(f"Successfully added {count} documents to the '{COLLECTION_NAME}' collection.")
+        print(f"The '{COLLECTION_NAME}' collection now holds {count} documents.")
         print(f"--------------------------------")
         
         print("Done!")
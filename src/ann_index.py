@@ -0,0 +1,303 @@
+"""
+In-process approximate nearest-neighbour index (IVF with optional product quantization).
+Built from the corpus embeddings, persisted as flat .npy files, and searched
+with a tunable number of probed lists (nprobe) to trade recall for latency.
+"""
+
+import json
+import logging
+import os
+import sys
+import threading
+import numpy as np
+import scipy.sparse as sp
+from pathlib import Path
+from typing import Optional
+
+# Add the project root to Python path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.dense_index import get_dense_index, l2_normalize
+from src.utils import top_k_indices
+
+logger = logging.getLogger(__name__)
+
+
+# --- Configuration ---
+PROJECT_ROOT = Path(__file__).parent.parent
+ANN_INDEX_DIR = PROJECT_ROOT / "models" / "ann_index"
+
+FORMAT_VERSION = 1
+DEFAULT_NPROBE = 16
+DEFAULT_PQ_M = 0  # PQ sub-quantizers; 0 stores full vectors (IVF-Flat)
+PQ_CENTROIDS = 256  # codewords per sub-quantizer (8-bit codes)
+KMEANS_ITERATIONS = 20
+ASSIGN_CHUNK = 65536
+
+
+def _assign(data: np.ndarray, centroids: np.ndarray, spherical: bool) -> np.ndarray:
+    """Returns the index of the closest centroid of every row (inner product or L2)."""
+    offsets = 0.0 if spherical else 0.5 * (centroids ** 2).sum(axis=1)
+    assignment = np.empty(len(data), dtype=np.int64)
+    for start in range(0, len(data), ASSIGN_CHUNK):
+        scores = data[start:start + ASSIGN_CHUNK] @ centroids.T - offsets
+        assignment[start:start + ASSIGN_CHUNK] = scores.argmax(axis=1)
+    return assignment
+
+
+def kmeans(data: np.ndarray, k: int, n_iter: int = KMEANS_ITERATIONS, spherical: bool = False,
+           seed: int = 0) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Lloyd's k-means. With spherical=True points are assigned by inner product and
+    centroids are renormalized to unit length (cosine k-means).
+
+    Returns:
+        Tuple of (k x dim centroids, assignment of every row)
+    """
+    rng = np.random.default_rng(seed)
+    k = min(k, len(data))
+    centroids = data[rng.choice(len(data), size=k, replace=False)].astype(np.float32)
+
+    for _ in range(n_iter):
+        assignment = _assign(data, centroids, spherical)
+        one_hot = sp.csr_matrix((np.ones(len(data), dtype=np.float32), (assignment, np.arange(len(data)))),
+                                shape=(k, len(data)))
+        counts = np.bincount(assignment, minlength=k)
+        sums = np.asarray(one_hot @ data)
+
+        non_empty = counts > 0
+        centroids[non_empty] = sums[non_empty] / counts[non_empty, None]
+        # Re-seed empty clusters with random points
+        empty = np.flatnonzero(~non_empty)
+        if len(empty):
+            centroids[empty] = data[rng.choice(len(data), size=len(empty), replace=False)]
+        if spherical:
+            centroids = l2_normalize(centroids)
+
+    return centroids, _assign(data, centroids, spherical)
+
+
+class IVFIndex:
+    """
+    Inverted-file index over unit-length embeddings, scored by inner product
+    (= cosine similarity).
+
+    Rows are grouped by their nearest coarse centroid; list l holds
+    list_rows[list_offsets[l]:list_offsets[l+1]]. Each row is stored either as
+    its full vector (IVF-Flat) or as PQ codes of its residual to the centroid.
+    With PQ, a query's score for a row is q.centroid + sum_j q_j.codebook_j[code_j],
+    computed from one (pq_m x 256) lookup table per query.
+
+    Rows are row numbers of the embeddings the index was built from;
+    source_version records their artifact version, so a search can check that
+    the dense index it maps rows through is the same one (see matches()).
+    """
+
+    def __init__(self, centroids: np.ndarray, list_offsets: np.ndarray, list_rows: np.ndarray,
+                 vectors: Optional[np.ndarray] = None, codes: Optional[np.ndarray] = None,
+                 codebooks: Optional[np.ndarray] = None, source_version: Optional[str] = None):
+        if (vectors is None) == (codes is None):
+            raise ValueError("An IVF index stores either full vectors or PQ codes")
+        self.centroids = centroids
+        self.list_offsets = list_offsets
+        self.list_rows = list_rows
+        self.vectors = vectors
+        self.codes = codes
+        self.codebooks = codebooks
+        self.source_version = source_version
+        # Set by get_ann_index() if the index does not match the embeddings being served
+        self.stale = False
+
+    @property
+    def n_rows(self) -> int:
+        return len(self.list_rows)
+
+    def matches(self, n_rows: int, version: Optional[str]) -> bool:
+        """
+        Whether the index was built from embeddings with n_rows rows of the given
+        artifact version. Indexes (or embeddings) without a recorded version are
+        only checked by row count.
+        """
+        if self.n_rows != n_rows:
+            return False
+        return self.source_version is None or version is None or self.source_version == version
+
+    @property
+    def n_lists(self) -> int:
+        return len(self.centroids)
+
+    @property
+    def pq_m(self) -> int:
+        return 0 if self.codebooks is None else self.codebooks.shape[0]
+
+    @classmethod
+    def build(cls, embeddings: np.ndarray, n_lists: Optional[int] = None, pq_m: int = DEFAULT_PQ_M,
+              train_size: int = 100_000, seed: int = 0) -> "IVFIndex":
+        """
+        Trains the coarse quantizer (and PQ codebooks) and encodes every row.
+
+        Args:
+            embeddings: (N, dim) matrix; normalized to unit length here
+            n_lists: Number of inverted lists, default 4 * sqrt(N)
+            pq_m: Number of PQ sub-quantizers (must divide dim); 0 for IVF-Flat
+            train_size: Maximum number of rows sampled for training
+            seed: Random seed
+        """
+        data = l2_normalize(embeddings)
+        n_rows, dim = data.shape
+        if pq_m and dim % pq_m:
+            raise ValueError(f"pq_m={pq_m} must divide the embedding dimension {dim}")
+        n_lists = n_lists or max(1, int(4 * np.sqrt(n_rows)))
+
+        rng = np.random.default_rng(seed)
+        train = data[rng.choice(n_rows, size=min(train_size, n_rows), replace=False)]
+
+        centroids, _ = kmeans(train, n_lists, spherical=True, seed=seed)
+        assignment = _assign(data, centroids, spherical=True)
+
+        # Group rows by list
+        list_rows = np.argsort(assignment, kind='stable')
+        list_offsets = np.zeros(len(centroids) + 1, dtype=np.int64)
+        np.cumsum(np.bincount(assignment, minlength=len(centroids)), out=list_offsets[1:])
+
+        if not pq_m:
+            return cls(centroids, list_offsets, list_rows, vectors=data[list_rows])
+
+        # Product quantization of the residuals to the coarse centroids
+        residuals = data[list_rows] - centroids[assignment[list_rows]]
+        sub_dim = dim // pq_m
+        train_residuals = residuals[rng.choice(n_rows, size=min(train_size, n_rows), replace=False)]
+
+        codebooks = np.zeros((pq_m, PQ_CENTROIDS, sub_dim), dtype=np.float32)
+        codes = np.zeros((n_rows, pq_m), dtype=np.uint8)
+        for j in range(pq_m):
+            sub = slice(j * sub_dim, (j + 1) * sub_dim)
+            codebook, _ = kmeans(np.ascontiguousarray(train_residuals[:, sub]), PQ_CENTROIDS, seed=seed + j + 1)
+            codebooks[j, :len(codebook)] = codebook
+            codes[:, j] = _assign(np.ascontiguousarray(residuals[:, sub]), codebook, spherical=False)
+
+        return cls(centroids, list_offsets, list_rows, codes=codes, codebooks=codebooks)
+
+    def _score_list(self, query: np.ndarray, list_id: int, coarse_score: float,
+                    lookup: Optional[np.ndarray]) -> np.ndarray:
+        start, end = self.list_offsets[list_id], self.list_offsets[list_id + 1]
+        if self.vectors is not None:
+            return self.vectors[start:end] @ query
+        codes = self.codes[start:end]
+        return coarse_score + lookup[np.arange(self.pq_m), codes].sum(axis=1)
+
+    def search(self, query_embeddings: np.ndarray, k: int, nprobe: int = DEFAULT_NPROBE,
+               rerank_vectors: Optional[np.ndarray] = None, rerank_factor: int = 4) -> tuple[list, list]:
+        """
+        Approximate top-k search.
+
+        Args:
+            query_embeddings: (Q, dim) or (dim,) query embeddings
+            k: Number of results per query
+            nprobe: Number of inverted lists scanned per query (higher = better recall, slower)
+            rerank_vectors: Optional (N, dim) unit-length matrix; when given, the best
+                k * rerank_factor PQ candidates are re-scored exactly
+            rerank_factor: Candidate multiplier for re-ranking
+
+        Returns:
+            Tuple of (row indices, similarities), one array per query, best first
+        """
+        queries = l2_normalize(query_embeddings)
+        nprobe = max(1, min(nprobe, self.n_lists))
+        coarse = queries @ self.centroids.T
+
+        all_rows, all_scores = [], []
+        for query, coarse_scores in zip(queries, coarse):
+            probed = top_k_indices(coarse_scores, nprobe)
+            lookup = None
+            if self.codebooks is not None:
+                lookup = np.einsum('jcd,jd->jc', self.codebooks, query.reshape(self.pq_m, -1))
+
+            rows = np.concatenate([self.list_rows[self.list_offsets[l]:self.list_offsets[l + 1]] for l in probed])
+            scores = np.concatenate([self._score_list(query, l, coarse_scores[l], lookup) for l in probed])
+
+            if rerank_vectors is not None and self.codebooks is not None:
+                shortlist = top_k_indices(scores, k * rerank_factor)
+                rows = rows[shortlist]
+                scores = rerank_vectors[rows] @ query
+
+            top = top_k_indices(scores, k)
+            all_rows.append(rows[top])
+            all_scores.append(scores[top])
+        return all_rows, all_scores
+
+    def save(self, directory) -> None:
+        """Writes the index as flat .npy arrays plus config.json into a directory."""
+        os.makedirs(directory, exist_ok=True)
+        arrays = {'centroids': self.centroids, 'list_offsets': self.list_offsets, 'list_rows': self.list_rows,
+                  'vectors': self.vectors, 'codes': self.codes, 'codebooks': self.codebooks}
+        for name, array in arrays.items():
+            path = os.path.join(directory, f"{name}.npy")
+            if array is not None:
+                np.save(path, array)
+            elif os.path.exists(path):
+                # Left over from an index of the other kind (flat vs PQ)
+                os.remove(path)
+        with open(os.path.join(directory, "config.json"), 'w', encoding='utf-8') as f:
+            json.dump({'format_version': FORMAT_VERSION, 'n_lists': self.n_lists, 'pq_m': self.pq_m,
+                       'n_rows': self.n_rows, 'dimension': self.centroids.shape[1],
+                       'source_version': self.source_version}, f, indent=2)
+
+    @classmethod
+    def load(cls, directory, mmap_mode: str = 'r') -> "IVFIndex":
+        """Opens an index written by save(), memory-mapped by default."""
+        with open(os.path.join(directory, "config.json"), 'r', encoding='utf-8') as f:
+            config = json.load(f)
+        if config.get('format_version') != FORMAT_VERSION:
+            raise ValueError(f"Unsupported ANN index format: {config.get('format_version')}")
+
+        def load_array(name):
+            path = os.path.join(directory, f"{name}.npy")
+            return np.load(path, mmap_mode=mmap_mode) if os.path.exists(path) else None
+
+        return cls(load_array('centroids'), load_array('list_offsets'), load_array('list_rows'),
+                   vectors=load_array('vectors'), codes=load_array('codes'), codebooks=load_array('codebooks'),
+                   source_version=config.get('source_version'))
+
+
+def recall_at_k(approx_rows: list, exact_rows: list) -> float:
+    """Mean fraction of the exact top-k rows found by the approximate search."""
+    if not exact_rows:
+        return 0.0
+    hits = [len(set(np.asarray(a).tolist()) & set(np.asarray(e).tolist())) / max(len(e), 1)
+            for a, e in zip(approx_rows, exact_rows)]
+    return float(np.mean(hits))
+
+
+_index: Optional[IVFIndex] = None
+_index_lock = threading.Lock()
+
+
+def get_ann_index() -> IVFIndex:
+    """
+    Returns the process-wide ANN index, loading it on the first call.
+
+    On load the index is checked against the dense index its row numbers map
+    through; if it was built from another embeddings artifact, a warning is
+    logged once and the index is marked stale, so searches can use exact
+    search instead.
+
+    Raises:
+        FileNotFoundError: If wsl_scripts/build_ann_index.py has not been run
+            or the embeddings have not been generated
+    """
+    global _index
+    if _index is None:
+        with _index_lock:
+            if _index is None:
+                index = IVFIndex.load(ANN_INDEX_DIR)
+                dense = get_dense_index()
+                if not index.matches(len(dense.ids), dense.version):
+                    index.stale = True
+                    logger.warning("The ANN index in %s was built from another embeddings artifact "
+                                   "(%s, %d rows; serving %s, %d rows); using exact search. "
+                                   "Rebuild it with wsl_scripts/build_ann_index.py.",
+                                   ANN_INDEX_DIR, index.source_version, index.n_rows,
+                                   dense.version, len(dense.ids))
+                _index = index
+    return _index
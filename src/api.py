@@ -0,0 +1,308 @@
+"""
+HTTP search service.
+
+Exposes the search engines over FastAPI:
+
+    POST /search/semantic   {"query", "n_results"}
+    POST /search/baseline   {"query", "n_results"}
+    POST /search/hybrid     {"query", "n_results", "fusion", "alpha"}
+    GET  /documents?ids=...
+    GET  /health
+
+Run with:  uvicorn src.api:app --port 8080
+
+A search or document lookup whose engine is unavailable (baseline model not
+built, ChromaDB down, embeddings missing) is answered with 503 rather than an
+empty result list, so clients can tell "no matches" from "cannot search".
+
+Models and indexes are loaded once at startup. Handlers are async; each
+search is handed to a MicroBatcher, which collects the requests that arrive
+within API_BATCH_WINDOW_MS of each other (up to API_MAX_BATCH_SIZE) and
+answers them with one call to the engine's batch function in a worker
+thread: one encoder forward pass and one scoring call per batch instead of
+one per request. The event loop itself never runs a search.
+"""
+
+import asyncio
+import os
+import sys
+from contextlib import asynccontextmanager
+from typing import Any, Callable, Dict, List, Literal, Optional, Set, Tuple
+
+import uvicorn
+from fastapi import FastAPI, HTTPException, Query
+from pydantic import BaseModel, Field
+
+# Add the project root to Python path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.baseline import search_baseline_batch, warmup as warmup_baseline
+from src.doc_store import get_doc_store
+from src.hybrid_search import attach_documents, hybrid_search_batch, HYBRID_ALPHA, HYBRID_FUSION
+from src.query_encoder import get_query_encoder
+from src.result_cache import get_result_cache
+from src.semantic_search import (semantic_search_batch, fetch_documents, document_store, test_connection,
+                                 QUERY_EMBEDDING, SEMANTIC_BACKEND)
+
+
+# --- Configuration ---
+API_HOST = os.environ.get("API_HOST", "127.0.0.1")
+API_PORT = int(os.environ.get("API_PORT", 8080))
+# Requests arriving within this many milliseconds of the first are searched together
+API_BATCH_WINDOW_MS = float(os.environ.get("API_BATCH_WINDOW_MS", 5))
+API_MAX_BATCH_SIZE = int(os.environ.get("API_MAX_BATCH_SIZE", 64))
+MAX_RESULTS = 50
+MAX_DOCUMENT_IDS = 100
+
+
+class BackendUnavailable(RuntimeError):
+    """Raised by a batch function whose search engine cannot answer; reported as 503."""
+
+
+class MicroBatcher:
+    """
+    Coalesces concurrent single-query calls into batch calls.
+
+    Queries submitted with the same extra arguments (n_results, fusion, ...)
+    within `window` seconds of the first pending one are passed together to
+    batch_fn(queries, *args), which runs in the default thread pool and must
+    return one result per query. A batch is flushed early once it holds
+    max_batch_size queries. If batch_fn raises, or returns a different
+    number of results, every query of the batch gets an exception.
+
+    Args:
+        batch_fn: Callable taking a list of queries and the extra arguments
+        window: Seconds to wait for more queries after the first one
+        max_batch_size: Maximum number of queries per batch call
+    """
+
+    def __init__(self, batch_fn: Callable[..., List[Any]], window: float = API_BATCH_WINDOW_MS / 1000,
+                 max_batch_size: int = API_MAX_BATCH_SIZE):
+        self.batch_fn = batch_fn
+        self.window = window
+        self.max_batch_size = max_batch_size
+        self._pending: Dict[Tuple, List[Tuple[str, asyncio.Future]]] = {}
+        self._timers: Dict[Tuple, asyncio.TimerHandle] = {}
+        # The event loop only keeps weak references to tasks; hold running batches here
+        self._tasks: Set[asyncio.Task] = set()
+        self.batches = 0
+        self.queries = 0
+
+    async def submit(self, query: str, *args) -> Any:
+        """Queues one query and waits for its result."""
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        pending = self._pending.setdefault(args, [])
+        pending.append((query, future))
+        if len(pending) >= self.max_batch_size:
+            self._flush(args)
+        elif len(pending) == 1:
+            self._timers[args] = loop.call_later(self.window, self._flush, args)
+        return await future
+
+    def _flush(self, args: Tuple) -> None:
+        timer = self._timers.pop(args, None)
+        if timer is not None:
+            timer.cancel()
+        batch = self._pending.pop(args, None)
+        if batch:
+            task = asyncio.ensure_future(self._run(args, batch))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    async def _run(self, args: Tuple, batch: List[Tuple[str, asyncio.Future]]) -> None:
+        self.batches += 1
+        self.queries += len(batch)
+        try:
+            results = await asyncio.to_thread(self.batch_fn, [query for query, _ in batch], *args)
+            if len(results) != len(batch):
+                raise RuntimeError(f"{getattr(self.batch_fn, '__name__', 'batch_fn')} returned "
+                                   f"{len(results)} results for {len(batch)} queries")
+        except Exception as e:
+            results = [e] * len(batch)
+        for (_, future), result in zip(batch, results):
+            # Skip requests whose client went away
+            if future.done():
+                continue
+            if isinstance(result, Exception):
+                future.set_exception(result)
+            else:
+                future.set_result(result)
+
+    def stats(self) -> Dict[str, Any]:
+        return {'batches': self.batches, 'queries': self.queries,
+                'mean_batch_size': self.queries / self.batches if self.batches else 0.0}
+
+
+# --- Batch functions (run in worker threads) ---
+
+def _semantic_batch(queries: List[str], n_results: int) -> List[List[Dict[str, Any]]]:
+    try:
+        result_lists = semantic_search_batch(queries, n_results, raise_errors=True)
+    except Exception as e:
+        raise BackendUnavailable(f"Semantic search failed: {e}") from e
+    attach_documents(result_lists)
+    return result_lists
+
+
+def _baseline_batch(queries: List[str], n_results: int) -> List[List[Dict[str, Any]]]:
+    if not warmup_baseline():
+        raise BackendUnavailable("Baseline model not found; run wsl_scripts/build_baseline.py")
+    result_lists = search_baseline_batch(queries, n_results)
+    attach_documents(result_lists)
+    return result_lists
+
+
+def _hybrid_batch(queries: List[str], n_results: int, fusion: str, alpha: float) -> List[List[Dict[str, Any]]]:
+    if not warmup_baseline():
+        raise BackendUnavailable("Baseline model not found; run wsl_scripts/build_baseline.py")
+    try:
+        return hybrid_search_batch(queries, n_results, fusion, alpha, raise_errors=True)
+    except Exception as e:
+        raise BackendUnavailable(f"Semantic search failed: {e}") from e
+
+
+batchers = {
+    'semantic': MicroBatcher(_semantic_batch),
+    'baseline': MicroBatcher(_baseline_batch),
+    'hybrid': MicroBatcher(_hybrid_batch),
+}
+
+
+# --- Schemas ---
+
+class SearchRequest(BaseModel):
+    query: str = Field(..., min_length=1)
+    n_results: int = Field(5, ge=1, le=MAX_RESULTS)
+
+
+class HybridSearchRequest(SearchRequest):
+    fusion: Literal["rrf", "blend"] = HYBRID_FUSION
+    alpha: float = Field(HYBRID_ALPHA, ge=0.0, le=1.0)
+
+
+class SearchResult(BaseModel):
+    id: str
+    score: float
+    document: Optional[str] = None
+    title: Optional[str] = None
+    url: Optional[str] = None
+    semantic_rank: Optional[int] = None
+    baseline_rank: Optional[int] = None
+
+
+class SearchResponse(BaseModel):
+    query: str
+    engine: str
+    results: List[SearchResult]
+
+
+class Document(BaseModel):
+    id: str
+    text: str
+    title: Optional[str] = None
+    url: Optional[str] = None
+
+
+class DocumentsResponse(BaseModel):
+    documents: List[Document]
+    missing: List[str]
+
+
+def to_response(query: str, engine: str, results: List[Dict[str, Any]]) -> SearchResponse:
+    """Converts engine results (numpy scores, 'similarity' or 'score') into the response schema."""
+    return SearchResponse(query=query, engine=engine, results=[
+        SearchResult(
+            id=result['id'],
+            score=float(result['score'] if 'score' in result else result['similarity']),
+            document=result.get('document'),
+            title=result.get('title'),
+            url=result.get('url'),
+            semantic_rank=result.get('semantic_rank'),
+            baseline_rank=result.get('baseline_rank'),
+        )
+        for result in results
+    ])
+
+
+# --- App ---
+
+def load_models() -> Dict[str, bool]:
+    """Loads the baseline index, the semantic backend, the query encoder and the document store."""
+    status = {
+        'baseline': warmup_baseline(),
+        'semantic': test_connection(),
+        'doc_store': get_doc_store() is not None,
+    }
+    if status['semantic'] and (QUERY_EMBEDDING == "client" or SEMANTIC_BACKEND in ("local", "ann")):
+        try:
+            get_query_encoder()
+        except Exception as e:
+            print(f"Error loading the query encoder: {e}")
+            status['semantic'] = False
+    return status
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    app.state.status = await asyncio.to_thread(load_models)
+    yield
+
+
+app = FastAPI(title="Data Science Q&A Search", lifespan=lifespan)
+
+
+async def submit(engine: str, query: str, *args) -> List[Dict[str, Any]]:
+    """Searches through the engine's batcher; an unavailable engine becomes a 503 response."""
+    try:
+        return await batchers[engine].submit(query, *args)
+    except BackendUnavailable as e:
+        raise HTTPException(status_code=503, detail=str(e))
+
+
+@app.post("/search/semantic", response_model=SearchResponse)
+async def search_semantic_endpoint(request: SearchRequest) -> SearchResponse:
+    results = await submit('semantic', request.query, request.n_results)
+    return to_response(request.query, "semantic", results)
+
+
+@app.post("/search/baseline", response_model=SearchResponse)
+async def search_baseline_endpoint(request: SearchRequest) -> SearchResponse:
+    results = await submit('baseline', request.query, request.n_results)
+    return to_response(request.query, "baseline", results)
+
+
+@app.post("/search/hybrid", response_model=SearchResponse)
+async def search_hybrid_endpoint(request: HybridSearchRequest) -> SearchResponse:
+    results = await submit('hybrid', request.query, request.n_results, request.fusion, request.alpha)
+    return to_response(request.query, "hybrid", results)
+
+
+@app.get("/documents", response_model=DocumentsResponse)
+async def documents_endpoint(ids: List[str] = Query(..., max_length=MAX_DOCUMENT_IDS)) -> DocumentsResponse:
+    ids = list(dict.fromkeys(ids))
+    store = await asyncio.to_thread(document_store)
+    if store is not None:
+        records = await asyncio.to_thread(store.get, ids)
+    else:
+        try:
+            texts = await asyncio.to_thread(fetch_documents, ids)
+        except Exception as e:
+            raise HTTPException(status_code=503, detail=f"Document backend unavailable: {e}")
+        records = {doc_id: {'id': doc_id, 'text': text} for doc_id, text in texts.items()}
+    return DocumentsResponse(documents=[Document(**records[doc_id]) for doc_id in ids if doc_id in records],
+                             missing=[doc_id for doc_id in ids if doc_id not in records])
+
+
+@app.get("/health")
+async def health() -> Dict[str, Any]:
+    return {
+        'status': getattr(app.state, 'status', {}),
+        'semantic_backend': SEMANTIC_BACKEND,
+        'result_cache': get_result_cache().info(),
+        'batching': {name: batcher.stats() for name, batcher in batchers.items()},
+    }
+
+
+if __name__ == "__main__":
+    uvicorn.run(app, host=API_HOST, port=API_PORT)
@@ -1,72 +1,332 @@
 import os
+import sys
+import logging
+import threading
 import joblib
+import numpy as np
 from pathlib import Path
+from typing import Optional
 from sklearn.metrics.pairwise import cosine_similarity
 
+# Add the project root to Python path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.diagnostics import QueryTrace, finish_trace, start_trace
+from src.result_cache import file_version, get_result_cache
+from src.tfidf_index import TfidfIndex
+from src.utils import top_k_indices, top_k_rows
+
+logger = logging.getLogger(__name__)
+
 # --- Configuration ---
-# 1. Load the pre-built model components
+# Upper bound on the dense score block materialized by search_baseline_batch
+BATCH_MAX_DENSE_SCORES = 2 ** 24
+
 # Get the project root (parent of src directory)
-try:
-    PROJECT_ROOT = Path(__file__).parent.parent
-    MODEL_DIR = PROJECT_ROOT / 'models'
-    print(f"PROJECT_ROOT: {PROJECT_ROOT}")
-    print(f"MODEL_DIR: {MODEL_DIR}")
-except Exception as e:
-    print(f"Error setting up paths: {e}")
-    PROJECT_ROOT = None
-    MODEL_DIR = None
-
-try:
-    if MODEL_DIR is None:
-        raise FileNotFoundError("MODEL_DIR is None - path setup failed")
-    
-    vectorizer = joblib.load(MODEL_DIR / "tfidf_vectorizer.joblib")
-    tfidf_matrix = joblib.load(MODEL_DIR / "tfidf_matrix.joblib")
-    doc_ids = joblib.load(MODEL_DIR / "tfidf_ids.joblib")
-    print("Loaded model components successfully.")
-except (FileNotFoundError, TypeError) as e:
-    print(f"Error: Model components not found in {MODEL_DIR} directory. Please run 'wsl_scripts/build_baseline.py' to build the baseline model.")
-    print(f"Error details: {e}")
-    vectorizer, tfidf_matrix, doc_ids = None, None, None
+PROJECT_ROOT = Path(__file__).parent.parent
+MODEL_DIR = PROJECT_ROOT / 'models'
+INDEX_DIR = MODEL_DIR / 'tfidf_index'
+
+# The index is loaded on first use (or by warmup()) and then shared by every
+# thread of the process; importing this module does no I/O.
+_index = None
+_index_version = None
+_index_lock = threading.Lock()
+
+
+def load_index() -> Optional[TfidfIndex]:
+    """
+    Loads the pre-built model components from MODEL_DIR.
+
+    Returns:
+        The TfidfIndex, or None if the model has not been built
+    """
+    try:
+        if INDEX_DIR.exists():
+            # Memory-mapped index: opened in place, shared with other processes via the page cache
+            return TfidfIndex.load(INDEX_DIR)
+
+        # Legacy joblib files: unpickled into private memory
+        return TfidfIndex.from_vectorizer(
+            joblib.load(MODEL_DIR / "tfidf_vectorizer.joblib"),
+            joblib.load(MODEL_DIR / "tfidf_matrix.joblib"),
+            joblib.load(MODEL_DIR / "tfidf_ids.joblib")
+        )
+    except (FileNotFoundError, TypeError) as e:
+        logger.warning("Model components not found in %s (%s); run 'wsl_scripts/build_baseline.py' "
+                       "to build the baseline model.", MODEL_DIR, e)
+        return None
+
+
+def get_index() -> Optional[TfidfIndex]:
+    """
+    Returns the process-wide index, loading it on the first call.
+
+    Loading is guarded by a lock so concurrent first searches load it once.
+    A failed load is not cached, so building the model later makes it available
+    without restarting the process.
+    """
+    global _index, _index_version
+    if _index is None:
+        with _index_lock:
+            if _index is None:
+                version = file_version(INDEX_DIR / "config.json", MODEL_DIR / "tfidf_matrix.joblib")
+                _index = load_index()
+                _index_version = version
+    return _index
+
+
+def index_version() -> Optional[str]:
+    """
+    Returns the version of the loaded index (a fingerprint of its files when
+    it was loaded), used to key cached results; None before it is loaded.
+    """
+    return _index_version
+
+
+def warmup() -> bool:
+    """
+    Loads the index ahead of the first search.
+
+    Returns:
+        True if the baseline model is available, False otherwise
+    """
+    return get_index() is not None
+
+
+def score_sparse(query_vector, term_doc_matrix, n_results: int,
+                 trace: Optional[QueryTrace] = None) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Scores the corpus with a single sparse vector-matrix product and selects the top-k.
+
+    Both the query vector and the TF-IDF rows are L2-normalized by the vectorizer,
+    so their dot product already is the cosine similarity. Multiplying against the
+    term-major matrix only visits the postings of the query terms, and the top-k is
+    taken with argpartition over the matched documents only.
+
+    Args:
+        query_vector: 1 x V sparse TF-IDF vector of the query
+        term_doc_matrix: V x N CSR matrix (the transposed TF-IDF matrix)
+        n_results: The number of top results to return
+        trace: Optional trace receiving the scoring and top-k timings
+
+    Returns:
+        Tuple of (document indices, scores), best first. Documents that share no
+        term with the query are never returned.
+    """
+    scores = (query_vector @ term_doc_matrix).tocsr()
+    if trace:
+        trace.mark("scoring")
+        trace.stats['candidates'] = scores.nnz
+
+    top = top_k_indices(scores.data, n_results)
+    if trace:
+        trace.mark("top_k")
+    return scores.indices[top], scores.data[top]
+
+
+def score_dense(query_vector, tfidf_matrix, n_results: int,
+                trace: Optional[QueryTrace] = None) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Scores every document with cosine_similarity and a full argsort.
+
+    This is the original implementation, kept as a reference for benchmarks
+    and for checking the sparse engine.
 
+    Args:
+        query_vector: 1 x V sparse TF-IDF vector of the query
+        tfidf_matrix: N x V TF-IDF matrix of the corpus
+        n_results: The number of top results to return
+        trace: Optional trace receiving the scoring and top-k timings
 
-def search_baseline(query: str, n_results: int = 5) -> list[dict]:
+    Returns:
+        Tuple of (document indices, scores), best first.
+    """
+    scores = cosine_similarity(tfidf_matrix, query_vector).flatten()
+    if trace:
+        trace.mark("scoring")
+        trace.stats['candidates'] = len(scores)
+
+    top_n_indices = scores.argsort()[-n_results:][::-1]
+    if trace:
+        trace.mark("top_k")
+    return top_n_indices, scores[top_n_indices]
+
+
+def bm25_query_terms(query: str, index: TfidfIndex) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Tokenizes a query with the vectorizer's analyzer for BM25 scoring.
+
+    Args:
+        query: The search query string
+        index: The index whose analyzer and vocabulary are used
+
+    Returns:
+        Tuple of (vocabulary indices, query term counts) for the known terms
+    """
+    term_ids = index.term_indices(index.analyzer(query))
+    term_ids, counts = np.unique(term_ids, return_counts=True)
+    return term_ids, counts.astype(np.float64)
+
+
+def search_baseline(query: str, n_results: int = 5, engine: str = "sparse", scoring: str = "tfidf") -> list[dict]:
     """
     Performs a TF-IDF search on the pre-built index.
+
+    Results are cached (see src/result_cache.py) under the normalized query,
+    the parameters and the index version.
     
     Args:
         query: The search query string.
         n_results: The number of top results to return.
+        engine: "sparse" (default) scores only documents sharing a term with the
+            query; "inverted" walks postings lists with MaxScore pruning; "dense"
+            is the original full cosine_similarity + argsort path.
+        scoring: "tfidf" (default) for TF-IDF cosine similarity, or "bm25"
+            (only available with engine="inverted").
         
     Returns:
         A list of dictionaries, each containing 'id' and 'score'.
+
+    When DEBUG logging is enabled for this module, a QueryTrace with the transform,
+    scoring and top-k timings is logged and available from
+    src.diagnostics.last_trace().
     """
-    if vectorizer is None:
+    if get_index() is None:
         return []
-        
-    # 1. Transform the query into a TF-IDF vector
-    query_vector = vectorizer.transform([query])
-    print(f"Query vector shape: {query_vector.shape}")
-    print(f"Query vector: {query_vector.toarray()}")
-            
-    # 2. Compute the cosine similarity between the query and the corpus
-    scores = cosine_similarity(tfidf_matrix, query_vector).flatten()
-    print(f"Cosine similarities: {scores}")
+    return get_result_cache().get_or_search(
+        "baseline", query, n_results, {'engine': engine, 'scoring': scoring}, index_version(),
+        lambda: _search_baseline(query, n_results, engine, scoring)
+    )
 
-    # 3. Get the indices of the top-n results
-    top_n_indices = scores.argsort()[-n_results:][::-1]
-    print(f"Top {n_results} indices: {top_n_indices}")
 
-    #4. Format the results
+def _search_baseline(query: str, n_results: int, engine: str, scoring: str) -> list[dict]:
+    """search_baseline without the result cache."""
+    trace = start_trace(logger, f"baseline/{engine}/{scoring}", query, n_results)
+
+    index = get_index()
+    if trace:
+        trace.mark("load")
+
+    if engine not in ("sparse", "inverted", "dense"):
+        raise ValueError(f"Unknown baseline engine: {engine!r}")
+    if scoring not in ("tfidf", "bm25"):
+        raise ValueError(f"Unknown baseline scoring: {scoring!r}")
+
+    if scoring == "bm25":
+        if engine != "inverted":
+            raise ValueError("BM25 scoring is only available with engine='inverted'")
+        if index.bm25 is None:
+            logger.warning("BM25 index not found; re-run 'wsl_scripts/build_baseline.py'.")
+            return []
+
+        # 1. Map the query tokens to vocabulary indices
+        term_ids, term_weights = bm25_query_terms(query, index)
+        if trace:
+            trace.mark("transform")
+            trace.stats['query_terms'] = len(term_ids)
+
+        # 2. Walk the BM25 postings of the query terms
+        top_n_indices, top_n_scores = index.bm25.search(term_ids, term_weights, n_results, trace)
+    else:
+        # 1. Transform the query into a TF-IDF vector
+        query_vector = index.transform([query])
+        if trace:
+            trace.mark("transform")
+            trace.stats['query_terms'] = query_vector.nnz
+
+        # 2. Score the corpus and keep the top-n results
+        if engine == "sparse":
+            top_n_indices, top_n_scores = score_sparse(query_vector, index.term_doc_matrix, n_results, trace)
+        elif engine == "inverted":
+            top_n_indices, top_n_scores = index.tfidf_inverted.search(query_vector.indices, query_vector.data, n_results, trace)
+        else:
+            top_n_indices, top_n_scores = score_dense(query_vector, index.tfidf_matrix, n_results, trace)
+
+    # 3. Format the results
     results = []
-    for idx in top_n_indices:
+    for idx, score in zip(top_n_indices, top_n_scores):
         results.append({
-        'id': doc_ids[idx],
-        'score': scores[idx]
+        'id': str(index.doc_ids[idx]),
+        'score': score
         })
+    if trace:
+        trace.mark("format")
+    finish_trace(logger, trace)
     return results
-    
+
+
+def search_baseline_batch(queries: list[str], n_results: int = 5) -> list[list[dict]]:
+    """
+    Performs a TF-IDF search for many queries at once; cached queries are
+    answered from the result cache and only the rest are searched.
+
+    All queries are vectorized in one transform call and scored with one sparse
+    matrix-matrix product; the top-k of every row is then selected with a
+    row-wise argpartition over blocks of at most BATCH_MAX_DENSE_SCORES scores.
+    Each inner list matches search_baseline(query, n_results) for that query.
+
+    Args:
+        queries: The search query strings.
+        n_results: The number of top results to return per query.
+
+    Returns:
+        One list of {'id', 'score'} dictionaries per query, in query order.
+    """
+    if get_index() is None:
+        return [[] for _ in queries]
+    # Cached under the parameters of the equivalent search_baseline call
+    return get_result_cache().get_or_search_batch(
+        "baseline", queries, n_results, {'engine': 'sparse', 'scoring': 'tfidf'}, index_version(),
+        lambda missing: _search_baseline_batch(missing, n_results)
+    )
+
+
+def _search_baseline_batch(queries: list[str], n_results: int) -> list[list[dict]]:
+    """search_baseline_batch without the result cache."""
+    trace = start_trace(logger, "baseline/batch", queries, n_results)
+
+    index = get_index()
+    if trace:
+        trace.mark("load")
+
+    # 1. Transform all queries into one Q x V TF-IDF matrix
+    query_matrix = index.transform(queries)
+    if trace:
+        trace.mark("transform")
+        trace.stats['queries'] = len(queries)
+
+    # 2. Score all queries against the corpus in one sparse product (Q x N)
+    scores = (query_matrix @ index.term_doc_matrix).tocsr()
+    if trace:
+        trace.mark("scoring")
+        trace.stats['candidates'] = scores.nnz
+
+    # 3. Row-wise top-n over dense blocks of queries
+    n_docs = scores.shape[1]
+    block_size = max(1, BATCH_MAX_DENSE_SCORES // max(n_docs, 1))
+
+    results = []
+    for start in range(0, len(queries), block_size):
+        block_indices, block_scores = top_k_rows(scores[start:start + block_size].toarray(), n_results)
+        for row_indices, row_scores in zip(block_indices, block_scores):
+            results.append([
+                {'id': str(index.doc_ids[idx]), 'score': score}
+                for idx, score in zip(row_indices, row_scores)
+                if score > 0
+            ])
+    if trace:
+        trace.mark("top_k")
+    finish_trace(logger, trace)
+    return results
+
+
 if __name__ == "__main__":
+    from src.diagnostics import last_trace
+
+    # Enable per-query tracing for the smoke test
+    logger.setLevel(logging.DEBUG)
+
     print("Testing the baseline model...")
     print("-" * 60)
     test_query = "what is ridge regression?"
@@ -79,6 +339,11 @@ if __name__ == "__main__":
             print(f"  ID: {result['id']}, Score: {result['score']:.4f}")
     else:
         print("No results found.")
+
+    trace = last_trace()
+    if trace:
+        timings = ", ".join(f"{stage}={ms:.3f}ms" for stage, ms in trace.timings_ms.items())
+        print(f"Timings: {timings}")
     print("-" * 60)
     print("Test complete.")
     print("-" * 60)
\ No newline at end of file
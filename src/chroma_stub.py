@@ -0,0 +1,205 @@
+"""
+In-memory stand-in for the ChromaDB HTTP client.
+Implements the subset of the client and collection API used by this project
+(heartbeat, collection management, add/upsert/get/query/delete/count) so the
+search, ingestion and benchmark code can run offline without a Chroma server.
+
+Usage:
+    from src.chroma_stub import InMemoryChromaClient
+    from src.semantic_search import ChromaConnection, set_connection
+
+    client = InMemoryChromaClient()
+    client.create_collection("semantic_search_engine", metadata={"hnsw:space": "cosine"})
+    set_connection(ChromaConnection(client_factory=lambda: client))
+"""
+
+import threading
+import time
+import numpy as np
+from typing import Any, Callable, Dict, List, Optional
+
+
+class StubFailure(ConnectionError):
+    """Raised by the stub when a failure has been injected with fail_next()."""
+
+
+class InMemoryCollection:
+    """A collection holding ids, embeddings, documents and metadatas in memory."""
+
+    def __init__(self, client: "InMemoryChromaClient", name: str, metadata: Optional[dict] = None,
+                 embedding_function: Optional[Callable[[List[str]], Any]] = None):
+        self._client = client
+        self.name = name
+        self.metadata = metadata
+        self._embedding_function = embedding_function
+        self._lock = threading.Lock()
+        self._rows: Dict[str, dict] = {}
+
+    # --- Writes ---
+    def add(self, ids, embeddings=None, documents=None, metadatas=None) -> None:
+        """Adds records; ids that already exist are skipped, as in ChromaDB 0.4."""
+        self._write(ids, embeddings, documents, metadatas, overwrite=False)
+
+    def upsert(self, ids, embeddings=None, documents=None, metadatas=None) -> None:
+        """Adds new records and overwrites existing ones."""
+        self._write(ids, embeddings, documents, metadatas, overwrite=True)
+
+    def delete(self, ids=None) -> None:
+        self._client._request()
+        with self._lock:
+            for doc_id in ids or []:
+                self._rows.pop(doc_id, None)
+
+    def _write(self, ids, embeddings, documents, metadatas, overwrite: bool) -> None:
+        self._client._request(len(ids))
+        if embeddings is None and documents is not None and self._embedding_function is not None:
+            embeddings = self._embedding_function(list(documents))
+        with self._lock:
+            for i, doc_id in enumerate(ids):
+                if doc_id in self._rows and not overwrite:
+                    continue
+                self._rows[doc_id] = {
+                    'embedding': None if embeddings is None else np.asarray(embeddings[i], dtype=np.float32),
+                    'document': None if documents is None else documents[i],
+                    'metadata': None if metadatas is None else metadatas[i],
+                }
+
+    # --- Reads ---
+    def count(self) -> int:
+        self._client._request()
+        return len(self._rows)
+
+    def get(self, ids=None, limit: Optional[int] = None, offset: Optional[int] = None,
+            include=("metadatas", "documents")) -> dict:
+        self._client._request()
+        with self._lock:
+            if ids is None:
+                selected = list(self._rows)[offset or 0:]
+                if limit is not None:
+                    selected = selected[:limit]
+            else:
+                selected = [doc_id for doc_id in ids if doc_id in self._rows]
+            rows = [self._rows[doc_id] for doc_id in selected]
+
+        return {
+            'ids': selected,
+            'embeddings': [row['embedding'] for row in rows] if "embeddings" in include else None,
+            'documents': [row['document'] for row in rows] if "documents" in include else None,
+            'metadatas': [row['metadata'] for row in rows] if "metadatas" in include else None,
+        }
+
+    def query(self, query_embeddings=None, query_texts=None, n_results: int = 10,
+              include=("metadatas", "documents", "distances")) -> dict:
+        """Exact nearest-neighbour search with the collection's distance ("hnsw:space")."""
+        self._client._request()
+        if query_embeddings is None:
+            if query_texts is None or self._embedding_function is None:
+                raise ValueError("The stub needs query_embeddings or an embedding_function for query_texts.")
+            query_embeddings = self._embedding_function(list(query_texts))
+
+        with self._lock:
+            ids = list(self._rows)
+            rows = [self._rows[doc_id] for doc_id in ids]
+        queries = np.asarray(query_embeddings, dtype=np.float32).reshape(len(query_embeddings), -1)
+        if not ids:
+            empty = [[] for _ in range(len(queries))]
+            return {'ids': empty, 'embeddings': None, 'documents': empty, 'metadatas': empty, 'distances': empty}
+
+        matrix = np.vstack([row['embedding'] for row in rows])
+        space = (self.metadata or {}).get("hnsw:space", "l2")
+        if space == "cosine":
+            matrix_norms = np.maximum(np.linalg.norm(matrix, axis=1), 1e-12)
+            query_norms = np.maximum(np.linalg.norm(queries, axis=1, keepdims=True), 1e-12)
+            distances = 1.0 - (queries @ matrix.T) / query_norms / matrix_norms
+        elif space == "ip":
+            distances = 1.0 - queries @ matrix.T
+        else:
+            distances = ((queries[:, None, :] - matrix[None, :, :]) ** 2).sum(axis=2)
+
+        result = {'ids': [], 'embeddings': None, 'documents': [], 'metadatas': [], 'distances': []}
+        for row_distances in distances:
+            order = np.argsort(row_distances, kind='stable')[:n_results]
+            result['ids'].append([ids[i] for i in order])
+            result['documents'].append([rows[i]['document'] for i in order])
+            result['metadatas'].append([rows[i]['metadata'] for i in order])
+            result['distances'].append([float(row_distances[i]) for i in order])
+
+        for key in ("documents", "metadatas", "distances"):
+            if key not in include:
+                result[key] = None
+        return result
+
+
+class InMemoryChromaClient:
+    """
+    Stand-in for chromadb.HttpClient.
+
+    Args:
+        latency: Seconds to sleep on every request, to mimic the HTTP round trip
+        max_batch_size: Largest number of records accepted by one write request
+        embedding_function: Optional callable used for query_texts / documents-only adds
+        latency_per_record: Extra seconds per record written, to mimic serialization
+            and indexing cost growing with the batch size
+    """
+
+    def __init__(self, latency: float = 0.0, max_batch_size: int = 41666,
+                 embedding_function: Optional[Callable[[List[str]], Any]] = None,
+                 latency_per_record: float = 0.0):
+        self.latency = latency
+        self.latency_per_record = latency_per_record
+        self.max_batch_size = max_batch_size
+        self.embedding_function = embedding_function
+        self.requests = 0
+        self._failures = 0
+        self._lock = threading.Lock()
+        self._collections: Dict[str, InMemoryCollection] = {}
+
+    def fail_next(self, n: int = 1) -> None:
+        """Makes the next n requests raise StubFailure."""
+        with self._lock:
+            self._failures += n
+
+    def _request(self, batch_size: int = 0) -> None:
+        with self._lock:
+            self.requests += 1
+            if self._failures:
+                self._failures -= 1
+                raise StubFailure("Injected ChromaDB stub failure")
+        if batch_size > self.max_batch_size:
+            raise ValueError(f"Batch size {batch_size} exceeds maximum batch size {self.max_batch_size}")
+        delay = self.latency + batch_size * self.latency_per_record
+        if delay:
+            time.sleep(delay)
+
+    def get_max_batch_size(self) -> int:
+        return self.max_batch_size
+
+    def heartbeat(self) -> int:
+        self._request()
+        return time.time_ns()
+
+    def get_collection(self, name: str, embedding_function=None) -> InMemoryCollection:
+        self._request()
+        if name not in self._collections:
+            raise ValueError(f"Collection {name} does not exist.")
+        return self._collections[name]
+
+    def create_collection(self, name: str, metadata: Optional[dict] = None, embedding_function=None) -> InMemoryCollection:
+        self._request()
+        if name in self._collections:
+            raise ValueError(f"Collection {name} already exists.")
+        self._collections[name] = InMemoryCollection(self, name, metadata, embedding_function or self.embedding_function)
+        return self._collections[name]
+
+    def get_or_create_collection(self, name: str, metadata: Optional[dict] = None, embedding_function=None) -> InMemoryCollection:
+        if name in self._collections:
+            return self.get_collection(name)
+        return self.create_collection(name, metadata, embedding_function)
+
+    def delete_collection(self, name: str) -> None:
+        self._request()
+        self._collections.pop(name, None)
+
+    def list_collections(self) -> List[InMemoryCollection]:
+        self._request()
+        return list(self._collections.values())
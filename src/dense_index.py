@@ -0,0 +1,195 @@
+"""
+In-process exact vector search over the corpus embeddings.
+Maps the embeddings artifact written by wsl_scripts/embeddings.py (an
+L2-normalized float32 matrix and an Arrow table of the documents, see
+src/embedding_artifact.py) and answers queries with a BLAS mat-vec (or
+mat-mat for batches) followed by an argpartition top-k, with no vector
+database in the loop.
+"""
+
+import os
+import sys
+import threading
+import numpy as np
+import polars as pl
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+# Add the project root to Python path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.embedding_artifact import EmbeddingArtifact, ARTIFACT_ROOT, CURRENT_FILE
+from src.utils import (top_k_indices, top_k_rows, load_embeddings,
+                       EMBEDDINGS_MATRIX_FILE, EMBEDDINGS_DOCS_FILE, EMBEDDINGS_FILE)
+
+
+# --- Configuration ---
+PROJECT_ROOT = Path(__file__).parent.parent
+# Flat files and pickle written by older versions of wsl_scripts/embeddings.py,
+# read only when no artifact has been published
+EMBEDDINGS_MATRIX_PATH = PROJECT_ROOT / EMBEDDINGS_MATRIX_FILE
+EMBEDDINGS_DOCS_PATH = PROJECT_ROOT / EMBEDDINGS_DOCS_FILE
+EMBEDDINGS_PATH = PROJECT_ROOT / EMBEDDINGS_FILE
+
+
+def l2_normalize(matrix: np.ndarray) -> np.ndarray:
+    """Returns a C-contiguous float32 copy of matrix with unit-length rows."""
+    matrix = np.array(matrix, dtype=np.float32, order='C', copy=True, ndmin=2)
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    matrix /= np.maximum(norms, 1e-12)
+    return matrix
+
+
+class DenseIndex:
+    """
+    Exact cosine-similarity index.
+
+    Args:
+        ids: Document ids, one per row (a list or a polars Series, kept as a
+            Series so the artifact's memory-mapped id column is never copied
+            into Python strings)
+        embeddings: (N, dim) embedding matrix; normalized to unit length on load
+        documents: Document texts, one per row (a list or a polars Series)
+        normalized: The rows already have unit length; the matrix is then used
+            as given (e.g. memory-mapped) instead of copied
+        version: Version of the artifact the index was loaded from, if any
+        titles: Optional document titles, one per row
+        urls: Optional document urls, one per row
+    """
+
+    def __init__(self, ids: List[str], embeddings: np.ndarray, documents: List[str],
+                 normalized: bool = False, version: Optional[str] = None,
+                 titles: Optional[List[str]] = None, urls: Optional[List[str]] = None):
+        if not (len(ids) == len(embeddings) == len(documents)):
+            raise ValueError("ids, embeddings and documents must have the same length")
+        self.ids = ids if isinstance(ids, pl.Series) else pl.Series('id', list(ids), dtype=pl.String)
+        self.documents = documents
+        self.embeddings = embeddings if normalized else l2_normalize(embeddings)
+        self.version = version
+        self.titles = titles
+        self.urls = urls
+        self._sorted_ids: Optional[pl.Series] = None
+        self._sorted_rows: Optional[np.ndarray] = None
+        self._lookup_lock = threading.Lock()
+
+    @classmethod
+    def from_artifact(cls, artifact: EmbeddingArtifact) -> "DenseIndex":
+        """
+        Uses the artifact's memory-mapped matrix and document column without
+        copying them (the matrix is copied and normalized only if the artifact
+        holds unnormalized rows).
+        """
+        return cls(artifact.ids, artifact.embeddings, artifact.documents,
+                   normalized=artifact.manifest.get('normalized', False), version=artifact.version,
+                   titles=artifact.table['title'], urls=artifact.table['url'])
+
+    @classmethod
+    def from_files(cls, matrix_path=EMBEDDINGS_MATRIX_PATH, docs_path=EMBEDDINGS_DOCS_PATH,
+                   legacy_path=EMBEDDINGS_PATH) -> "DenseIndex":
+        """
+        Loads the legacy .npy matrix and sidecar JSONL (or the pickle if the
+        matrix does not exist) written by older versions of embeddings.py.
+        """
+        return cls(*load_embeddings(str(matrix_path), str(docs_path), legacy_path=str(legacy_path)))
+
+    @property
+    def dimension(self) -> int:
+        return self.embeddings.shape[1]
+
+    def search(self, query_embedding: np.ndarray, k: int) -> tuple[np.ndarray, np.ndarray]:
+        """
+        Returns the top-k rows for one query embedding.
+
+        Returns:
+            Tuple of (row indices, cosine similarities), best first
+        """
+        query = l2_normalize(query_embedding)[0]
+        similarities = self.embeddings @ query
+        top = top_k_indices(similarities, k)
+        return top, similarities[top]
+
+    def search_batch(self, query_embeddings: np.ndarray, k: int) -> tuple[np.ndarray, np.ndarray]:
+        """
+        Returns the top-k rows for every query embedding with one matrix product.
+
+        Returns:
+            Tuple of (Q x k row indices, Q x k cosine similarities), rows best first
+        """
+        queries = l2_normalize(query_embeddings)
+        similarities = queries @ self.embeddings.T
+        return top_k_rows(similarities, k)
+
+    def format_results(self, rows: np.ndarray, similarities: np.ndarray) -> List[Dict[str, Any]]:
+        """Formats rows like semantic_search: 'id', 'document', 'distance', 'similarity', 'metadata'."""
+        rows = np.asarray(rows, dtype=np.int64)
+        return [
+            {
+                'id': doc_id,
+                'document': self.documents[int(row)],
+                'distance': 1.0 - float(similarity),
+                'similarity': float(similarity),
+                'metadata': None,
+            }
+            for doc_id, row, similarity in zip(self.ids.gather(rows).to_list(), rows, similarities)
+        ]
+
+    def find_rows(self, ids: List[str]) -> Dict[str, int]:
+        """
+        Returns {id: row} for the ids present in the index, by binary search in a
+        sorted copy of the id column built on the first call.
+        """
+        if self._sorted_ids is None:
+            with self._lookup_lock:
+                if self._sorted_ids is None:
+                    order = self.ids.arg_sort()
+                    self._sorted_rows = order.to_numpy()
+                    self._sorted_ids = self.ids.gather(order)
+        ids = list(dict.fromkeys(ids))
+        if not ids:
+            return {}
+        positions = self._sorted_ids.search_sorted(pl.Series(ids, dtype=pl.String)).to_numpy()
+        found = {}
+        for doc_id, position in zip(ids, positions):
+            if position < len(self._sorted_ids) and self._sorted_ids[int(position)] == doc_id:
+                found[doc_id] = int(self._sorted_rows[position])
+        return found
+
+    def get(self, ids: List[str]) -> Dict[str, Dict[str, Any]]:
+        """
+        Returns {id: {'id', 'title', 'url', 'text'}} for the ids present, like
+        DocStore.get; title and url are None if empty or not loaded.
+        """
+        return {
+            doc_id: {'id': doc_id,
+                     'title': (self.titles[row] or None) if self.titles is not None else None,
+                     'url': (self.urls[row] or None) if self.urls is not None else None,
+                     'text': self.documents[row]}
+            for doc_id, row in self.find_rows(ids).items()
+        }
+
+    def get_documents(self, ids: List[str]) -> Dict[str, str]:
+        """Returns a mapping of id to document text for the ids present in the index."""
+        return {doc_id: self.documents[row] for doc_id, row in self.find_rows(ids).items()}
+
+
+_index: Optional[DenseIndex] = None
+_index_lock = threading.Lock()
+
+
+def get_dense_index() -> DenseIndex:
+    """
+    Returns the process-wide dense index, loading it on the first call from
+    the current embeddings artifact, or from the legacy files if none exists.
+
+    Raises:
+        FileNotFoundError: If the embeddings have not been generated
+    """
+    global _index
+    if _index is None:
+        with _index_lock:
+            if _index is None:
+                if (ARTIFACT_ROOT / CURRENT_FILE).exists():
+                    _index = DenseIndex.from_artifact(EmbeddingArtifact.open())
+                else:
+                    _index = DenseIndex.from_files()
+    return _index
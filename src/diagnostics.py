@@ -0,0 +1,81 @@
+"""
+Per-query diagnostics for the search engines.
+Tracing is gated on the DEBUG level of the engine's logger: when it is disabled
+no trace object is created and the hot path only pays a None check.
+
+Usage:
+    import logging
+    logging.basicConfig()
+    logging.getLogger("src.baseline").setLevel(logging.DEBUG)
+
+    search_baseline("what is ridge regression?")
+    trace = last_trace()  # QueryTrace with timings_ms and stats
+"""
+
+import logging
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import Any, Dict, Optional
+
+
+_local = threading.local()
+
+
+@dataclass
+class QueryTrace:
+    """
+    Timings (milliseconds) of the stages of one search call, plus engine stats
+    such as the number of query terms or candidate documents.
+    """
+    engine: str
+    query: Any
+    n_results: int
+    timings_ms: Dict[str, float] = field(default_factory=dict)
+    stats: Dict[str, Any] = field(default_factory=dict)
+    _last_mark: float = field(default_factory=time.perf_counter, repr=False)
+
+    def mark(self, stage: str) -> None:
+        """Records the time elapsed since the previous mark (or creation) as `stage`."""
+        now = time.perf_counter()
+        self.timings_ms[stage] = self.timings_ms.get(stage, 0.0) + (now - self._last_mark) * 1000
+        self._last_mark = now
+
+    @property
+    def total_ms(self) -> float:
+        return sum(self.timings_ms.values())
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {
+            'engine': self.engine,
+            'query': self.query,
+            'n_results': self.n_results,
+            'timings_ms': dict(self.timings_ms),
+            'total_ms': self.total_ms,
+            'stats': dict(self.stats),
+        }
+
+
+def start_trace(logger: logging.Logger, engine: str, query: Any, n_results: int) -> Optional[QueryTrace]:
+    """
+    Starts a trace if DEBUG is enabled on the logger.
+
+    Returns:
+        A new QueryTrace, or None when tracing is disabled
+    """
+    if not logger.isEnabledFor(logging.DEBUG):
+        return None
+    return QueryTrace(engine=engine, query=query, n_results=n_results)
+
+
+def finish_trace(logger: logging.Logger, trace: Optional[QueryTrace]) -> None:
+    """Logs a finished trace and keeps it as the calling thread's last trace."""
+    if trace is None:
+        return
+    _local.last_trace = trace
+    logger.debug("%s query traced in %.3f ms: %s", trace.engine, trace.total_ms, trace.as_dict())
+
+
+def last_trace() -> Optional[QueryTrace]:
+    """Returns the last trace finished on the calling thread, if any."""
+    return getattr(_local, 'last_trace', None)
@@ -0,0 +1,228 @@
+"""
+Memory-mapped document store for hydrating search hits.
+
+Built once from the cleaned corpus (data/ds_corpus_clean.jsonl) by
+wsl_scripts/build_baseline.py. Each field (id, title, url, text) is one UTF-8
+blob plus an (N + 1) int64 offsets array, and ids are looked up through a
+sorted array of 64-bit id hashes, so opening the store maps a few files and
+fetching a document is a binary search and a slice, with no Python dict
+built and no ChromaDB round trip:
+
+    models/doc_store/
+        id.bin, title.bin, url.bin, text.bin      concatenated field values
+        id_offsets.npy, ...                        row i is blob[offsets[i]:offsets[i + 1]]
+        keys.npy, rows.npy                         sorted id hashes and their rows
+        manifest.json                              format version, count, source and its fingerprint
+
+get_doc_store() reopens the store after a rebuild and stops serving it once
+the corpus it was built from changes, so hits are never hydrated from a
+store that disagrees with the indexes rebuilt from the new corpus.
+"""
+
+import hashlib
+import json
+import os
+import shutil
+import sys
+import threading
+import numpy as np
+from array import array
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional
+
+# Add the project root to Python path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.utils import iter_jsonl
+
+
+# --- Configuration ---
+PROJECT_ROOT = Path(__file__).parent.parent
+DOC_STORE_DIR = PROJECT_ROOT / "models" / "doc_store"
+FORMAT_VERSION = 1
+FIELDS = ("id", "title", "url", "text")
+MANIFEST_FILE = "manifest.json"
+
+
+def id_key(doc_id: str) -> int:
+    """64-bit hash of a document id."""
+    return int.from_bytes(hashlib.blake2b(doc_id.encode('utf-8'), digest_size=8).digest(), 'little')
+
+
+def source_fingerprint(path) -> Optional[str]:
+    """Size and modification time of a file, or None if it does not exist."""
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return f"{stat.st_size}:{stat.st_mtime_ns}"
+
+
+def build_doc_store(jsonl_path, output_dir=DOC_STORE_DIR) -> int:
+    """
+    Streams a JSONL corpus into a document store, replacing any existing one.
+
+    Args:
+        jsonl_path: Corpus with one {'id', 'title', 'url', 'text'} record per line
+        output_dir: Store directory
+
+    Returns:
+        Number of documents stored
+    """
+    output_dir = Path(output_dir)
+    # Taken before reading, so a corpus rewritten during the build counts as changed
+    fingerprint = source_fingerprint(jsonl_path)
+    tmp_dir = output_dir.with_name(output_dir.name + ".tmp")
+    shutil.rmtree(tmp_dir, ignore_errors=True)
+    tmp_dir.mkdir(parents=True)
+
+    offsets = {field: array('q', [0]) for field in FIELDS}
+    keys = array('Q')
+    blobs = {field: open(tmp_dir / f"{field}.bin", 'wb') for field in FIELDS}
+    try:
+        for record in iter_jsonl(str(jsonl_path)):
+            for field in FIELDS:
+                value = (record.get(field) or '').encode('utf-8')
+                blobs[field].write(value)
+                offsets[field].append(offsets[field][-1] + len(value))
+            keys.append(id_key(record.get('id') or ''))
+    finally:
+        for blob in blobs.values():
+            blob.close()
+
+    for field in FIELDS:
+        np.save(tmp_dir / f"{field}_offsets.npy", np.frombuffer(offsets[field], dtype=np.int64))
+    keys = np.frombuffer(keys, dtype=np.uint64)
+    order = np.argsort(keys, kind='stable')
+    np.save(tmp_dir / "keys.npy", keys[order])
+    np.save(tmp_dir / "rows.npy", order.astype(np.int64))
+    with open(tmp_dir / MANIFEST_FILE, 'w', encoding='utf-8') as f:
+        json.dump({'format_version': FORMAT_VERSION, 'count': len(keys), 'fields': list(FIELDS),
+                   'source': str(Path(jsonl_path).resolve()), 'source_fingerprint': fingerprint}, f, indent=2)
+
+    # Swap the new store in; readers that already mapped the old files keep them
+    old_dir = output_dir.with_name(output_dir.name + ".old")
+    shutil.rmtree(old_dir, ignore_errors=True)
+    if output_dir.exists():
+        os.replace(output_dir, old_dir)
+    os.replace(tmp_dir, output_dir)
+    shutil.rmtree(old_dir, ignore_errors=True)
+    return len(keys)
+
+
+class DocStore:
+    """
+    Read-only, memory-mapped view of a document store.
+
+    Args:
+        path: Store directory written by build_doc_store()
+
+    Raises:
+        FileNotFoundError: If the store has not been built
+        ValueError: If it was written in an unsupported format version
+    """
+
+    def __init__(self, path=DOC_STORE_DIR):
+        self.path = Path(path)
+        manifest_path = self.path / MANIFEST_FILE
+        if not manifest_path.exists():
+            raise FileNotFoundError(f"{self.path} not found; run wsl_scripts/build_baseline.py first")
+        self.build = source_fingerprint(manifest_path)
+        self.stale = False  # set by get_doc_store() once the source has been seen to change
+        with open(manifest_path, 'r', encoding='utf-8') as f:
+            self.manifest = json.load(f)
+        if self.manifest.get('format_version') != FORMAT_VERSION:
+            raise ValueError(f"{self.path} has format version {self.manifest.get('format_version')}, "
+                             f"expected {FORMAT_VERSION}")
+
+        self.offsets = {field: np.load(self.path / f"{field}_offsets.npy", mmap_mode='r') for field in FIELDS}
+        self.blobs = {field: self._map_blob(self.path / f"{field}.bin") for field in FIELDS}
+        self.keys = np.load(self.path / "keys.npy", mmap_mode='r')
+        self.rows = np.load(self.path / "rows.npy", mmap_mode='r')
+
+    @staticmethod
+    def _map_blob(path: Path) -> np.ndarray:
+        # np.memmap cannot map an empty file
+        if os.path.getsize(path) == 0:
+            return np.empty(0, dtype=np.uint8)
+        return np.memmap(path, dtype=np.uint8, mode='r')
+
+    def __len__(self) -> int:
+        return self.manifest['count']
+
+    def is_rebuilt(self) -> bool:
+        """Whether the store on disk has been replaced since this one was opened."""
+        return source_fingerprint(self.path / MANIFEST_FILE) != self.build
+
+    def matches_source(self) -> bool:
+        """
+        Whether the corpus the store was built from is unchanged. A store whose
+        source file is gone (e.g. copied to another machine without data/) is
+        trusted.
+        """
+        source = self.manifest.get('source')
+        current = source_fingerprint(source) if source else None
+        return current is None or current == self.manifest.get('source_fingerprint')
+
+    def field(self, row: int, field: str) -> str:
+        """Returns one field of a row."""
+        offsets = self.offsets[field]
+        return self.blobs[field][offsets[row]:offsets[row + 1]].tobytes().decode('utf-8')
+
+    def find_rows(self, doc_ids: Iterable[str]) -> Dict[str, int]:
+        """Returns {id: row} for the ids present in the store."""
+        doc_ids = list(doc_ids)
+        if not doc_ids or not len(self.keys):
+            return {}
+        keys = np.array([id_key(doc_id) for doc_id in doc_ids], dtype=np.uint64)
+        positions = np.searchsorted(self.keys, keys)
+
+        found = {}
+        for doc_id, key, position in zip(doc_ids, keys, positions):
+            # Walk the (almost always single) entries with this hash and compare the ids
+            while position < len(self.keys) and self.keys[position] == key:
+                row = int(self.rows[position])
+                if self.field(row, 'id') == doc_id:
+                    found[doc_id] = row
+                    break
+                position += 1
+        return found
+
+    def get(self, doc_ids: Iterable[str]) -> Dict[str, Dict[str, Any]]:
+        """Returns {id: {'id', 'title', 'url', 'text'}} for the ids present; empty title / url are None."""
+        return {
+            doc_id: {field: self.field(row, field) or (None if field in ('title', 'url') else '') for field in FIELDS}
+            for doc_id, row in self.find_rows(doc_ids).items()
+        }
+
+    def get_documents(self, doc_ids: List[str]) -> Dict[str, str]:
+        """Returns a mapping of id to document text for the ids present in the store."""
+        return {doc_id: self.field(row, 'text') for doc_id, row in self.find_rows(doc_ids).items()}
+
+
+_store: Optional[DocStore] = None
+_store_lock = threading.Lock()
+
+
+def get_doc_store() -> Optional[DocStore]:
+    """
+    Returns the process-wide document store, or None if it has not been built
+    or its corpus has changed since (rebuild it with wsl_scripts/build_baseline.py).
+    The store is reopened after a rebuild, and a missing or stale store is
+    checked again on the next call.
+    """
+    global _store
+    with _store_lock:
+        if _store is None or _store.is_rebuilt():
+            try:
+                _store = DocStore()
+            except FileNotFoundError:
+                _store = None
+                return None
+        if not _store.matches_source():
+            if not _store.stale:
+                print(f"Warning: {_store.manifest.get('source')} changed after the document store was built; "
+                      "not using it. Rebuild it with wsl_scripts/build_baseline.py.")
+                _store.stale = True
+            return None
+        return _store
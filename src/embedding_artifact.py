@@ -0,0 +1,212 @@
+"""
+Versioned, memory-mappable corpus embeddings artifact.
+
+wsl_scripts/embeddings.py publishes every run as its own directory under
+models/embeddings/:
+
+    models/embeddings/
+        CURRENT                   name of the latest version
+        20250101-120000/
+            embeddings.npy        (N, dim) float32 matrix
+            documents.arrow       Arrow IPC table of id, title, url, text (uncompressed)
+            manifest.json         format version, model, dimension, normalization, row count
+
+Readers open the matrix with np.load(mmap_mode='r') and the table with
+polars.read_ipc, which memory-maps it, so opening an artifact costs the same
+for any corpus size and rows are paged in on access. Both files are plain
+data (no pickle), so an artifact can be copied between machines and loaded
+without executing anything. A version is written to a temporary directory
+and renamed into place before CURRENT is switched, so readers never see a
+partial artifact.
+"""
+
+import json
+import os
+import shutil
+import sys
+import time
+import numpy as np
+import polars as pl
+from pathlib import Path
+from typing import Iterator, Optional, Tuple
+
+# Add the project root to Python path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.utils import EMBEDDINGS_ARTIFACT_DIR
+
+
+# --- Configuration ---
+PROJECT_ROOT = Path(__file__).parent.parent
+ARTIFACT_ROOT = PROJECT_ROOT / EMBEDDINGS_ARTIFACT_DIR
+FORMAT_VERSION = 1
+MATRIX_FILE = "embeddings.npy"
+TABLE_FILE = "documents.arrow"
+MANIFEST_FILE = "manifest.json"
+CURRENT_FILE = "CURRENT"
+TABLE_SCHEMA = {'id': pl.String, 'title': pl.String, 'url': pl.String, 'text': pl.String}
+
+
+def new_version_dir(root=ARTIFACT_ROOT) -> Path:
+    """Creates and returns an empty temporary directory to write the next version into."""
+    root = Path(root)
+    root.mkdir(parents=True, exist_ok=True)
+    version = time.strftime("%Y%m%d-%H%M%S")
+    suffix = 0
+    while (root / version).exists() or (root / f".{version}.tmp").exists():
+        suffix += 1
+        version = f"{time.strftime('%Y%m%d-%H%M%S')}-{suffix}"
+    tmp_dir = root / f".{version}.tmp"
+    tmp_dir.mkdir()
+    return tmp_dir
+
+
+def write_documents_table(jsonl_path, output_path) -> None:
+    """Streams the id, title, url and text fields of a JSONL corpus into an uncompressed Arrow IPC file."""
+    pl.scan_ndjson(jsonl_path, schema=TABLE_SCHEMA).sink_ipc(output_path, compression='uncompressed')
+
+
+def publish(tmp_dir, model_name: str, normalized: bool = False, **extra) -> Path:
+    """
+    Validates a version written to tmp_dir, adds its manifest, renames it into
+    place and points CURRENT at it.
+
+    Args:
+        tmp_dir: Directory from new_version_dir() holding MATRIX_FILE and TABLE_FILE
+        model_name: Encoder that produced the embeddings
+        normalized: Whether the rows are L2-normalized
+        **extra: Further manifest fields (pooling, max_length, backend, ...)
+
+    Returns:
+        The published version directory
+
+    Raises:
+        ValueError: If the matrix and the table have different row counts
+    """
+    tmp_dir = Path(tmp_dir)
+    matrix = np.load(tmp_dir / MATRIX_FILE, mmap_mode='r')
+    n_rows = pl.scan_ipc(tmp_dir / TABLE_FILE).select(pl.len()).collect().item()
+    if n_rows != len(matrix):
+        raise ValueError(f"{TABLE_FILE} has {n_rows} rows but {MATRIX_FILE} has {len(matrix)}")
+
+    version = tmp_dir.name[1:-len(".tmp")]
+    manifest = {
+        'format_version': FORMAT_VERSION,
+        'version': version,
+        'created_at': time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        'model_name': model_name,
+        'dimension': int(matrix.shape[1]),
+        'count': int(len(matrix)),
+        'dtype': 'float32',
+        'normalized': normalized,
+        'files': {'matrix': MATRIX_FILE, 'documents': TABLE_FILE},
+        **extra,
+    }
+    del matrix
+    with open(tmp_dir / MANIFEST_FILE, 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, indent=2)
+
+    version_dir = tmp_dir.parent / version
+    os.replace(tmp_dir, version_dir)
+    current_tmp = tmp_dir.parent / f"{CURRENT_FILE}.tmp"
+    current_tmp.write_text(version + "\n", encoding='utf-8')
+    os.replace(current_tmp, tmp_dir.parent / CURRENT_FILE)
+    return version_dir
+
+
+def discard(tmp_dir) -> None:
+    """Removes an unpublished version directory."""
+    shutil.rmtree(tmp_dir, ignore_errors=True)
+
+
+def resolve(root=ARTIFACT_ROOT, version: Optional[str] = None) -> Path:
+    """
+    Returns the directory of a version, or of the CURRENT one.
+
+    Raises:
+        FileNotFoundError: If no artifact has been published under root
+    """
+    root = Path(root)
+    if version is None:
+        current = root / CURRENT_FILE
+        if not current.exists():
+            raise FileNotFoundError(f"No embeddings artifact in {root}; run wsl_scripts/embeddings.py first")
+        version = current.read_text(encoding='utf-8').strip()
+    path = root / version
+    if not (path / MANIFEST_FILE).exists():
+        raise FileNotFoundError(f"{path} is not a published embeddings artifact")
+    return path
+
+
+class EmbeddingArtifact:
+    """
+    Read-only view of one published artifact version.
+
+    Opening it reads only the manifest; the matrix and the table are
+    memory-mapped on first access.
+
+    Args:
+        path: Version directory (see resolve())
+
+    Raises:
+        ValueError: If the artifact was written in an unsupported format version
+    """
+
+    def __init__(self, path):
+        self.path = Path(path)
+        with open(self.path / MANIFEST_FILE, 'r', encoding='utf-8') as f:
+            self.manifest = json.load(f)
+        if self.manifest.get('format_version') != FORMAT_VERSION:
+            raise ValueError(f"{self.path} has format version {self.manifest.get('format_version')}, "
+                             f"expected {FORMAT_VERSION}")
+        self._embeddings = None
+        self._table = None
+
+    @classmethod
+    def open(cls, root=ARTIFACT_ROOT, version: Optional[str] = None) -> "EmbeddingArtifact":
+        """Opens a version, or the CURRENT one."""
+        return cls(resolve(root, version))
+
+    @property
+    def version(self) -> str:
+        return self.manifest['version']
+
+    @property
+    def dimension(self) -> int:
+        return self.manifest['dimension']
+
+    def __len__(self) -> int:
+        return self.manifest['count']
+
+    @property
+    def embeddings(self) -> np.ndarray:
+        """The (N, dim) float32 matrix, memory-mapped read-only."""
+        if self._embeddings is None:
+            self._embeddings = np.load(self.path / MATRIX_FILE, mmap_mode='r')
+        return self._embeddings
+
+    @property
+    def table(self) -> pl.DataFrame:
+        """The id / title / url / text table, memory-mapped."""
+        if self._table is None:
+            self._table = pl.read_ipc(self.path / TABLE_FILE)
+        return self._table
+
+    @property
+    def ids(self) -> pl.Series:
+        return self.table['id']
+
+    @property
+    def documents(self) -> pl.Series:
+        return self.table['text']
+
+    def iter_batches(self, batch_size: int) -> Iterator[Tuple[pl.DataFrame, np.ndarray]]:
+        """
+        Streams the rows in order.
+
+        Yields:
+            Tuples of (table slice, embeddings) with at most batch_size rows
+        """
+        for start in range(0, len(self), batch_size):
+            rows = self.table.slice(start, batch_size)
+            yield rows, np.asarray(self.embeddings[start:start + len(rows)])
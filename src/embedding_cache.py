@@ -0,0 +1,80 @@
+"""
+Persistent content-addressed cache of document embeddings.
+Embeddings are stored in SQLite under a SHA-256 of the document text and the
+encoder configuration (model, pooling, token limit, inference backend), so
+re-running the embedding pipeline only sends new or changed documents through
+the model.
+"""
+
+import hashlib
+import os
+import sqlite3
+import numpy as np
+from typing import Dict, List
+
+
+# --- Configuration ---
+LOOKUP_CHUNK = 500  # keys per SELECT ... IN (...) query, below SQLite's variable limit
+
+
+def encoder_config(model_name: str, pooling: str = "mean", max_length: int = 512, backend: str = "torch") -> str:
+    """Describes everything besides the text that determines an embedding."""
+    return f"{model_name}|pooling={pooling}|max_length={max_length}|backend={backend}"
+
+
+class EmbeddingCache:
+    """
+    Maps hash(encoder config, text) to a float32 embedding.
+
+    One connection per process; SQLite's WAL mode lets several embedding
+    workers read and write the same file.
+
+    Args:
+        path: SQLite database file
+        config: Encoder configuration from encoder_config(); entries written
+            under another configuration are never returned
+    """
+
+    def __init__(self, path: str, config: str):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.path = path
+        self.config = config
+        self._connection = sqlite3.connect(path, timeout=60)
+        self._connection.execute("PRAGMA journal_mode=WAL")
+        self._connection.execute(
+            "CREATE TABLE IF NOT EXISTS embeddings (key BLOB PRIMARY KEY, vector BLOB NOT NULL) WITHOUT ROWID"
+        )
+        self._connection.commit()
+
+    def key(self, text: str) -> bytes:
+        return hashlib.sha256(f"{self.config}\0{text}".encode('utf-8')).digest()
+
+    def get_many(self, keys: List[bytes]) -> Dict[bytes, np.ndarray]:
+        """Returns the cached embeddings of the keys that are present."""
+        found = {}
+        unique = list(dict.fromkeys(keys))
+        for start in range(0, len(unique), LOOKUP_CHUNK):
+            chunk = unique[start:start + LOOKUP_CHUNK]
+            rows = self._connection.execute(
+                f"SELECT key, vector FROM embeddings WHERE key IN ({','.join('?' * len(chunk))})", chunk
+            )
+            for key, vector in rows:
+                found[key] = np.frombuffer(vector, dtype=np.float32)
+        return found
+
+    def put_many(self, keys: List[bytes], embeddings: np.ndarray) -> None:
+        """Stores one embedding per key, replacing existing entries."""
+        embeddings = np.ascontiguousarray(embeddings, dtype=np.float32)
+        with self._connection:
+            self._connection.executemany(
+                "INSERT OR REPLACE INTO embeddings (key, vector) VALUES (?, ?)",
+                ((key, embedding.tobytes()) for key, embedding in zip(keys, embeddings))
+            )
+
+    def __len__(self) -> int:
+        return self._connection.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+
+    def close(self) -> None:
+        self._connection.close()
@@ -0,0 +1,233 @@
+"""
+Hybrid retrieval: runs semantic search and the TF-IDF baseline concurrently
+and fuses their rankings into one list.
+
+Both retrievers are submitted to a shared thread pool, so a hybrid query
+takes about as long as the slower of the two (the encoder, BLAS and sparse
+products release the GIL; ChromaDB is a network call). Rankings are fused
+with reciprocal rank fusion ("rrf") or a weighted sum of min-max normalized
+scores ("blend"). Results are hydrated from the local document store when
+it has been built; otherwise semantic hits keep the text they carry and the
+text of the remaining baseline-only hits is fetched in one request for the
+whole result set.
+"""
+
+import os
+import sys
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional, Tuple
+
+# Add the project root to Python path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.baseline import search_baseline, search_baseline_batch
+from src.semantic_search import semantic_search, semantic_search_batch, fetch_documents, document_store
+
+
+# --- Configuration ---
+# "rrf" (reciprocal rank fusion) or "blend" (normalized score blending)
+HYBRID_FUSION = os.environ.get("HYBRID_FUSION", "rrf")
+FUSION_METHODS = ("rrf", "blend")
+RRF_K = 60  # rank offset of reciprocal rank fusion; larger values flatten the rank weights
+# Weight of the semantic score in "blend"; the baseline gets 1 - HYBRID_ALPHA
+HYBRID_ALPHA = float(os.environ.get("HYBRID_ALPHA", 0.5))
+# Each retriever returns CANDIDATE_FACTOR x n_results candidates for fusion
+CANDIDATE_FACTOR = 3
+MAX_WORKERS = 4
+
+_executor: Optional[ThreadPoolExecutor] = None
+_executor_lock = threading.Lock()
+
+
+def get_executor() -> ThreadPoolExecutor:
+    """Returns the process-wide thread pool the retrievers run on."""
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(max_workers=MAX_WORKERS, thread_name_prefix="hybrid")
+    return _executor
+
+
+def reciprocal_rank_fusion(rankings: Dict[str, List[str]], k: int = RRF_K) -> Dict[str, float]:
+    """
+    Scores every id by the sum of 1 / (k + rank) over the rankings it appears in.
+
+    Args:
+        rankings: Mapping of retriever name to its ids, best first
+
+    Returns:
+        Mapping of id to fused score
+    """
+    fused = {}
+    for ranking in rankings.values():
+        for rank, doc_id in enumerate(ranking, start=1):
+            fused[doc_id] = fused.get(doc_id, 0.0) + 1.0 / (k + rank)
+    return fused
+
+
+def blend_scores(scores: Dict[str, List[Tuple[str, float]]], weights: Dict[str, float]) -> Dict[str, float]:
+    """
+    Min-max normalizes each retriever's scores to [0, 1] and sums them with
+    the given weights; an id missing from a retriever gets 0 from it.
+
+    Args:
+        scores: Mapping of retriever name to its (id, score) pairs
+        weights: Mapping of retriever name to its weight
+
+    Returns:
+        Mapping of id to fused score
+    """
+    fused = {}
+    for name, pairs in scores.items():
+        if not pairs:
+            continue
+        values = [float(score) for _, score in pairs]
+        low, high = min(values), max(values)
+        for (doc_id, _), value in zip(pairs, values):
+            normalized = (value - low) / (high - low) if high > low else 1.0
+            fused[doc_id] = fused.get(doc_id, 0.0) + weights.get(name, 1.0) * normalized
+    return fused
+
+
+def fuse(semantic_results: List[Dict[str, Any]], baseline_results: List[Dict[str, Any]], n_results: int,
+         fusion: str = HYBRID_FUSION, alpha: float = HYBRID_ALPHA) -> List[Dict[str, Any]]:
+    """
+    Fuses one query's semantic and baseline results into the top n_results.
+
+    Returns:
+        List of dictionaries with 'id', 'score' and 'similarity' (both the
+        fused score), 'document' (None if only the baseline found it),
+        'semantic_rank' / 'baseline_rank' (None if absent) and
+        'semantic_similarity' / 'baseline_score'
+    """
+    if fusion == "rrf":
+        fused = reciprocal_rank_fusion({
+            'semantic': [r['id'] for r in semantic_results],
+            'baseline': [r['id'] for r in baseline_results],
+        })
+    elif fusion == "blend":
+        fused = blend_scores({
+            'semantic': [(r['id'], r['similarity']) for r in semantic_results],
+            'baseline': [(r['id'], r['score']) for r in baseline_results],
+        }, {'semantic': alpha, 'baseline': 1.0 - alpha})
+    else:
+        raise ValueError(f"Unknown fusion method {fusion!r}; expected one of {FUSION_METHODS}")
+
+    semantic = {r['id']: (rank, r) for rank, r in enumerate(semantic_results, start=1)}
+    baseline = {r['id']: (rank, r) for rank, r in enumerate(baseline_results, start=1)}
+
+    # Ties are broken by the better of the two ranks, then by id, so the order is deterministic
+    def sort_key(doc_id):
+        best_rank = min(semantic.get(doc_id, (float('inf'),))[0], baseline.get(doc_id, (float('inf'),))[0])
+        return -fused[doc_id], best_rank, doc_id
+
+    top = sorted(fused, key=sort_key)[:n_results]
+
+    results = []
+    for doc_id in top:
+        semantic_rank, semantic_hit = semantic.get(doc_id, (None, None))
+        baseline_rank, baseline_hit = baseline.get(doc_id, (None, None))
+        results.append({
+            'id': doc_id,
+            'score': fused[doc_id],
+            'similarity': fused[doc_id],
+            'document': semantic_hit['document'] if semantic_hit else None,
+            'semantic_rank': semantic_rank,
+            'baseline_rank': baseline_rank,
+            'semantic_similarity': semantic_hit['similarity'] if semantic_hit else None,
+            'baseline_score': float(baseline_hit['score']) if baseline_hit else None,
+        })
+    return results
+
+
+def attach_documents(result_lists: List[List[Dict[str, Any]]]) -> None:
+    """
+    Fills in the missing 'document' of every result in place. With a local
+    document_store(), every result also gets its 'title' and 'url'; without
+    one, one fetch_documents call covers the union of the ids that lack text.
+    """
+    store = document_store()
+    if store is not None:
+        records = store.get(dict.fromkeys(result['id'] for results in result_lists for result in results))
+        for results in result_lists:
+            for result in results:
+                record = records.get(result['id'], {})
+                result.setdefault('title', record.get('title'))
+                result.setdefault('url', record.get('url'))
+                if result.get('document') is None:
+                    result['document'] = record.get('text', "Document text not available")
+        return
+
+    missing = list(dict.fromkeys(
+        result['id'] for results in result_lists for result in results if result.get('document') is None
+    ))
+    if not missing:
+        return
+    try:
+        texts = fetch_documents(missing)
+    except Exception as e:
+        print(f"Error fetching documents: {e}")
+        texts = {}
+    for results in result_lists:
+        for result in results:
+            if result.get('document') is None:
+                result['document'] = texts.get(result['id'], "Document text not available")
+
+
+def retrieve(query: str, n_candidates: int) -> Tuple[List[Dict[str, Any]], List[Dict[str, Any]]]:
+    """
+    Runs semantic search and the baseline concurrently.
+
+    Returns:
+        Tuple of (semantic results, baseline results), each up to n_candidates long
+    """
+    executor = get_executor()
+    semantic = executor.submit(semantic_search, query, n_candidates)
+    baseline = executor.submit(search_baseline, query, n_candidates)
+    return semantic.result(), baseline.result()
+
+
+def hybrid_search(query: str, n_results: int = 5, fusion: str = HYBRID_FUSION,
+                  alpha: float = HYBRID_ALPHA) -> List[Dict[str, Any]]:
+    """
+    Searches with both retrievers at once and returns one fused ranking.
+
+    Args:
+        query: The search query string
+        n_results: Number of fused results to return
+        fusion: "rrf" or "blend"
+        alpha: Weight of the semantic scores with "blend"
+
+    Returns:
+        List of result dictionaries in the format of fuse(), with 'document' filled in
+    """
+    semantic_results, baseline_results = retrieve(query, n_results * CANDIDATE_FACTOR)
+    results = fuse(semantic_results, baseline_results, n_results, fusion, alpha)
+    attach_documents([results])
+    return results
+
+
+def hybrid_search_batch(queries: List[str], n_results: int = 5, fusion: str = HYBRID_FUSION,
+                        alpha: float = HYBRID_ALPHA, raise_errors: bool = False) -> List[List[Dict[str, Any]]]:
+    """
+    Batched hybrid_search: one batched call per retriever, run concurrently,
+    and one document fetch for all queries. With raise_errors, a failed
+    semantic search raises instead of leaving the baseline ranking alone.
+
+    Returns:
+        One fused result list per query, in query order
+    """
+    if not queries:
+        return []
+    n_candidates = n_results * CANDIDATE_FACTOR
+    executor = get_executor()
+    semantic = executor.submit(semantic_search_batch, queries, n_candidates, raise_errors=raise_errors)
+    baseline = executor.submit(search_baseline_batch, queries, n_candidates)
+    result_lists = [
+        fuse(semantic_results, baseline_results, n_results, fusion, alpha)
+        for semantic_results, baseline_results in zip(semantic.result(), baseline.result())
+    ]
+    attach_documents(result_lists)
+    return result_lists
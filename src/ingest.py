@@ -0,0 +1,377 @@
+"""
+Incremental, idempotent ingestion of the corpus embeddings into ChromaDB.
+Every record carries a content hash (of its text, title, url and embedding)
+in its metadata. An ingest run diffs the hashes of the embeddings artifact
+(src/embedding_artifact.py) against the ones already in the collection,
+upserts only new or changed records, deletes ids that are no longer in the
+corpus, and writes a manifest of the run, so a refresh costs time
+proportional to the delta.
+
+Upserts go through ConcurrentUpserter, which keeps several requests in flight
+on a bounded thread pool, sizes batches from the server's limit and the
+observed latency, and retries failed requests with exponential backoff.
+"""
+
+import hashlib
+import json
+import os
+import sys
+import threading
+import time
+import numpy as np
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from dataclasses import dataclass, field
+from typing import Callable, Dict, Iterable, List, Optional, Tuple, TypeVar
+
+# Add the project root to Python path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.embedding_artifact import EmbeddingArtifact
+
+
+# --- Configuration ---
+# Written by every ingest run (pipeline_scripts/data_ingest.py); its fingerprint
+# versions cached ChromaDB results (see src/semantic_search.py)
+INGEST_MANIFEST_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                                    "models", "ingest_manifest.json")
+HASH_KEY = "content_hash"  # metadata field holding the record's content hash
+METADATA_FIELDS = ("title", "url")  # table columns stored as Chroma metadata
+PAGE_SIZE = 1000  # records per collection.get page when reading existing hashes
+MAX_WORKERS = 4  # upsert requests in flight
+TARGET_LATENCY = 1.0  # seconds per upsert request the batch size is tuned towards
+MIN_BATCH_SIZE = 10
+MAX_RETRIES = 5
+BACKOFF_INITIAL = 0.5  # seconds before the first retry; doubles on every further retry
+BACKOFF_MAX = 10.0
+
+T = TypeVar("T")
+
+
+def content_hash(text: str, embedding, metadata: Optional[dict] = None) -> str:
+    """Hash of a record's text, metadata and float32 embedding; changes if any of them changes."""
+    digest = hashlib.sha256(text.encode('utf-8'))
+    if metadata:
+        digest.update(json.dumps(metadata, sort_keys=True).encode('utf-8'))
+    digest.update(memoryview(embedding.astype('float32', copy=False).tobytes()))
+    return digest.hexdigest()
+
+
+def record_metadata(row: dict) -> dict:
+    """Chroma metadata of a table row: its title and url, leaving out missing values."""
+    return {key: row[key] for key in METADATA_FIELDS if row.get(key) is not None}
+
+
+def source_hashes(artifact: EmbeddingArtifact, batch_size: int = PAGE_SIZE) -> Dict[str, str]:
+    """Streams the artifact and returns {id: content hash}."""
+    hashes = {}
+    for rows, embeddings in artifact.iter_batches(batch_size):
+        for row, embedding in zip(rows.iter_rows(named=True), embeddings):
+            hashes[row['id']] = content_hash(row['text'], embedding, record_metadata(row))
+    return hashes
+
+
+def call_with_retries(operation: Callable[[], T], retries: int = MAX_RETRIES) -> T:
+    """Calls operation(), retrying failures with exponential backoff (BACKOFF_INITIAL doubling up to BACKOFF_MAX)."""
+    delay = BACKOFF_INITIAL
+    for attempt in range(retries + 1):
+        try:
+            return operation()
+        except Exception:
+            if attempt == retries:
+                raise
+            time.sleep(delay)
+            delay = min(delay * 2, BACKOFF_MAX)
+
+
+def collection_hashes(collection, page_size: int = PAGE_SIZE,
+                      retries: int = MAX_RETRIES) -> Dict[str, Optional[str]]:
+    """
+    Returns {id: content hash} for every record in the collection (None if it
+    has no hash). Every page request is retried with backoff.
+    """
+    hashes = {}
+    offset = 0
+    while True:
+        page = call_with_retries(
+            lambda: collection.get(limit=page_size, offset=offset, include=["metadatas"]), retries
+        )
+        if not page['ids']:
+            return hashes
+        metadatas = page.get('metadatas') or [None] * len(page['ids'])
+        for doc_id, metadata in zip(page['ids'], metadatas):
+            hashes[doc_id] = (metadata or {}).get(HASH_KEY)
+        offset += len(page['ids'])
+
+
+@dataclass
+class IngestPlan:
+    """Records to write and delete to make the collection match the source."""
+    upsert: List[str] = field(default_factory=list)
+    delete: List[str] = field(default_factory=list)
+    unchanged: int = 0
+
+    @classmethod
+    def diff(cls, source: Dict[str, str], existing: Dict[str, Optional[str]]) -> "IngestPlan":
+        plan = cls()
+        for doc_id, digest in source.items():
+            if existing.get(doc_id) == digest:
+                plan.unchanged += 1
+            else:
+                plan.upsert.append(doc_id)
+        plan.delete = [doc_id for doc_id in existing if doc_id not in source]
+        return plan
+
+
+def corpus_digest(hashes: Dict[str, str]) -> str:
+    """Order-independent digest of a whole corpus version."""
+    digest = hashlib.sha256()
+    for doc_id in sorted(hashes):
+        digest.update(f"{doc_id}\0{hashes[doc_id]}\n".encode('utf-8'))
+    return digest.hexdigest()
+
+
+def server_max_batch_size(client) -> Optional[int]:
+    """
+    Returns the server's limit on records per write request: client.get_max_batch_size()
+    where the client has it (chromadb clients), else its max_batch_size attribute,
+    else None. Non-positive values (unknown limit) are returned as None.
+    """
+    get_max_batch_size = getattr(client, "get_max_batch_size", None)
+    limit = get_max_batch_size() if callable(get_max_batch_size) else getattr(client, "max_batch_size", None)
+    return limit if isinstance(limit, int) and limit > 0 else None
+
+
+def is_batch_size_error(error: Exception) -> bool:
+    """True if a write was rejected for holding too many records, in any Chroma version's wording."""
+    message = str(error).lower()
+    return "batch size" in message or "batches of size" in message
+
+
+class ConcurrentUpserter:
+    """
+    Upserts a stream of records with several requests in flight.
+
+    The batch size starts at initial_batch_size, doubles while requests finish
+    well under target_latency and halves when they take longer, always staying
+    within [MIN_BATCH_SIZE, max_batch_size]. A request rejected for being too
+    large lowers max_batch_size and is split in two. Other failures are retried
+    up to retries times with exponential backoff before the error is raised.
+
+    Args:
+        collection: ChromaDB collection (or src.chroma_stub.InMemoryCollection)
+        max_workers: Upsert requests in flight (1 = sequential)
+        initial_batch_size: Records in the first request
+        max_batch_size: Server limit on records per request (server_max_batch_size())
+        target_latency: Seconds per request to tune the batch size towards
+        retries: Retries per request before giving up
+        progress: Optional callable(n_records) called after every successful request
+    """
+
+    def __init__(self, collection, max_workers: int = MAX_WORKERS, initial_batch_size: int = 100,
+                 max_batch_size: Optional[int] = None, target_latency: float = TARGET_LATENCY,
+                 retries: int = MAX_RETRIES, progress=None):
+        self.collection = collection
+        self.max_workers = max(1, max_workers)
+        self.max_batch_size = max_batch_size or initial_batch_size
+        self.batch_size = max(1, min(initial_batch_size, self.max_batch_size))
+        self.target_latency = target_latency
+        self.retries = retries
+        self.progress = progress
+        self.records = 0
+        self.requests = 0
+        self.retried = 0
+        self._lock = threading.Lock()
+
+    def _adapt(self, n_records: int, latency: float) -> None:
+        """Grows or shrinks the batch size after a request of n_records took latency seconds."""
+        with self._lock:
+            self.records += n_records
+            self.requests += 1
+            if n_records < self.batch_size:
+                return  # a short tail batch says little about the current size
+            if latency < self.target_latency / 2:
+                self.batch_size = min(self.batch_size * 2, self.max_batch_size)
+            elif latency > self.target_latency:
+                self.batch_size = max(self.batch_size // 2, min(MIN_BATCH_SIZE, self.max_batch_size))
+
+    def _send(self, batch: dict) -> None:
+        """Sends one upsert request, retrying with backoff or splitting it if it is too large."""
+        n_records = len(batch['ids'])
+        delay = BACKOFF_INITIAL
+        for attempt in range(self.retries + 1):
+            try:
+                start = time.perf_counter()
+                self.collection.upsert(
+                    ids=batch['ids'],
+                    documents=batch['documents'],
+                    embeddings=batch['embeddings'].tolist(),
+                    metadatas=batch['metadatas']
+                )
+                latency = time.perf_counter() - start
+                break
+            except ValueError as e:
+                if not is_batch_size_error(e) or n_records == 1:
+                    raise
+                half = n_records // 2
+                with self._lock:
+                    self.max_batch_size = min(self.max_batch_size, half)
+                    self.batch_size = min(self.batch_size, self.max_batch_size)
+                self._send({key: values[:half] for key, values in batch.items()})
+                self._send({key: values[half:] for key, values in batch.items()})
+                return
+            except Exception:
+                if attempt == self.retries:
+                    raise
+                with self._lock:
+                    self.retried += 1
+                time.sleep(delay)
+                delay = min(delay * 2, BACKOFF_MAX)
+
+        self._adapt(n_records, latency)
+        if self.progress is not None:
+            self.progress(n_records)
+
+    def _batches(self, records: Iterable[Tuple[list, list, np.ndarray, list]]):
+        """Re-slices the incoming record chunks into batches of the current batch size."""
+        buffer = {'ids': [], 'documents': [], 'embeddings': [], 'metadatas': []}
+        buffered = 0
+        for ids, documents, embeddings, metadatas in records:
+            buffer['ids'].extend(ids)
+            buffer['documents'].extend(documents)
+            buffer['embeddings'].append(embeddings)
+            buffer['metadatas'].extend(metadatas)
+            buffered += len(ids)
+            while buffered >= self.batch_size:
+                batch, buffer, buffered = self._cut(buffer, self.batch_size)
+                yield batch
+        if buffered:
+            yield self._cut(buffer, buffered)[0]
+
+    @staticmethod
+    def _cut(buffer: dict, size: int):
+        embeddings = np.concatenate(buffer['embeddings']) if len(buffer['embeddings']) > 1 else buffer['embeddings'][0]
+        batch = {
+            'ids': buffer['ids'][:size],
+            'documents': buffer['documents'][:size],
+            'embeddings': embeddings[:size],
+            'metadatas': buffer['metadatas'][:size],
+        }
+        rest = {
+            'ids': buffer['ids'][size:],
+            'documents': buffer['documents'][size:],
+            'embeddings': [embeddings[size:]],
+            'metadatas': buffer['metadatas'][size:],
+        }
+        return batch, rest, len(rest['ids'])
+
+    def upsert(self, records: Iterable[Tuple[list, list, np.ndarray, list]]) -> dict:
+        """
+        Upserts every record and waits for all requests to finish.
+
+        Args:
+            records: Iterable of (ids, documents, embeddings, metadatas) chunks of any size
+
+        Returns:
+            Throughput statistics of the run
+
+        Raises:
+            The error of the first request that still failed after its retries
+        """
+        start = time.perf_counter()
+        in_flight = set()
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            try:
+                for batch in self._batches(records):
+                    # Bound the queue so at most two batches per worker are held in memory
+                    if len(in_flight) >= 2 * self.max_workers:
+                        done, in_flight = wait(in_flight, return_when=FIRST_COMPLETED)
+                        for future in done:
+                            future.result()
+                    in_flight.add(executor.submit(self._send, batch))
+                for future in in_flight:
+                    future.result()
+            except BaseException:
+                for future in in_flight:
+                    future.cancel()
+                raise
+
+        seconds = time.perf_counter() - start
+        return {
+            'records': self.records,
+            'requests': self.requests,
+            'retries': self.retried,
+            'final_batch_size': self.batch_size,
+            'seconds': round(seconds, 3),
+            'records_per_sec': round(self.records / seconds, 1) if seconds > 0 else 0.0,
+        }
+
+
+def incremental_ingest(collection, artifact: EmbeddingArtifact, batch_size: int = 100,
+                       manifest_path: Optional[str] = None, progress=None,
+                       max_workers: int = MAX_WORKERS, max_batch_size: Optional[int] = None) -> dict:
+    """
+    Makes the collection match the embeddings artifact with the fewest writes.
+
+    Args:
+        collection: ChromaDB collection (or src.chroma_stub.InMemoryCollection)
+        artifact: Embeddings artifact version to ingest
+        batch_size: Records per delete request and in the first upsert request
+        manifest_path: Optional JSON file recording the run
+        progress: Optional callable(n_records) called after every upsert request
+        max_workers: Upsert requests in flight
+        max_batch_size: Server limit on records per request; the upsert batch
+            size adapts up to it (defaults to batch_size)
+
+    Returns:
+        The manifest: counts of upserted, deleted and unchanged records, timings,
+        upsert throughput and the corpus digest
+    """
+    start = time.perf_counter()
+    source = source_hashes(artifact)
+    plan = IngestPlan.diff(source, collection_hashes(collection))
+    diff_seconds = time.perf_counter() - start
+
+    # Stream the source again and send only the records in the plan
+    pending = set(plan.upsert)
+
+    def changed_records():
+        for rows, embeddings in artifact.iter_batches(PAGE_SIZE):
+            changed = [(i, row) for i, row in enumerate(rows.iter_rows(named=True)) if row['id'] in pending]
+            if changed:
+                yield ([row['id'] for _, row in changed], [row['text'] for _, row in changed],
+                       embeddings[[i for i, _ in changed]],
+                       [{**record_metadata(row), HASH_KEY: source[row['id']]} for _, row in changed])
+
+    upserter = ConcurrentUpserter(collection, max_workers, batch_size, max_batch_size, progress=progress)
+    throughput = upserter.upsert(changed_records() if pending else [])
+
+    for i in range(0, len(plan.delete), batch_size):
+        call_with_retries(lambda: collection.delete(ids=plan.delete[i:i + batch_size]))
+
+    manifest = {
+        'collection': collection.name,
+        'ingested_at': time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        'source': {'artifact': str(artifact.path), 'version': artifact.version},
+        'records': len(source),
+        'upserted': len(plan.upsert),
+        'deleted': len(plan.delete),
+        'unchanged': plan.unchanged,
+        'diff_seconds': round(diff_seconds, 3),
+        'upsert': throughput,
+        'total_seconds': round(time.perf_counter() - start, 3),
+        'corpus_digest': corpus_digest(source),
+    }
+    if manifest_path:
+        write_manifest(manifest_path, manifest)
+    return manifest
+
+
+def write_manifest(path: str, manifest: dict) -> None:
+    """Writes the manifest atomically (temporary file + rename)."""
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, indent=2)
+    os.replace(tmp_path, path)
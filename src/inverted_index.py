@@ -0,0 +1,186 @@
+"""
+Inverted-index retrieval for the baseline model.
+Postings are stored as flat arrays and queries are answered with MaxScore
+pruning, so the work per query follows the postings of the query terms
+rather than the size of the corpus.
+"""
+
+import os
+import numpy as np
+import scipy.sparse as sp
+from typing import Optional
+
+from src.diagnostics import QueryTrace
+from src.utils import top_k_indices
+
+
+# --- Configuration ---
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+
+class InvertedIndex:
+    """
+    Impact-scored postings lists with per-term upper bounds.
+
+    The postings of term t are docs[indptr[t]:indptr[t+1]] (sorted document
+    indices) and impacts[indptr[t]:indptr[t+1]] (the term's contribution to each
+    document score). A query scores a document as the sum of query weight times
+    impact over the query terms, which covers both TF-IDF cosine (impacts are
+    the L2-normalized TF-IDF weights) and BM25 (impacts are precomputed BM25
+    term scores).
+    """
+
+    def __init__(self, indptr: np.ndarray, docs: np.ndarray, impacts: np.ndarray, n_docs: int,
+                 max_impacts: np.ndarray = None):
+        self.indptr = indptr
+        self.docs = docs
+        self.impacts = impacts
+        self.n_docs = n_docs
+        self.max_impacts = max_impacts if max_impacts is not None else self._term_upper_bounds(indptr, impacts)
+
+    @staticmethod
+    def _term_upper_bounds(indptr: np.ndarray, impacts: np.ndarray) -> np.ndarray:
+        """Returns the largest impact of every term (0 for terms without postings)."""
+        max_impacts = np.zeros(len(indptr) - 1, dtype=np.float64)
+        non_empty = np.flatnonzero(np.diff(indptr))
+        if len(non_empty):
+            max_impacts[non_empty] = np.maximum.reduceat(impacts, indptr[non_empty])
+        return max_impacts
+
+    @classmethod
+    def from_term_doc_matrix(cls, term_doc_matrix: sp.csr_matrix,
+                             max_impacts: np.ndarray = None) -> "InvertedIndex":
+        """
+        Wraps a V x N CSR matrix whose rows already hold the impacts, e.g. the
+        transposed TF-IDF matrix. The arrays are shared, not copied; the
+        per-term upper bounds are computed from them unless given.
+        """
+        term_doc_matrix.sort_indices()
+        return cls(term_doc_matrix.indptr, term_doc_matrix.indices,
+                   term_doc_matrix.data, term_doc_matrix.shape[1], max_impacts)
+
+    @classmethod
+    def build_bm25(cls, count_matrix: sp.csr_matrix, k1: float = BM25_K1, b: float = BM25_B) -> "InvertedIndex":
+        """
+        Builds a BM25 index from an N x V matrix of raw term counts.
+
+        Args:
+            count_matrix: Term counts per document (e.g. from CountVectorizer)
+            k1: Term frequency saturation
+            b: Document length normalization
+
+        Returns:
+            An InvertedIndex whose impacts are the BM25 term scores
+        """
+        n_docs = count_matrix.shape[0]
+        doc_lengths = np.asarray(count_matrix.sum(axis=1)).ravel().astype(np.float64)
+        avg_length = doc_lengths.mean() if n_docs else 0.0
+
+        postings = count_matrix.T.tocsr()
+        postings.sort_indices()
+
+        doc_freqs = np.diff(postings.indptr)
+        idf = np.log(1.0 + (n_docs - doc_freqs + 0.5) / (doc_freqs + 0.5))
+
+        tf = postings.data.astype(np.float64)
+        length_norm = k1 * (1.0 - b + b * doc_lengths[postings.indices] / max(avg_length, 1e-9))
+        term_of_posting = np.repeat(np.arange(len(doc_freqs)), doc_freqs)
+        impacts = idf[term_of_posting] * tf * (k1 + 1.0) / (tf + length_norm)
+
+        return cls(postings.indptr.astype(np.int64), postings.indices.astype(np.int32),
+                   impacts.astype(np.float32), n_docs)
+
+    def save(self, directory, prefix: str) -> None:
+        """Saves the postings arrays as <prefix>_<name>.npy files in a directory."""
+        for name in ("indptr", "docs", "impacts", "max_impacts"):
+            np.save(os.path.join(directory, f"{prefix}_{name}.npy"), getattr(self, name))
+
+    @classmethod
+    def load(cls, directory, prefix: str, n_docs: int, mmap_mode: str = 'r') -> "InvertedIndex":
+        """Opens an index written by save(), memory-mapped by default."""
+        arrays = {
+            name: np.load(os.path.join(directory, f"{prefix}_{name}.npy"), mmap_mode=mmap_mode)
+            for name in ("indptr", "docs", "impacts", "max_impacts")
+        }
+        return cls(arrays['indptr'], arrays['docs'], arrays['impacts'], n_docs, arrays['max_impacts'])
+
+    def search(self, term_ids: np.ndarray, term_weights: np.ndarray, k: int,
+               trace: Optional[QueryTrace] = None) -> tuple[np.ndarray, np.ndarray]:
+        """
+        Returns the top-k documents for a weighted bag of query terms using MaxScore.
+
+        Terms are visited in decreasing order of their score upper bound. Once the
+        k-th best partial score reaches the summed upper bounds of the terms not
+        visited yet, no unseen document can enter the top-k: the remaining
+        (non-essential) postings are then only probed for the current candidates
+        via binary search, and candidates that cannot reach the threshold are
+        dropped along the way.
+
+        Args:
+            term_ids: Vocabulary indices of the query terms
+            term_weights: Query weight of each term
+            k: Number of results to return
+            trace: Optional trace receiving the scoring and top-k timings
+
+        Returns:
+            Tuple of (document indices, scores), best first
+        """
+        term_ids = np.asarray(term_ids)
+        term_weights = np.asarray(term_weights, dtype=np.float64)
+        upper_bounds = self.max_impacts[term_ids] * term_weights
+
+        keep = upper_bounds > 0
+        order = np.argsort(-upper_bounds[keep], kind='stable')
+        term_ids, term_weights, upper_bounds = term_ids[keep][order], term_weights[keep][order], upper_bounds[keep][order]
+        if k <= 0 or len(term_ids) == 0:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float64)
+
+        # remaining_bounds[i] is the best score a document can still gain from terms i..end
+        remaining_bounds = np.append(np.cumsum(upper_bounds[::-1])[::-1], 0.0)
+
+        cand_docs = np.empty(0, dtype=np.int64)
+        cand_scores = np.empty(0, dtype=np.float64)
+
+        i = 0
+        # Essential phase: union the postings while unseen documents can still make the top-k
+        while i < len(term_ids):
+            if len(cand_scores) >= k:
+                threshold = np.partition(cand_scores, -k)[-k]
+                if remaining_bounds[i] <= threshold:
+                    break
+                alive = cand_scores + remaining_bounds[i] >= threshold
+                cand_docs, cand_scores = cand_docs[alive], cand_scores[alive]
+
+            start, end = self.indptr[term_ids[i]], self.indptr[term_ids[i] + 1]
+            all_docs = np.concatenate((cand_docs, self.docs[start:end]))
+            all_scores = np.concatenate((cand_scores, term_weights[i] * self.impacts[start:end]))
+            cand_docs, inverse = np.unique(all_docs, return_inverse=True)
+            cand_scores = np.bincount(inverse.ravel(), weights=all_scores, minlength=len(cand_docs))
+            i += 1
+
+        essential_terms = i
+
+        # Non-essential phase: only score the surviving candidates
+        while i < len(term_ids) and len(cand_docs):
+            start, end = self.indptr[term_ids[i]], self.indptr[term_ids[i] + 1]
+            postings = self.docs[start:end]
+            positions = np.minimum(np.searchsorted(postings, cand_docs), len(postings) - 1)
+            hits = postings[positions] == cand_docs
+            cand_scores[hits] += term_weights[i] * self.impacts[start:end][positions[hits]]
+            i += 1
+
+            if len(cand_scores) > k:
+                threshold = np.partition(cand_scores, -k)[-k]
+                alive = cand_scores + remaining_bounds[i] >= threshold
+                cand_docs, cand_scores = cand_docs[alive], cand_scores[alive]
+
+        if trace:
+            trace.mark("scoring")
+            trace.stats['essential_terms'] = essential_terms
+            trace.stats['candidates'] = len(cand_docs)
+
+        top = top_k_indices(cand_scores, k)
+        if trace:
+            trace.mark("top_k")
+        return cand_docs[top], cand_scores[top]
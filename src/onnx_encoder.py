@@ -0,0 +1,134 @@
+"""
+ONNX Runtime inference backend for the sentence encoder.
+Exports the transformer once (optionally with dynamic int8 weight
+quantization) and runs it on CPU with ONNX Runtime, with the same tokenizer
+and mean pooling as the PyTorch path, so the two backends are interchangeable
+for corpus and query embeddings.
+
+Usage:
+    python wsl_scripts/export_onnx.py  # writes models/onnx/ and checks parity
+
+    ENCODER_BACKEND=onnx-int8 python wsl_scripts/embeddings.py
+"""
+
+import os
+import sys
+import numpy as np
+from pathlib import Path
+from typing import Dict, List, Optional
+
+# Add the project root to Python path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.utils import mean_pooling_numpy, MODEL_NAME
+
+
+# --- Configuration ---
+PROJECT_ROOT = Path(__file__).parent.parent
+ONNX_MODEL_DIR = PROJECT_ROOT / "models" / "onnx"
+FP32_FILE = "model.onnx"
+INT8_FILE = "model.int8.onnx"
+OPSET_VERSION = 14
+
+# Encoder used for corpus and query embeddings: "torch", "onnx" or "onnx-int8"
+ENCODER_BACKEND = os.environ.get("ENCODER_BACKEND", "torch")
+BACKENDS = ("torch", "onnx", "onnx-int8")
+
+
+def export_onnx(model_name: str = MODEL_NAME, output_dir=ONNX_MODEL_DIR, quantize: bool = True) -> Path:
+    """
+    Exports a Hugging Face encoder to ONNX with dynamic batch and sequence axes,
+    saves its tokenizer alongside, and optionally writes a dynamically
+    quantized int8 copy.
+
+    Returns:
+        The output directory
+    """
+    import torch
+    from transformers import AutoTokenizer, AutoModel
+
+    output_dir = Path(output_dir)
+    output_dir.mkdir(parents=True, exist_ok=True)
+    tokenizer = AutoTokenizer.from_pretrained(model_name)
+    model = AutoModel.from_pretrained(model_name)
+    model.eval()
+
+    dummy = tokenizer(["an example sentence", "a second, longer example sentence"], padding=True, return_tensors='pt')
+    input_names = list(dummy.keys())
+    dynamic_axes = {name: {0: 'batch', 1: 'sequence'} for name in input_names}
+    dynamic_axes['last_hidden_state'] = {0: 'batch', 1: 'sequence'}
+
+    with torch.no_grad():
+        torch.onnx.export(
+            model, (dict(dummy),), str(output_dir / FP32_FILE),
+            input_names=input_names, output_names=['last_hidden_state'],
+            dynamic_axes=dynamic_axes, opset_version=OPSET_VERSION
+        )
+    tokenizer.save_pretrained(str(output_dir))
+
+    if quantize:
+        from onnxruntime.quantization import quantize_dynamic, QuantType
+        quantize_dynamic(str(output_dir / FP32_FILE), str(output_dir / INT8_FILE), weight_type=QuantType.QInt8)
+    return output_dir
+
+
+class OnnxEncoder:
+    """
+    Sentence encoder running an exported model with ONNX Runtime on CPU.
+
+    Args:
+        model_dir: Directory written by export_onnx()
+        quantized: Use the int8 model instead of the fp32 one
+        threads: Intra-op threads (0 = ONNX Runtime default)
+    """
+
+    def __init__(self, model_dir=ONNX_MODEL_DIR, quantized: bool = False, threads: int = 0):
+        import onnxruntime as ort
+        from transformers import AutoTokenizer
+
+        model_path = Path(model_dir) / (INT8_FILE if quantized else FP32_FILE)
+        if not model_path.exists():
+            raise FileNotFoundError(f"{model_path} not found; run wsl_scripts/export_onnx.py first")
+
+        options = ort.SessionOptions()
+        if threads:
+            options.intra_op_num_threads = threads
+        self.session = ort.InferenceSession(str(model_path), options, providers=["CPUExecutionProvider"])
+        self.input_names = [model_input.name for model_input in self.session.get_inputs()]
+        self.tokenizer = AutoTokenizer.from_pretrained(str(model_dir))
+
+    @property
+    def dimension(self) -> int:
+        return self.session.get_outputs()[0].shape[2]
+
+    def __call__(self, inputs: Dict[str, np.ndarray]) -> np.ndarray:
+        """Runs the model on tokenized inputs (numpy) and returns mean-pooled float32 embeddings."""
+        feed = {name: np.asarray(inputs[name], dtype=np.int64) for name in self.input_names}
+        token_embeddings = self.session.run(None, feed)[0]
+        return mean_pooling_numpy(token_embeddings, np.asarray(inputs['attention_mask']))
+
+    def encode(self, texts: List[str], max_length: int = 512) -> np.ndarray:
+        """Tokenizes and embeds texts in one batch."""
+        inputs = self.tokenizer(texts, padding=True, truncation=True, return_tensors='np', max_length=max_length)
+        return self(inputs)
+
+
+def cosine_deviation(reference: np.ndarray, candidate: np.ndarray) -> np.ndarray:
+    """Returns 1 - cosine similarity between matching rows of two embedding matrices."""
+    reference = reference / np.maximum(np.linalg.norm(reference, axis=1, keepdims=True), 1e-12)
+    candidate = candidate / np.maximum(np.linalg.norm(candidate, axis=1, keepdims=True), 1e-12)
+    return 1.0 - (reference * candidate).sum(axis=1)
+
+
+def load_onnx_encoder(backend: str = ENCODER_BACKEND, threads: int = 0) -> Optional[OnnxEncoder]:
+    """
+    Returns an OnnxEncoder for the "onnx" / "onnx-int8" backends, or None for "torch".
+
+    Raises:
+        ValueError: For an unknown backend name
+    """
+    if backend not in BACKENDS:
+        raise ValueError(f"Unknown encoder backend {backend!r}; expected one of {BACKENDS}")
+    if backend == "torch":
+        return None
+    return OnnxEncoder(quantized=backend == "onnx-int8", threads=threads)
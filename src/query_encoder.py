@@ -0,0 +1,148 @@
+"""
+Client-side query encoding for semantic search.
+Queries are embedded in-process with the same model and mean pooling as the
+corpus (wsl_scripts/embeddings.py), and sent to ChromaDB as query_embeddings.
+A bounded LRU cache in front of the model lets repeated queries skip the
+transformer forward pass.
+"""
+
+import os
+import sys
+import threading
+import numpy as np
+from collections import OrderedDict
+from typing import Dict, List, Optional
+
+# Add the project root to Python path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.onnx_encoder import load_onnx_encoder, ENCODER_BACKEND
+from src.utils import mean_pooling, MODEL_NAME
+
+
+# --- Configuration ---
+# Pin the model revision (a commit hash or tag on the Hugging Face Hub, or leave
+# unset for the default branch). QUERY_MODEL_PATH may point at a local copy.
+MODEL_REVISION = os.environ.get("QUERY_MODEL_REVISION")
+MODEL_PATH = os.environ.get("QUERY_MODEL_PATH", MODEL_NAME)
+QUERY_CACHE_SIZE = 4096
+MAX_LENGTH = 512
+
+
+def normalize_query(query: str) -> str:
+    """
+    Normalizes a query for use as a cache key.
+
+    Whitespace is collapsed and case is folded. all-MiniLM-L6-v2 uses an
+    uncased tokenizer, so the normalized text embeds exactly like the original.
+    """
+    return " ".join(query.split()).lower()
+
+
+class QueryEncoder:
+    """
+    Transformer query encoder with an LRU embedding cache.
+
+    Args:
+        model_path: Hugging Face model name or local directory
+        revision: Optional model revision to pin
+        cache_size: Maximum number of cached query embeddings (0 disables the cache)
+        max_length: Token limit, matching the corpus embedding script
+        backend: "torch", or "onnx" / "onnx-int8" to run the exported model
+            from models/onnx/ with ONNX Runtime (model_path and revision are
+            then unused); must match the backend of the corpus embeddings
+    """
+
+    def __init__(self, model_path: str = MODEL_PATH, revision: Optional[str] = MODEL_REVISION,
+                 cache_size: int = QUERY_CACHE_SIZE, max_length: int = MAX_LENGTH,
+                 backend: str = ENCODER_BACKEND):
+        self.model_path = model_path
+        self.max_length = max_length
+        self.backend = backend
+        self._onnx = load_onnx_encoder(backend)
+        if self._onnx is not None:
+            self.tokenizer = self._onnx.tokenizer
+        else:
+            import torch
+            from transformers import AutoTokenizer, AutoModel
+
+            self._torch = torch
+            self.tokenizer = AutoTokenizer.from_pretrained(model_path, revision=revision)
+            self.model = AutoModel.from_pretrained(model_path, revision=revision)
+            self.model.eval()
+
+        self.cache_size = cache_size
+        self._cache: "OrderedDict[str, np.ndarray]" = OrderedDict()
+        self._cache_lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def _forward(self, texts: List[str]) -> np.ndarray:
+        """Embeds texts with one forward pass; returns a (len(texts), dim) float32 array."""
+        if self._onnx is not None:
+            return self._onnx.encode(texts, self.max_length)
+        inputs = self.tokenizer(texts, padding=True, truncation=True, return_tensors='pt', max_length=self.max_length)
+        with self._torch.no_grad():
+            outputs = self.model(**inputs)
+        return mean_pooling(outputs, inputs['attention_mask']).cpu().numpy().astype(np.float32)
+
+    def encode(self, query: str) -> np.ndarray:
+        """Returns the embedding of one query as a read-only float32 vector."""
+        return self.encode_batch([query])[0]
+
+    def encode_batch(self, queries: List[str]) -> np.ndarray:
+        """
+        Returns the embeddings of several queries as a (len(queries), dim) array.
+        Cache misses are encoded together in a single forward pass.
+        """
+        keys = [normalize_query(query) for query in queries]
+        found: Dict[str, np.ndarray] = {}
+        with self._cache_lock:
+            for key in keys:
+                if key in self._cache:
+                    self._cache.move_to_end(key)
+                    found[key] = self._cache[key]
+                    self.hits += 1
+                else:
+                    self.misses += 1
+
+        missing = list(dict.fromkeys(key for key in keys if key not in found))
+        if missing:
+            embeddings = self._forward(missing)
+            embeddings.flags.writeable = False
+            with self._cache_lock:
+                for key, embedding in zip(missing, embeddings):
+                    found[key] = embedding
+                    if self.cache_size > 0:
+                        self._cache[key] = embedding
+                        self._cache.move_to_end(key)
+                while len(self._cache) > self.cache_size:
+                    self._cache.popitem(last=False)
+
+        result = np.stack([found[key] for key in keys])
+        result.flags.writeable = False
+        return result
+
+    def cache_info(self) -> dict:
+        """Returns hit/miss counters and the current cache size."""
+        with self._cache_lock:
+            return {'hits': self.hits, 'misses': self.misses,
+                    'size': len(self._cache), 'max_size': self.cache_size}
+
+    def clear_cache(self) -> None:
+        with self._cache_lock:
+            self._cache.clear()
+
+
+_encoder = None
+_encoder_lock = threading.Lock()
+
+
+def get_query_encoder() -> QueryEncoder:
+    """Returns the process-wide query encoder, loading the model on the first call."""
+    global _encoder
+    if _encoder is None:
+        with _encoder_lock:
+            if _encoder is None:
+                _encoder = QueryEncoder()
+    return _encoder
@@ -0,0 +1,312 @@
+"""
+Shared cache of search results.
+
+semantic_search() and search_baseline() (and their batch variants) look up
+every query here before searching. Entries are keyed by the engine, its
+parameters, n_results, the normalized query and the version of the index
+that answered it, and are evicted by size (least recently used first) and
+age (RESULT_CACHE_TTL). An index version is a fingerprint of the files a
+rebuild rewrites (see file_version()), so rebuilding the TF-IDF model, the
+embeddings artifact, the ANN index or re-ingesting the ChromaDB collection
+makes the old entries unreachable without any explicit flush.
+
+Backends:
+    memory   in-process LRU (default)
+    sqlite   one SQLite file shared by every app worker on the host
+    off      no caching
+
+Both backends store results as JSON, so every lookup returns fresh result
+dictionaries (nested metadata included) and annotating or changing results
+(e.g. hybrid_search.attach_documents) never changes the cache.
+"""
+
+import copy
+import hashlib
+import json
+import os
+import sqlite3
+import sys
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional
+
+# Add the project root to Python path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.query_encoder import normalize_query
+
+
+# --- Configuration ---
+PROJECT_ROOT = Path(__file__).parent.parent
+RESULT_CACHE = os.environ.get("RESULT_CACHE", "memory")
+RESULT_CACHE_SIZE = int(os.environ.get("RESULT_CACHE_SIZE", 2048))  # entries
+RESULT_CACHE_TTL = float(os.environ.get("RESULT_CACHE_TTL", 600))  # seconds
+RESULT_CACHE_PATH = os.environ.get("RESULT_CACHE_PATH", str(PROJECT_ROOT / "models" / "result_cache.sqlite"))
+BACKENDS = ("memory", "sqlite", "off")
+
+Results = List[Dict[str, Any]]
+
+
+def file_version(*paths) -> str:
+    """
+    Fingerprints files by path, size and modification time; missing files
+    count as absent. Used as the index version of cache keys.
+    """
+    parts = []
+    for path in paths:
+        try:
+            stat = os.stat(path)
+            parts.append(f"{path}:{stat.st_size}:{stat.st_mtime_ns}")
+        except OSError:
+            parts.append(f"{path}:-")
+    return hashlib.sha256("|".join(parts).encode('utf-8')).hexdigest()[:16]
+
+
+def cache_key(engine: str, query: str, n_results: int, params: Dict[str, Any], version: str) -> str:
+    """Returns the cache key of one query; equal for queries that only differ in case or whitespace."""
+    payload = json.dumps([engine, normalize_query(query), n_results, params, version], sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+def _json_default(value: Any) -> Any:
+    """Converts the numpy scalars and arrays in search results for json.dumps."""
+    if hasattr(value, 'tolist'):
+        return value.tolist()
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+class MemoryBackend:
+    """
+    In-process LRU with a per-entry TTL. Entries are kept as JSON strings,
+    like SqliteBackend stores them, so no caller shares objects with the cache.
+
+    Args:
+        max_size: Maximum number of entries
+        ttl: Seconds an entry stays valid
+    """
+
+    def __init__(self, max_size: int = RESULT_CACHE_SIZE, ttl: float = RESULT_CACHE_TTL):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.evictions = 0
+        self.expirations = 0
+
+    def get(self, key: str) -> Optional[Results]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires, value = entry
+            if expires <= time.monotonic():
+                del self._entries[key]
+                self.expirations += 1
+                return None
+            self._entries.move_to_end(key)
+        return json.loads(value)
+
+    def put(self, key: str, value: Results) -> None:
+        if self.max_size <= 0:
+            return
+        value = json.dumps(value, default=_json_default)
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def info(self) -> Dict[str, Any]:
+        with self._lock:
+            return {'size': len(self._entries), 'max_size': self.max_size, 'ttl': self.ttl,
+                    'evictions': self.evictions, 'expirations': self.expirations}
+
+
+class SqliteBackend:
+    """
+    LRU with a per-entry TTL in a SQLite file, shared by every process that
+    opens the same path (e.g. several Streamlit or API workers). WAL mode
+    lets them read concurrently; each thread gets its own connection.
+    Results are stored as JSON, so reading the file never executes code;
+    numpy scores come back as Python floats.
+
+    Args:
+        path: SQLite database file
+        max_size: Maximum number of entries
+        ttl: Seconds an entry stays valid
+    """
+
+    def __init__(self, path: str = RESULT_CACHE_PATH, max_size: int = RESULT_CACHE_SIZE,
+                 ttl: float = RESULT_CACHE_TTL):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.path = path
+        self.max_size = max_size
+        self.ttl = ttl
+        self._local = threading.local()
+        with self._connection() as connection:
+            connection.execute(
+                "CREATE TABLE IF NOT EXISTS results "
+                "(key TEXT PRIMARY KEY, value BLOB NOT NULL, expires REAL NOT NULL, accessed REAL NOT NULL)"
+            )
+            connection.execute("CREATE INDEX IF NOT EXISTS results_accessed ON results (accessed)")
+
+    def _connection(self) -> sqlite3.Connection:
+        connection = getattr(self._local, 'connection', None)
+        if connection is None:
+            connection = sqlite3.connect(self.path, timeout=30)
+            connection.execute("PRAGMA journal_mode=WAL")
+            self._local.connection = connection
+        return connection
+
+    def get(self, key: str) -> Optional[Results]:
+        now = time.time()
+        connection = self._connection()
+        row = connection.execute("SELECT value FROM results WHERE key = ? AND expires > ?", (key, now)).fetchone()
+        if row is None:
+            return None
+        try:
+            value = json.loads(row[0])
+        except ValueError:
+            return None  # written in another format (e.g. by an older version); overwritten on the next put
+        with connection:
+            connection.execute("UPDATE results SET accessed = ? WHERE key = ?", (now, key))
+        return value
+
+    def put(self, key: str, value: Results) -> None:
+        if self.max_size <= 0:
+            return
+        now = time.time()
+        with self._connection() as connection:
+            connection.execute("INSERT OR REPLACE INTO results (key, value, expires, accessed) VALUES (?, ?, ?, ?)",
+                               (key, json.dumps(value, default=_json_default), now + self.ttl, now))
+            connection.execute("DELETE FROM results WHERE expires <= ?", (now,))
+            connection.execute(
+                "DELETE FROM results WHERE key IN (SELECT key FROM results ORDER BY accessed DESC LIMIT -1 OFFSET ?)",
+                (self.max_size,)
+            )
+
+    def clear(self) -> None:
+        with self._connection() as connection:
+            connection.execute("DELETE FROM results")
+
+    def info(self) -> Dict[str, Any]:
+        size = self._connection().execute("SELECT COUNT(*) FROM results").fetchone()[0]
+        return {'size': size, 'max_size': self.max_size, 'ttl': self.ttl, 'path': self.path}
+
+
+class ResultCache:
+    """
+    Looks up and stores search results through a backend and counts hits and
+    misses (per process).
+
+    Args:
+        backend: Object with get(key), put(key, value), clear() and info(),
+            e.g. MemoryBackend or SqliteBackend; None disables caching
+    """
+
+    def __init__(self, backend=None):
+        self.backend = backend
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def _count(self, hits: int, misses: int) -> None:
+        with self._lock:
+            self.hits += hits
+            self.misses += misses
+
+    def get_or_search_batch(self, engine: str, queries: List[str], n_results: int, params: Dict[str, Any],
+                            version: str, search_batch: Callable[[List[str]], List[Results]]) -> List[Results]:
+        """
+        Returns one result list per query, calling search_batch once with the
+        distinct queries that are not cached and caching what it returns.
+        Exceptions from search_batch propagate and nothing is cached.
+
+        Args:
+            engine: Name of the engine and its backend, e.g. "semantic/local"
+            params: Engine parameters that change the results
+            version: Version of the index that answers the queries
+            search_batch: Callable mapping a list of queries to their result lists
+        """
+        if self.backend is None:
+            return search_batch(list(queries))
+
+        keys = [cache_key(engine, query, n_results, params, version) for query in queries]
+        found = {}
+        for key in dict.fromkeys(keys):
+            value = self.backend.get(key)
+            if value is not None:
+                found[key] = value
+
+        missing = {}
+        for key, query in zip(keys, queries):
+            if key not in found:
+                missing.setdefault(key, query)
+        n_missed = sum(key in missing for key in keys)
+        self._count(len(keys) - n_missed, n_missed)
+
+        if missing:
+            for key, results in zip(missing, search_batch(list(missing.values()))):
+                self.backend.put(key, results)
+                found[key] = results
+        # Repeated queries get their own copies too
+        return [copy.deepcopy(found[key]) for key in keys]
+
+    def get_or_search(self, engine: str, query: str, n_results: int, params: Dict[str, Any], version: str,
+                      search: Callable[[], Results]) -> Results:
+        """Single-query get_or_search_batch; search() is called on a miss."""
+        return self.get_or_search_batch(engine, [query], n_results, params, version, lambda _: [search()])[0]
+
+    def clear(self) -> None:
+        if self.backend is not None:
+            self.backend.clear()
+
+    def info(self) -> Dict[str, Any]:
+        """Returns the hit/miss counters, hit rate and the backend's size and eviction statistics."""
+        with self._lock:
+            hits, misses = self.hits, self.misses
+        info = {'backend': type(self.backend).__name__ if self.backend is not None else None,
+                'hits': hits, 'misses': misses, 'hit_rate': hits / (hits + misses) if hits + misses else 0.0}
+        if self.backend is not None:
+            info.update(self.backend.info())
+        return info
+
+
+def create_backend(name: str = RESULT_CACHE):
+    """Returns the backend named by RESULT_CACHE, or None for "off"."""
+    if name == "memory":
+        return MemoryBackend()
+    if name == "sqlite":
+        return SqliteBackend()
+    if name == "off":
+        return None
+    raise ValueError(f"Unknown result cache backend {name!r}; expected one of {BACKENDS}")
+
+
+_cache: Optional[ResultCache] = None
+_cache_lock = threading.Lock()
+
+
+def get_result_cache() -> ResultCache:
+    """Returns the process-wide result cache, creating its backend on the first call."""
+    global _cache
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = ResultCache(create_backend())
+    return _cache
+
+
+def set_result_cache(cache: ResultCache) -> None:
+    """Replaces the process-wide cache, e.g. with one on another backend."""
+    global _cache
+    _cache = cache
@@ -5,53 +5,91 @@ import os
 # Add the project root to Python path
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
-from src.semantic_search import semantic_search, test_connection, get_chromadb_client
-from src.baseline import search_baseline
+from src.semantic_search import test_connection, SEMANTIC_BACKEND
+from src.baseline import warmup as warmup_baseline
+from src.hybrid_search import retrieve, fuse, attach_documents, CANDIDATE_FACTOR, FUSION_METHODS, HYBRID_FUSION
+from src.result_cache import get_result_cache
 
 # --- Configuration ---
 st.set_page_config(page_title="Data Science Q&A", page_icon="🧠", layout="wide")
 
+# How long a ChromaDB connection check is reused across reruns (seconds)
+CONNECTION_CHECK_TTL = 60
 
-def fetch_documents_by_ids(doc_ids: list) -> dict:
+# Label of the semantic search backend in the UI
+SEMANTIC_BACKEND_LABEL = {"local": "Local index", "ann": "Local ANN index"}.get(SEMANTIC_BACKEND, "ChromaDB")
+
+
+@st.cache_resource(show_spinner="Loading TF-IDF baseline...")
+def load_baseline() -> bool:
     """
-    Fetch document text by IDs from ChromaDB.
-    
-    Args:
-        doc_ids: List of document IDs to fetch
-        
-    Returns:
-        Dictionary mapping document ID to document text
+    Loads the baseline index once per process. Raises if it has not been built:
+    exceptions are not cached, so a model built later is picked up on the next rerun.
     """
+    if not warmup_baseline():
+        raise FileNotFoundError("Baseline model not built")
+    return True
+
+
+def baseline_available() -> bool:
+    """Reports whether the baseline index is loaded, retrying the load until it succeeds."""
     try:
-        client, collection = get_chromadb_client()
-        retrieved = collection.get(ids=doc_ids, include=['documents'])
-        
-        doc_dict = {}
-        if retrieved.get('ids') and retrieved.get('documents'):
-            for doc_id, doc_text in zip(retrieved['ids'], retrieved['documents']):
-                doc_dict[doc_id] = doc_text
-        return doc_dict
-    except Exception as e:
-        st.error(f"Error fetching documents: {e}")
-        return {}
+        return load_baseline()
+    except FileNotFoundError:
+        return False
+
+
+@st.cache_resource(ttl=CONNECTION_CHECK_TTL, show_spinner=False)
+def check_chromadb_connection() -> bool:
+    """Checks the ChromaDB connection at most once per CONNECTION_CHECK_TTL seconds."""
+    return test_connection()
+
+
+def render_result(i: int, result: dict, show_full_text: bool) -> None:
+    """Displays one search result: its id, title, score and document text."""
+    with st.container():
+        st.markdown(f"**Result {i+1}** - ID: `{result['id']}`")
+        if result.get('title'):
+            st.markdown(f"[{result['title']}]({result['url']})" if result.get('url') else result['title'])
+        if result.get('semantic_rank') is not None or result.get('baseline_rank') is not None:
+            ranks = [f"{name} #{rank}" for name, rank in
+                     (("semantic", result.get('semantic_rank')), ("baseline", result.get('baseline_rank')))
+                     if rank is not None]
+            st.metric("Fused score", f"{result['score']:.4f}")
+            st.caption("Ranks: " + ", ".join(ranks))
+        else:
+            st.metric("Similarity", f"{result['similarity']:.4f}")
+
+        # Display document content
+        if show_full_text:
+            st.write(result['document'])
+        else:
+            truncated = result['document'][:500] + "..." if len(result['document']) > 500 else result['document']
+            st.write(truncated)
+            if len(result['document']) > 500:
+                with st.expander("Show full text"):
+                    st.write(result['document'])
+        st.divider()
 
 # --- Streamlit App Code ---
 # Test connection and set session state
-if test_connection():
+if check_chromadb_connection():
     st.session_state.db_connected = True
+elif SEMANTIC_BACKEND == "local":
+    st.error("Failed to load the local semantic index", icon="🚨")
+    st.warning("Please run 'wsl_scripts/embeddings.py' to generate the embeddings.")
+    st.session_state.db_connected = False
+elif SEMANTIC_BACKEND == "ann":
+    st.error("Failed to load the local ANN index", icon="🚨")
+    st.warning("Please run 'wsl_scripts/build_ann_index.py' to build the index.")
+    st.session_state.db_connected = False
 else:
     st.error("Failed to connect to ChromaDB", icon="🚨")
     st.warning("Please ensure the ChromaDB Docker container is running.")
     st.session_state.db_connected = False
 
-# Check if baseline model is available
-if 'baseline_available' not in st.session_state:
-    # Try to import and check if baseline model is loaded
-    try:
-        from src.baseline import vectorizer
-        st.session_state.baseline_available = vectorizer is not None
-    except:
-        st.session_state.baseline_available = False
+# Check if baseline model is available (loaded once per process, not per rerun)
+st.session_state.baseline_available = baseline_available()
 
 # --- UI Elements ---
 st.title("🧠 Data Science Q&A System")
@@ -64,19 +102,30 @@ with st.sidebar:
     st.header("Search Settings")
     n_results = st.slider("Number of results", 1, 10, 5)
     show_full_text = st.checkbox("Show full text (not truncated)", value=True)
+    results_view = st.radio("Results", ["Side by side", "Hybrid"],
+                            help="Hybrid fuses both rankings into one list")
+    fusion = HYBRID_FUSION
+    if results_view == "Hybrid":
+        fusion = st.selectbox("Fusion", FUSION_METHODS, index=FUSION_METHODS.index(HYBRID_FUSION),
+                              format_func={"rrf": "Reciprocal rank fusion", "blend": "Score blending"}.get)
     
     # Model status indicators
     st.header("Model Status")
     if st.session_state.db_connected:
-        st.success("✅ Semantic Search (ChromaDB) - Connected")
+        st.success(f"✅ Semantic Search ({SEMANTIC_BACKEND_LABEL}) - Connected")
     else:
-        st.error("❌ Semantic Search (ChromaDB) - Not Connected")
+        st.error(f"❌ Semantic Search ({SEMANTIC_BACKEND_LABEL}) - Not Connected")
     
     if st.session_state.baseline_available:
         st.success("✅ Baseline (TF-IDF) - Available")
     else:
         st.warning("⚠️ Baseline (TF-IDF) - Not Available")
 
+    cache_info = get_result_cache().info()
+    if cache_info['backend'] is not None:
+        st.caption(f"Result cache: {cache_info['hits']} hits, {cache_info['misses']} misses, "
+                   f"{cache_info['size']}/{cache_info['max_size']} entries")
+
 query = st.text_input(
     "Enter your question:",
     placeholder="e.g., What is LSTM?",
@@ -86,83 +135,50 @@ query = st.text_input(
 if st.button("Search", type="primary", disabled=not st.session_state.db_connected):
     if query:
         with st.spinner("Searching with both models..."):
-            # Run both searches in parallel
-            semantic_results = []
-            baseline_results = []
-            
-            # Semantic search
-            if st.session_state.db_connected:
-                semantic_results = semantic_search(query, n_results=n_results)
-            
-            # Baseline search
+            # Run both searches in parallel; the hybrid view fuses a deeper candidate list
+            n_candidates = n_results * CANDIDATE_FACTOR if results_view == "Hybrid" else n_results
+            semantic_results, baseline_results_raw = retrieve(query, n_candidates)
+            if not st.session_state.baseline_available:
+                baseline_results_raw = []
+
             if st.session_state.baseline_available:
-                baseline_results_raw = search_baseline(query, n_results=n_results)
-                # Fetch document text for baseline results
-                if baseline_results_raw:
-                    baseline_ids = [r['id'] for r in baseline_results_raw]
-                    doc_texts = fetch_documents_by_ids(baseline_ids)
-                    
-                    # Format baseline results to match semantic results structure
-                    baseline_results = []
-                    for result in baseline_results_raw:
-                        doc_id = result['id']
-                        baseline_results.append({
-                            'id': doc_id,
-                            'score': result['score'],
-                            'document': doc_texts.get(doc_id, "Document text not available"),
-                            'similarity': result['score']  # Use score as similarity for baseline
-                        })
-            
+                baseline_empty = "No results from baseline search."
+            else:
+                baseline_empty = "Baseline model not available. Please run 'wsl_scripts/build_baseline.py' to build the model."
+
+            if results_view == "Hybrid":
+                hybrid_results = fuse(semantic_results, baseline_results_raw, n_results, fusion)
+                columns = [("🔀 Hybrid", hybrid_results, "No results from either model.")]
+            else:
+                # Format baseline results to match semantic results structure; the text of
+                # hits the semantic search already returned is reused
+                semantic_texts = {r['id']: r['document'] for r in semantic_results}
+                baseline_results = [
+                    {
+                        'id': result['id'],
+                        'score': result['score'],
+                        'document': semantic_texts.get(result['id']),
+                        'similarity': result['score']  # Use score as similarity for baseline
+                    }
+                    for result in baseline_results_raw
+                ]
+                columns = [("🔍 Semantic Search", semantic_results, "No results from semantic search."),
+                           ("📊 Baseline (TF-IDF)", baseline_results, baseline_empty)]
+
+            # Fetch the remaining document texts in one request
+            attach_documents([results for _, results, _ in columns])
+
             # --- Display Results Side-by-Side ---
-            if semantic_results or baseline_results:
-                # Create two columns for side-by-side display
-                col1, col2 = st.columns(2)
-                
-                with col1:
-                    st.subheader(f"🔍 Semantic Search ({len(semantic_results)} results)")
-                    if semantic_results:
-                        for i, result in enumerate(semantic_results):
-                            with st.container():
-                                st.markdown(f"**Result {i+1}** - ID: `{result['id']}`")
-                                st.metric("Similarity", f"{result['similarity']:.4f}")
-                                
-                                # Display document content
-                                if show_full_text:
-                                    st.write(result['document'])
-                                else:
-                                    truncated = result['document'][:500] + "..." if len(result['document']) > 500 else result['document']
-                                    st.write(truncated)
-                                    if len(result['document']) > 500:
-                                        with st.expander("Show full text"):
-                                            st.write(result['document'])
-                                st.divider()
-                    else:
-                        st.warning("No results from semantic search.")
-                
-                with col2:
-                    st.subheader(f"📊 Baseline (TF-IDF) ({len(baseline_results)} results)")
-                    if baseline_results:
-                        for i, result in enumerate(baseline_results):
-                            with st.container():
-                                st.markdown(f"**Result {i+1}** - ID: `{result['id']}`")
-                                st.metric("Similarity", f"{result['similarity']:.4f}")
-                                
-                                # Display document content
-                                if show_full_text:
-                                    st.write(result['document'])
-                                else:
-                                    truncated = result['document'][:500] + "..." if len(result['document']) > 500 else result['document']
-                                    st.write(truncated)
-                                    if len(result['document']) > 500:
-                                        with st.expander("Show full text"):
-                                            st.write(result['document'])
-                                st.divider()
-                    else:
-                        if st.session_state.baseline_available:
-                            st.warning("No results from baseline search.")
+            if any(results for _, results, _ in columns):
+                for column, (title, results, empty_message) in zip(st.columns(len(columns)), columns):
+                    with column:
+                        st.subheader(f"{title} ({len(results)} results)")
+                        if results:
+                            for i, result in enumerate(results):
+                                render_result(i, result, show_full_text)
                         else:
-                            st.info("Baseline model not available. Please run 'wsl_scripts/build_baseline.py' to build the model.")
+                            st.warning(empty_message)
             else:
                 st.warning("No relevant documents found from either model.")
     else:
-        st.warning("Please enter a question.")
\ No newline at end of file
+        st.warning("Please enter a question.")
@@ -1,91 +1,422 @@
 """
-Semantic search functionality using ChromaDB.
+Semantic search functionality using ChromaDB or an in-process dense index.
 This module provides a clean interface for semantic search without Streamlit dependencies.
 """
 
+import logging
+import os
+import sys
+import threading
+import time
 import chromadb
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Optional, Callable, TypeVar
+
+# Add the project root to Python path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.ann_index import get_ann_index, ANN_INDEX_DIR, DEFAULT_NPROBE
+from src.dense_index import get_dense_index
+from src.doc_store import get_doc_store
+from src.ingest import INGEST_MANIFEST_PATH
+from src.onnx_encoder import ENCODER_BACKEND
+from src.query_encoder import get_query_encoder
+from src.result_cache import file_version, get_result_cache
+
+logger = logging.getLogger(__name__)
 
 
 # --- Configuration ---
 CHROMA_HOST = "localhost"
 CHROMA_PORT = "8000"
 COLLECTION_NAME = "semantic_search_engine"
+# Where semantic search runs: "chroma" (the ChromaDB server), "local" (exact
+# in-process search over the corpus embeddings, no server needed) or "ann"
+# (in-process IVF index from wsl_scripts/build_ann_index.py)
+SEMANTIC_BACKEND = os.environ.get("SEMANTIC_BACKEND", "chroma")
+
+# Inverted lists scanned per query by the "ann" backend (recall/latency knob)
+ANN_NPROBE = int(os.environ.get("ANN_NPROBE", DEFAULT_NPROBE))
+
+# Embed queries in-process with the corpus model ("client") or let ChromaDB's
+# default embedding function do it ("server")
+QUERY_EMBEDDING = os.environ.get("QUERY_EMBEDDING", "client")
+
+# Reconnect policy: exponential backoff between attempts
+CONNECT_RETRIES = 3
+BACKOFF_INITIAL = 0.25  # seconds
+BACKOFF_MAX = 4.0  # seconds
+
+T = TypeVar("T")
+
+
+class ChromaConnection:
+    """
+    Process-wide ChromaDB client and collection handle.
+
+    The HttpClient keeps one HTTP session, so reusing it reuses the keep-alive
+    connection instead of opening a new one (plus a get_collection round trip)
+    for every request. If a request fails, the handle is dropped and rebuilt
+    with exponential backoff.
+
+    Args:
+        host: ChromaDB host
+        port: ChromaDB port
+        collection_name: Name of the collection to open
+        client_factory: Callable returning a new client; defaults to
+            chromadb.HttpClient and can return a local stand-in such as
+            src.chroma_stub.InMemoryChromaClient
+        retries: Reconnect attempts after the first failure
+        backoff_initial: Delay before the first retry, doubled on every attempt
+        backoff_max: Upper bound on the delay between attempts
+    """
+
+    def __init__(self, host: str = CHROMA_HOST, port: str = CHROMA_PORT, collection_name: str = COLLECTION_NAME,
+                 client_factory: Optional[Callable[[], Any]] = None, retries: int = CONNECT_RETRIES,
+                 backoff_initial: float = BACKOFF_INITIAL, backoff_max: float = BACKOFF_MAX):
+        self.collection_name = collection_name
+        self._client_factory = client_factory or (lambda: chromadb.HttpClient(host=host, port=port))
+        self.retries = retries
+        self.backoff_initial = backoff_initial
+        self.backoff_max = backoff_max
+        self._lock = threading.Lock()
+        self._client = None
+        self._collection = None
+
+    def get(self, retries: Optional[int] = None):
+        """
+        Returns the cached (client, collection), connecting first if needed.
+
+        Raises:
+            ConnectionError: If no connection could be made within the retry budget
+        """
+        collection = self._collection
+        if collection is not None:
+            return self._client, collection
+
+        with self._lock:
+            if self._collection is None:
+                self._connect(self.retries if retries is None else retries)
+            return self._client, self._collection
+
+    def _connect(self, retries: int) -> None:
+        delay = self.backoff_initial
+        for attempt in range(retries + 1):
+            try:
+                if self._client is None:
+                    self._client = self._client_factory()
+                self._collection = self._client.get_collection(name=self.collection_name)
+                return
+            except Exception as e:
+                # Drop the client too: its session may hold a dead connection
+                self._client = None
+                if attempt == retries:
+                    raise ConnectionError(f"Failed to connect to ChromaDB: {e}")
+                time.sleep(delay)
+                delay = min(delay * 2, self.backoff_max)
+
+    def reset(self) -> None:
+        """Drops the cached collection handle so the next call reconnects."""
+        with self._lock:
+            self._collection = None
+
+    def run(self, operation: Callable[[Any], T]) -> T:
+        """
+        Runs operation(collection) on the cached collection.
+
+        If it fails (dropped connection, server restart, collection re-created),
+        the handle is rebuilt with backoff and the operation is retried once.
+        """
+        _, collection = self.get()
+        try:
+            return operation(collection)
+        except Exception:
+            self.reset()
+            _, collection = self.get()
+            return operation(collection)
+
+    def is_healthy(self) -> bool:
+        """
+        Health probe: sends a heartbeat on the existing client instead of
+        creating a new one. Connects once (without retries) if there is no client yet.
+        """
+        try:
+            client = self._client
+            if client is None or self._collection is None:
+                self.get(retries=0)
+            else:
+                client.heartbeat()
+            return True
+        except Exception:
+            self.reset()
+            return False
+
+
+_connection = ChromaConnection()
+
+
+def get_connection() -> ChromaConnection:
+    """Returns the process-wide ChromaDB connection."""
+    return _connection
+
+
+def set_connection(connection: ChromaConnection) -> None:
+    """Replaces the process-wide connection, e.g. with one using a local stand-in client."""
+    global _connection
+    _connection = connection
 
 
 def get_chromadb_client():
-    """Get ChromaDB client and collection"""
-    try:
-        client = chromadb.HttpClient(host=CHROMA_HOST, port=CHROMA_PORT)
-        collection = client.get_collection(name=COLLECTION_NAME)
-        return client, collection
-    except Exception as e:
-        raise ConnectionError(f"Failed to connect to ChromaDB: {e}")
+    """Get ChromaDB client and collection (cached for the process)"""
+    return get_connection().get()
+
+
+def _format_chroma_results(results: dict, i: int = 0) -> List[Dict[str, Any]]:
+    """Formats the i-th query of a ChromaDB query response."""
+    formatted_results = []
+    if results and results.get("documents") and results["documents"][i]:
+        metadatas = results["metadatas"][i] if results.get("metadatas") and results["metadatas"][i] else None
+        for j, (doc_id, doc, distance) in enumerate(zip(
+            results["ids"][i],
+            results["documents"][i],
+            results["distances"][i]
+        )):
+            formatted_results.append({
+                'id': doc_id,
+                'document': doc,
+                'distance': distance,
+                'similarity': 1 - distance,
+                'metadata': metadatas[j] if metadatas else None
+            })
+    return formatted_results
+
 
+def _query_chroma(queries: List[str], n_results: int) -> dict:
+    """Sends one query request for all queries to ChromaDB."""
+    if QUERY_EMBEDDING == "client":
+        # Same model and pooling as the corpus; repeated queries hit the encoder's cache
+        query_args = {'query_embeddings': get_query_encoder().encode_batch(queries).tolist()}
+    else:
+        query_args = {'query_texts': list(queries)}
 
-def semantic_search(query: str, n_results: int = 5) -> List[Dict[str, Any]]:
+    # Query ChromaDB through the pooled connection
+    return get_connection().run(lambda collection: collection.query(
+        **query_args,
+        n_results=n_results,
+        include=["documents", "distances", "metadatas"]
+    ))
+
+
+def ann_index_matches() -> bool:
+    """Whether the IVF index was built from the embeddings the dense index serves (checked at load)."""
+    return not get_ann_index().stale
+
+
+def _search_ann(query_embeddings, n_results: int, nprobe: Optional[int]) -> List[List[Dict[str, Any]]]:
+    """
+    Searches the IVF index; ids, documents and re-ranking vectors come from the dense index.
+    If the IVF index was built from other embeddings (its row numbers would map
+    to the wrong documents), falls back to exact search.
     """
-    Performs semantic search using ChromaDB.
+    dense = get_dense_index()
+    index = get_ann_index()
+    if index.stale:
+        rows, similarities = dense.search_batch(query_embeddings, n_results)
+    else:
+        rows, similarities = index.search(query_embeddings, n_results, nprobe=nprobe or ANN_NPROBE,
+                                          rerank_vectors=dense.embeddings)
+    return [dense.format_results(r, s) for r, s in zip(rows, similarities)]
+
+
+def index_version() -> str:
+    """
+    Returns the version of the index answering semantic queries, used to key
+    cached results: the embeddings artifact version of the loaded dense index
+    (plus the ANN index files with "ann"), or the last ChromaDB ingest.
+    """
+    if SEMANTIC_BACKEND in ("local", "ann"):
+        version = get_dense_index().version or "legacy"
+        if SEMANTIC_BACKEND == "ann":
+            version += "/" + file_version(os.path.join(ANN_INDEX_DIR, "config.json"))
+        return version
+    return file_version(INGEST_MANIFEST_PATH)
+
+
+def _cache_params(nprobe: Optional[int]) -> Dict[str, Any]:
+    """Settings besides the query that change semantic results."""
+    params = {'query_embedding': QUERY_EMBEDDING, 'encoder': ENCODER_BACKEND}
+    if SEMANTIC_BACKEND == "ann":
+        params['nprobe'] = nprobe or ANN_NPROBE
+    elif SEMANTIC_BACKEND == "chroma":
+        params['collection'] = COLLECTION_NAME
+    return params
+
+
+def _semantic_search(query: str, n_results: int, nprobe: Optional[int]) -> List[Dict[str, Any]]:
+    """semantic_search without the result cache and error handling."""
+    if SEMANTIC_BACKEND == "local":
+        index = get_dense_index()
+        rows, similarities = index.search(get_query_encoder().encode(query), n_results)
+        return index.format_results(rows, similarities)
+    if SEMANTIC_BACKEND == "ann":
+        return _search_ann(get_query_encoder().encode(query), n_results, nprobe)[0]
+
+    return _format_chroma_results(_query_chroma([query], n_results))
+
+
+def _semantic_search_batch(queries: List[str], n_results: int,
+                           nprobe: Optional[int]) -> List[List[Dict[str, Any]]]:
+    """semantic_search_batch without the result cache and error handling."""
+    if SEMANTIC_BACKEND == "local":
+        index = get_dense_index()
+        rows, similarities = index.search_batch(get_query_encoder().encode_batch(queries), n_results)
+        return [index.format_results(r, s) for r, s in zip(rows, similarities)]
+    if SEMANTIC_BACKEND == "ann":
+        return _search_ann(get_query_encoder().encode_batch(queries), n_results, nprobe)
+
+    results = _query_chroma(queries, n_results)
+    return [_format_chroma_results(results, i) for i in range(len(queries))]
+
+
+def semantic_search(query: str, n_results: int = 5, nprobe: Optional[int] = None) -> List[Dict[str, Any]]:
+    """
+    Performs semantic search using the configured backend (SEMANTIC_BACKEND).
+
+    Results are cached (see src/result_cache.py) under the normalized query,
+    the backend settings and the index version; failed searches are not cached.
     
     Args:
         query: The search query string
         n_results: Number of results to return
+        nprobe: Inverted lists to scan with the "ann" backend (default ANN_NPROBE)
         
     Returns:
         List of dictionaries containing search results with 'id', 'document', 'distance', and 'similarity'
     """
     try:
-        client, collection = get_chromadb_client()
-        
-        # Query ChromaDB
-        results = collection.query(
-            query_texts=[query],
-            n_results=n_results,
-            include=["documents", "distances", "metadatas"]
+        return get_result_cache().get_or_search(
+            f"semantic/{SEMANTIC_BACKEND}", query, n_results, _cache_params(nprobe), index_version(),
+            lambda: _semantic_search(query, n_results, nprobe)
         )
         
-        # Format results
-        formatted_results = []
-        if results and results.get("documents") and results["documents"][0]:
-            for i, (doc_id, doc, distance) in enumerate(zip(
-                results["ids"][0],
-                results["documents"][0], 
-                results["distances"][0]
-            )):
-                formatted_results.append({
-                    'id': doc_id,
-                    'document': doc,
-                    'distance': distance,
-                    'similarity': 1 - distance,
-                    'metadata': results["metadatas"][0][i] if results.get("metadatas") and results["metadatas"][0] else None
-                })
-        
-        return formatted_results
-        
     except Exception as e:
         print(f"Error during semantic search: {e}")
         return []
 
 
+def semantic_search_batch(queries: List[str], n_results: int = 5, nprobe: Optional[int] = None,
+                          raise_errors: bool = False) -> List[List[Dict[str, Any]]]:
+    """
+    Performs semantic search for many queries at once: one batched encoder call and
+    either one ChromaDB request or one matrix product against the local index.
+    Cached queries are answered from the result cache and only the rest are searched.
+
+    Args:
+        queries: The search query strings
+        n_results: Number of results to return per query
+        nprobe: Inverted lists to scan with the "ann" backend (default ANN_NPROBE)
+        raise_errors: Let search errors propagate instead of printing them and
+            returning empty result lists (e.g. to report an unavailable backend)
+
+    Returns:
+        One result list per query, in the format of semantic_search
+    """
+    if not queries:
+        return []
+    try:
+        return get_result_cache().get_or_search_batch(
+            f"semantic/{SEMANTIC_BACKEND}", queries, n_results, _cache_params(nprobe), index_version(),
+            lambda missing: _semantic_search_batch(missing, n_results, nprobe)
+        )
+
+    except Exception as e:
+        if raise_errors:
+            raise
+        print(f"Error during semantic search: {e}")
+        return [[] for _ in queries]
+
+
+def document_store():
+    """
+    Returns the local source of document records (an object with get() and
+    get_documents(), see src/doc_store.py), or None to fetch from ChromaDB.
+    The local and ann backends read the embeddings artifact they search, so
+    hits are hydrated from the same corpus version; otherwise the document
+    store is used if it is built and current.
+    """
+    if SEMANTIC_BACKEND in ("local", "ann"):
+        try:
+            return get_dense_index()
+        except FileNotFoundError:
+            pass
+    return get_doc_store()
+
+
+def fetch_documents(doc_ids: List[str]) -> Dict[str, str]:
+    """
+    Fetches document text by ID from document_store() or, without one,
+    ChromaDB.
+
+    Args:
+        doc_ids: List of document IDs to fetch
+
+    Returns:
+        Dictionary mapping document ID to document text
+    """
+    store = document_store()
+    if store is not None:
+        return store.get_documents(doc_ids)
+
+    retrieved = get_connection().run(lambda collection: collection.get(ids=doc_ids, include=['documents']))
+    doc_dict = {}
+    if retrieved.get('ids') and retrieved.get('documents'):
+        for doc_id, doc_text in zip(retrieved['ids'], retrieved['documents']):
+            doc_dict[doc_id] = doc_text
+    return doc_dict
+
+
 def test_connection() -> bool:
     """
-    Test if ChromaDB connection is working.
+    Test if ChromaDB connection is working (or, with the local backend,
+    whether the embeddings can be loaded).
     
     Returns:
         True if connection successful, False otherwise
     """
-    try:
-        get_chromadb_client()
-        print("✅ ChromaDB connection successful")
+    if SEMANTIC_BACKEND == "ann":
+        try:
+            get_dense_index()
+            get_ann_index()
+            if not ann_index_matches():
+                logger.warning("Local ANN index was built from another embeddings artifact; "
+                               "rebuild it: python wsl_scripts/build_ann_index.py")
+                return False
+            logger.info("Local ANN index loaded")
+            return True
+        except Exception as e:
+            logger.warning("Local ANN index not available (%s); build it first: "
+                           "python wsl_scripts/build_ann_index.py", e)
+            return False
+
+    if SEMANTIC_BACKEND == "local":
+        try:
+            get_dense_index()
+            logger.info("Local dense index loaded")
+            return True
+        except Exception as e:
+            logger.warning("Local dense index not available (%s); generate the embeddings first: "
+                           "python wsl_scripts/embeddings.py", e)
+            return False
+
+    if get_connection().is_healthy():
+        logger.info("ChromaDB connection successful")
         return True
-    except Exception as e:
-        print(f"❌ ChromaDB connection failed: {e}")
-        print("Make sure ChromaDB is running: docker-compose up -d")
-        return False
+    logger.warning("ChromaDB connection failed; make sure ChromaDB is running: docker-compose up -d")
+    return False
 
 
 if __name__ == "__main__":
     # Test the semantic search function
+    logging.basicConfig(level=logging.INFO)
     print("Testing semantic search...")
     
     if test_connection():
@@ -0,0 +1,208 @@
+"""
+Memory-mapped storage for the TF-IDF baseline index.
+The index is a directory of flat .npy files plus a small JSON config, so it can
+be opened with np.load(mmap_mode='r') without unpickling: every process that
+opens it shares the same page-cache copy of the arrays.
+"""
+
+import json
+import os
+import numpy as np
+import scipy.sparse as sp
+from sklearn.feature_extraction.text import TfidfVectorizer
+
+from src.inverted_index import InvertedIndex
+
+
+# --- Configuration ---
+FORMAT_VERSION = 1
+CONFIG_FILE = "config.json"
+
+# Vectorizer parameters needed to rebuild the query analyzer without the pickle
+ANALYZER_PARAMS = ("analyzer", "lowercase", "token_pattern", "stop_words",
+                   "ngram_range", "strip_accents", "binary", "norm", "sublinear_tf")
+
+
+class TfidfIndex:
+    """
+    The TF-IDF baseline: a term-major CSR matrix of L2-normalized TF-IDF weights
+    (row t holds the postings of term t), the idf vector, the vocabulary, the
+    document ids and optionally the BM25 postings.
+
+    Query terms are resolved by binary search over the sorted terms array and
+    the MaxScore upper bounds are passed in when saved, so opening a saved
+    index builds no per-term Python objects and reads no postings.
+    """
+
+    def __init__(self, term_doc_matrix: sp.csr_matrix, idf: np.ndarray, terms, doc_ids,
+                 vectorizer_params: dict, bm25: InvertedIndex = None,
+                 tfidf_max_impacts: np.ndarray = None, terms_sorted: bool = None):
+        self.term_doc_matrix = term_doc_matrix
+        self.idf = idf
+        self.terms = np.asarray(terms)
+        self.doc_ids = doc_ids
+        self.vectorizer_params = vectorizer_params
+        self.bm25 = bm25
+
+        # get_feature_names_out() is sorted unless the vectorizer had a fixed vocabulary
+        if terms_sorted is None:
+            terms_sorted = bool(np.all(self.terms[:-1] <= self.terms[1:]))
+        self.terms_sorted = terms_sorted
+        self._vocabulary = None
+        self.analyzer = TfidfVectorizer(**vectorizer_params).build_analyzer()
+        self.tfidf_inverted = InvertedIndex.from_term_doc_matrix(term_doc_matrix, tfidf_max_impacts)
+
+    @property
+    def vocabulary(self) -> dict:
+        """Mapping of term to index; built on first use, only needed for unsorted terms."""
+        if self._vocabulary is None:
+            self._vocabulary = {term: i for i, term in enumerate(self.terms.tolist())}
+        return self._vocabulary
+
+    def term_indices(self, tokens: list[str]) -> np.ndarray:
+        """Returns the vocabulary indices of the known tokens, in token order (repeats kept)."""
+        if not tokens or not len(self.terms):
+            return np.empty(0, dtype=np.int64)
+        if not self.terms_sorted:
+            return np.asarray([self.vocabulary[t] for t in tokens if t in self.vocabulary], dtype=np.int64)
+        tokens = np.asarray(tokens)
+        positions = np.minimum(np.searchsorted(self.terms, tokens), len(self.terms) - 1)
+        return positions[self.terms[positions] == tokens].astype(np.int64)
+
+    @property
+    def tfidf_matrix(self):
+        """The N x V document-major view of the index (a transpose, not a copy)."""
+        return self.term_doc_matrix.T
+
+    @property
+    def n_docs(self) -> int:
+        return self.term_doc_matrix.shape[1]
+
+    @classmethod
+    def from_vectorizer(cls, vectorizer: TfidfVectorizer, tfidf_matrix, doc_ids: list,
+                        bm25: InvertedIndex = None) -> "TfidfIndex":
+        """
+        Builds an index from a fitted TfidfVectorizer and its document matrix.
+
+        Raises:
+            ValueError: If the vectorizer uses callables that cannot be stored as config
+        """
+        params = vectorizer.get_params()
+        if callable(params['analyzer']) or params['tokenizer'] or params['preprocessor']:
+            raise ValueError("Only vectorizers with the built-in word analyzer can be stored.")
+
+        vectorizer_params = {name: params[name] for name in ANALYZER_PARAMS}
+        if isinstance(vectorizer_params['stop_words'], (set, frozenset)):
+            vectorizer_params['stop_words'] = sorted(vectorizer_params['stop_words'])
+
+        terms = vectorizer.get_feature_names_out()
+        term_doc_matrix = sp.csr_matrix(tfidf_matrix).T.tocsr()
+        term_doc_matrix.sort_indices()
+        return cls(term_doc_matrix, vectorizer.idf_, terms, list(doc_ids), vectorizer_params, bm25)
+
+    def transform(self, queries: list[str]) -> sp.csr_matrix:
+        """
+        Vectorizes queries exactly like TfidfVectorizer.transform: raw term counts
+        times idf, followed by the configured row normalization.
+
+        Args:
+            queries: Query strings
+
+        Returns:
+            Q x V CSR matrix of query weights
+        """
+        indices = []
+        indptr = [0]
+        for query in queries:
+            indices.extend(self.term_indices(self.analyzer(query)).tolist())
+            indptr.append(len(indices))
+
+        matrix = sp.csr_matrix(
+            (np.ones(len(indices), dtype=np.float64), np.asarray(indices, dtype=np.int32), np.asarray(indptr, dtype=np.int32)),
+            shape=(len(queries), len(self.idf))
+        )
+        matrix.sum_duplicates()
+
+        if self.vectorizer_params['binary']:
+            matrix.data[:] = 1.0
+        elif self.vectorizer_params['sublinear_tf']:
+            np.log(matrix.data, out=matrix.data)
+            matrix.data += 1.0
+        matrix.data *= self.idf[matrix.indices]
+
+        norm = self.vectorizer_params['norm']
+        if norm:
+            row_lengths = np.diff(matrix.indptr)
+            if norm == 'l2':
+                row_norms = np.sqrt(np.add.reduceat(matrix.data ** 2, matrix.indptr[:-1][row_lengths > 0]))
+            else:
+                row_norms = np.add.reduceat(np.abs(matrix.data), matrix.indptr[:-1][row_lengths > 0])
+            matrix.data /= np.repeat(row_norms, row_lengths[row_lengths > 0])
+        return matrix
+
+    def save(self, directory) -> None:
+        """Writes the index as flat .npy arrays plus config.json into a directory."""
+        os.makedirs(directory, exist_ok=True)
+        np.save(os.path.join(directory, "data.npy"), self.term_doc_matrix.data)
+        np.save(os.path.join(directory, "indices.npy"), self.term_doc_matrix.indices)
+        np.save(os.path.join(directory, "indptr.npy"), self.term_doc_matrix.indptr)
+        np.save(os.path.join(directory, "idf.npy"), np.asarray(self.idf, dtype=np.float64))
+        np.save(os.path.join(directory, "terms.npy"), np.asarray(self.terms, dtype=str))
+        np.save(os.path.join(directory, "doc_ids.npy"), np.asarray(self.doc_ids, dtype=str))
+        np.save(os.path.join(directory, "tfidf_max_impacts.npy"), self.tfidf_inverted.max_impacts)
+        if self.bm25 is not None:
+            self.bm25.save(directory, prefix="bm25")
+
+        config = {
+            'format_version': FORMAT_VERSION,
+            'n_docs': self.n_docs,
+            'n_terms': len(self.idf),
+            'has_bm25': self.bm25 is not None,
+            'terms_sorted': self.terms_sorted,
+            'vectorizer': {
+                name: list(value) if isinstance(value, tuple) else value
+                for name, value in self.vectorizer_params.items()
+            },
+        }
+        with open(os.path.join(directory, CONFIG_FILE), 'w', encoding='utf-8') as f:
+            json.dump(config, f, indent=2)
+
+    @classmethod
+    def load(cls, directory, mmap_mode: str = 'r') -> "TfidfIndex":
+        """
+        Opens an index written by save(). With mmap_mode='r' (default) no array
+        is copied into process memory.
+
+        Raises:
+            FileNotFoundError: If the directory does not hold an index
+            ValueError: If the index was written by an incompatible format version
+        """
+        with open(os.path.join(directory, CONFIG_FILE), 'r', encoding='utf-8') as f:
+            config = json.load(f)
+        if config.get('format_version') != FORMAT_VERSION:
+            raise ValueError(f"Unsupported TF-IDF index format: {config.get('format_version')}")
+
+        def load_array(name):
+            return np.load(os.path.join(directory, f"{name}.npy"), mmap_mode=mmap_mode)
+
+        term_doc_matrix = sp.csr_matrix(
+            (load_array("data"), load_array("indices"), load_array("indptr")),
+            shape=(config['n_terms'], config['n_docs']),
+            copy=False
+        )
+        # save() writes sorted postings; flag it so scipy never re-sorts the read-only arrays
+        term_doc_matrix.has_sorted_indices = True
+
+        vectorizer_params = dict(config['vectorizer'])
+        vectorizer_params['ngram_range'] = tuple(vectorizer_params['ngram_range'])
+
+        bm25 = None
+        if config.get('has_bm25'):
+            bm25 = InvertedIndex.load(directory, prefix="bm25", n_docs=config['n_docs'], mmap_mode=mmap_mode)
+
+        # Indexes saved before the upper bounds were stored recompute them from the postings
+        max_impacts_path = os.path.join(directory, "tfidf_max_impacts.npy")
+        tfidf_max_impacts = load_array("tfidf_max_impacts") if os.path.exists(max_impacts_path) else None
+
+        return cls(term_doc_matrix, load_array("idf"), load_array("terms"), load_array("doc_ids"),
+                   vectorizer_params, bm25, tfidf_max_impacts, config.get('terms_sorted'))
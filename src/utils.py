@@ -7,14 +7,42 @@ import json
 import os
 import re
 import pickle
+import unicodedata
 import numpy as np
-from typing import List, Dict, Any, Union
+from typing import List, Dict, Any, Iterator, Tuple, Union
 
 
 # =============================================================================
 # TEXT CLEANING FUNCTIONS
 # =============================================================================
 
+# Compiled once at import, so cleaning workers don't go through the re cache per call
+_CITATION_RX = re.compile(r'\[\d+\]')  # citation numbers like [1], [2]
+_NEWLINES_RX = re.compile(r'\n+')
+_HEADER_RX = re.compile(r'==.?==+')
+_BLANK_LINES_RX = re.compile(r'\n{2,}')
+_DASH_RX = re.compile(r"[‐‑‒–—―−]")  # common dash/minus variants
+# A sentence runs up to ., ! or ? followed by whitespace, or to the end of its line
+_SENTENCE_RX = re.compile(r'[^\s](?:[^\n]*?[.!?](?=\s)|[^\n]*)')
+
+
+def normalize_text(value: str) -> str:
+    """Normalize unicode text to stabilize IDs/titles across sources.
+
+    - NFKC normalization
+    - Map all dash/minus variants to ASCII '-'
+    - Replace non-breaking space with regular space
+    - Drop the Unicode replacement character if present
+    """
+    if value is None:
+        return ""
+    text = unicodedata.normalize("NFKC", str(value))
+    text = _DASH_RX.sub("-", text)
+    text = text.replace("\u00A0", " ")
+    text = text.replace("�", "")
+    return text.strip()
+
+
 def basic_clean(text: str) -> str:
     """
     Performs basic cleaning on Wikipedia text.
@@ -26,10 +54,10 @@ def basic_clean(text: str) -> str:
         Basic cleaned text
     """
     # Remove citation numbers like [1], [2], etc.
-    text = re.sub(r'\[\d+\]', '', text)
+    text = _CITATION_RX.sub('', text)
     
     # Clean up multiple newlines
-    text = re.sub(r'\n+', '\n', text)
+    text = _NEWLINES_RX.sub('\n', text)
     
     return text.strip()
 
@@ -49,10 +77,10 @@ def advanced_clean(text: str, min_char_length: int = 125) -> List[str]:
     text = basic_clean(text)
     
     # Remove headers
-    text = re.sub(r'==.?==+', '', text)
+    text = _HEADER_RX.sub('', text)
 
     # Remove extra lines
-    text = re.sub(r'\n{2,}', '\n', text)
+    text = _BLANK_LINES_RX.sub('\n', text)
 
     # Split into chunks
     chunks = text.split('\n')
@@ -66,6 +94,203 @@ def advanced_clean(text: str, min_char_length: int = 125) -> List[str]:
     return final_chunks
 
 
+def token_chunks(paragraphs: List[str], tokenizer, max_tokens: int = 256,
+                 overlap: int = 32) -> List[Dict[str, Any]]:
+    """
+    Packs the sentences of an article into chunks of at most max_tokens
+    tokens, special tokens included, so no chunk is truncated by the encoder.
+
+    Consecutive chunks share whole trailing sentences of up to overlap tokens.
+    A sentence longer than a chunk is cut at token boundaries.
+
+    Args:
+        paragraphs: Cleaned paragraphs of one article (from advanced_clean)
+        tokenizer: Hugging Face fast tokenizer of the encoder
+        max_tokens: Token budget per chunk, including the special tokens
+        overlap: Token budget of the sentences repeated at the start of the next chunk
+
+    Returns:
+        One dictionary per chunk with 'text', 'char_start' and 'char_end'
+        (offsets into the paragraphs joined by newlines) and 'n_tokens'
+        (with special tokens)
+    """
+    article = '\n'.join(paragraphs)
+    budget = max_tokens - tokenizer.num_special_tokens_to_add(pair=False)
+    if budget <= 0:
+        raise ValueError(f"max_tokens={max_tokens} leaves no room for text")
+
+    spans = [(m.start(), m.end()) for m in _SENTENCE_RX.finditer(article)]
+    if not spans:
+        return []
+    encoded = tokenizer([article[start:end] for start, end in spans],
+                        add_special_tokens=False, return_offsets_mapping=True)
+
+    # Units are (char_start, char_end, n_tokens): whole sentences, or token
+    # windows of sentences that do not fit in one chunk
+    units = []
+    for (start, _end), offsets in zip(spans, encoded['offset_mapping']):
+        for i in range(0, max(len(offsets), 1), budget):
+            window = offsets[i:i + budget]
+            if window:
+                units.append((start + window[0][0], start + window[-1][1], len(window)))
+
+    chunks = []
+    first = 0
+    while first < len(units):
+        last, n_tokens = first, 0
+        while last < len(units) and n_tokens + units[last][2] <= budget:
+            n_tokens += units[last][2]
+            last += 1
+        char_start, char_end = units[first][0], units[last - 1][1]
+        chunks.append({
+            'text': article[char_start:char_end],
+            'char_start': char_start,
+            'char_end': char_end,
+            'n_tokens': n_tokens + (max_tokens - budget),
+        })
+        if last == len(units):
+            break
+        # Start the next chunk with the trailing sentences that fit in the
+        # overlap and still leave room for the next new unit
+        next_first, shared = last, 0
+        while (next_first - 1 > first and shared + units[next_first - 1][2] <= overlap
+               and shared + units[next_first - 1][2] + units[last][2] <= budget):
+            next_first -= 1
+            shared += units[next_first][2]
+        first = next_first
+    return chunks
+
+
+def length_stats(histogram: Dict[int, int], limit: Union[int, None] = None) -> Dict[str, Any]:
+    """
+    Summarizes a chunk length distribution.
+
+    Args:
+        histogram: Mapping of length to number of chunks with that length
+        limit: Optional length above which chunks would be truncated
+
+    Returns:
+        Count, mean, percentiles and max, plus the chunks and length above limit
+    """
+    lengths = np.array(sorted(histogram), dtype=np.int64)
+    counts = np.array([histogram[length] for length in lengths], dtype=np.int64)
+    total = int(counts.sum())
+    if not total:
+        return {'chunks': 0}
+
+    cumulative = np.cumsum(counts)
+
+    def percentile(q: float) -> int:
+        return int(lengths[np.searchsorted(cumulative, q * total)])
+
+    stats = {
+        'chunks': total,
+        'mean': round(float((lengths * counts).sum() / total), 1),
+        'min': int(lengths[0]),
+        'p50': percentile(0.5),
+        'p90': percentile(0.9),
+        'p99': percentile(0.99),
+        'max': int(lengths[-1]),
+    }
+    if limit is not None:
+        over = lengths > limit
+        stats['over_limit'] = int(counts[over].sum())
+        stats['truncated'] = int(((lengths[over] - limit) * counts[over]).sum())
+    return stats
+
+
+# =============================================================================
+# EMBEDDING FUNCTIONS
+# =============================================================================
+
+def mean_pooling(model_output, attention_mask):
+    """
+    Performs mean pooling on the token embeddings using PyTorch.
+    This function takes the raw output from the transformer model and
+    averages the token embeddings, ignoring padding tokens, to create a
+    single, fixed-size sentence embedding.
+
+    Shared by the corpus embedding script and the query encoder so both sides
+    produce the same vectors. Only tensor methods are used, so this module
+    does not need to import torch.
+
+    Args:
+        model_output: Transformer output; item 0 holds the token embeddings
+        attention_mask: Attention mask of the tokenized batch
+
+    Returns:
+        Tensor of shape (batch, hidden size) with one embedding per input
+    """
+    token_embeddings = model_output[0]  # first item of model_output contains token embeddings
+
+    # Expand attention mask to match embeddings shape
+    input_mask_expanded = attention_mask.unsqueeze(-1).expand(token_embeddings.size()).float()
+
+    # Sum embeddings, ignoring padding tokens
+    sum_embeddings = (token_embeddings * input_mask_expanded).sum(1)
+
+    # Sum mask to get number of real tokens
+    sum_mask = input_mask_expanded.sum(1).clamp(min=1e-9)
+
+    # Return mean embeddings
+    return sum_embeddings / sum_mask
+
+
+def mean_pooling_numpy(token_embeddings: np.ndarray, attention_mask: np.ndarray) -> np.ndarray:
+    """
+    NumPy version of mean_pooling for encoders that return arrays (ONNX Runtime).
+
+    Args:
+        token_embeddings: (batch, sequence, hidden size) token embeddings
+        attention_mask: (batch, sequence) attention mask
+
+    Returns:
+        float32 array of shape (batch, hidden size)
+    """
+    mask = attention_mask[..., None].astype(np.float32)
+    sum_embeddings = (token_embeddings * mask).sum(axis=1)
+    sum_mask = np.clip(mask.sum(axis=1), 1e-9, None)
+    return (sum_embeddings / sum_mask).astype(np.float32)
+
+
+def token_budget_batches(lengths: List[int], max_tokens: int, max_batch_size: Union[int, None] = None) -> List[np.ndarray]:
+    """
+    Groups sequences into batches of similar length under a padded-token budget.
+
+    Sequences are sorted by length (longest first) and packed greedily, so each
+    batch pads to a length close to that of all its members, and a batch of
+    short sequences holds more of them than a batch of long ones. The cost of a
+    batch is len(batch) * longest sequence, which is what the encoder computes.
+
+    Args:
+        lengths: Token length of every sequence
+        max_tokens: Maximum padded tokens per batch (a longer single sequence
+            still gets a batch of its own)
+        max_batch_size: Optional cap on the number of sequences per batch
+
+    Returns:
+        List of index arrays into lengths; every index appears exactly once
+    """
+    order = np.argsort(-np.asarray(lengths), kind='stable')
+    batches = []
+    start = 0
+    while start < len(order):
+        longest = max(int(lengths[order[start]]), 1)
+        size = max(max_tokens // longest, 1)
+        if max_batch_size is not None:
+            size = min(size, max_batch_size)
+        batches.append(order[start:start + size])
+        start += size
+    return batches
+
+
+def padding_ratio(lengths: List[int], batches: List[np.ndarray]) -> float:
+    """Fraction of the padded tokens in a batching that are padding."""
+    lengths = np.asarray(lengths)
+    padded = sum(len(batch) * lengths[batch].max() for batch in batches if len(batch))
+    return 1.0 - lengths.sum() / padded if padded else 0.0
+
+
 # =============================================================================
 # FILE I/O FUNCTIONS
 # =============================================================================
@@ -93,6 +318,23 @@ def read_jsonl(file_path: str) -> List[Dict[str, Any]]:
     return data
 
 
+def iter_jsonl(file_path: str) -> Iterator[Dict[str, Any]]:
+    """
+    Yields the records of a JSONL file one at a time, so memory stays
+    bounded by a single line. Blank lines are skipped.
+
+    Args:
+        file_path: Path to the JSONL file
+
+    Yields:
+        One dictionary per line
+    """
+    with open(file_path, 'r', encoding='utf-8') as f:
+        for line in f:
+            if line.strip():
+                yield json.loads(line)
+
+
 def write_jsonl(data: List[Dict[str, Any]], file_path: str) -> bool:
     """
     Writes a list of dictionaries to a JSONL file.
@@ -114,6 +356,36 @@ def write_jsonl(data: List[Dict[str, Any]], file_path: str) -> bool:
         return False
 
 
+def load_embeddings(matrix_path: str, docs_path: str, legacy_path: Union[str, None] = None,
+                    mmap_mode: Union[str, None] = 'r') -> Tuple[List[str], np.ndarray, List[str]]:
+    """
+    Loads the corpus embeddings written by wsl_scripts/embeddings.py.
+
+    Args:
+        matrix_path: Path to the (N, dim) float32 .npy matrix
+        docs_path: Path to the sidecar JSONL with one {'id', 'text'} per row
+        legacy_path: Optional {'ids', 'embeddings', 'documents'} pickle from older
+            versions of the script, read if the .npy matrix does not exist
+        mmap_mode: Memory-map mode for the matrix (None reads it into memory)
+
+    Returns:
+        Tuple of (ids, embeddings, documents)
+    """
+    if legacy_path is not None and not os.path.exists(matrix_path) and os.path.exists(legacy_path):
+        with open(legacy_path, 'rb') as f:
+            data = pickle.load(f)
+        return data['ids'], data['embeddings'], data['documents']
+
+    embeddings = np.load(matrix_path, mmap_mode=mmap_mode)
+    ids, documents = [], []
+    for record in iter_jsonl(docs_path):
+        ids.append(record['id'])
+        documents.append(record['text'])
+    if len(ids) != len(embeddings):
+        raise ValueError(f"{docs_path} has {len(ids)} rows but {matrix_path} has {len(embeddings)}")
+    return ids, embeddings, documents
+
+
 # =============================================================================
 # PATH UTILITIES
 # =============================================================================
@@ -148,6 +420,76 @@ def get_data_path(filename: str) -> str:
     return os.path.join(project_root, "data", filename)
 
 
+# =============================================================================
+# RANKING UTILITIES
+# =============================================================================
+
+def top_k_indices(scores: np.ndarray, k: int) -> np.ndarray:
+    """
+    Returns the indices of the k largest scores, best first.
+
+    Uses a partition to find the k-th largest score so only the k winners are
+    sorted, which is O(n + k log k) instead of the O(n log n) of a full
+    argsort. Ties are broken by index, including ties at the k-th place, so
+    the result equals a stable descending sort truncated to k.
+
+    Args:
+        scores: 1-D array of scores
+        k: Number of indices to return
+
+    Returns:
+        Array of at most k indices into scores, ordered by descending score
+    """
+    n = scores.shape[0]
+    if k <= 0 or n == 0:
+        return np.empty(0, dtype=np.intp)
+
+    if k < n:
+        # Everything above the k-th largest score, then the lowest-index ties with it
+        threshold = np.partition(scores, n - k)[n - k]
+        above = np.flatnonzero(scores > threshold)
+        ties = np.flatnonzero(scores == threshold)[:k - len(above)]
+        candidates = np.concatenate((above, ties))
+    else:
+        candidates = np.arange(n)
+
+    order = np.lexsort((candidates, -scores[candidates]))
+    return candidates[order]
+
+
+def top_k_rows(scores: np.ndarray, k: int) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Row-wise version of top_k_indices for a 2-D score array, with the same
+    tie-breaking by index.
+
+    Args:
+        scores: Q x N array, one row of scores per query
+        k: Number of indices to return per row
+
+    Returns:
+        Tuple of (Q x k indices, Q x k scores), each row ordered by descending score
+    """
+    n_rows, n_cols = scores.shape
+    k = min(k, n_cols)
+    if k <= 0:
+        return np.empty((n_rows, 0), dtype=np.intp), np.empty((n_rows, 0), dtype=scores.dtype)
+
+    if k < n_cols:
+        thresholds = np.partition(scores, n_cols - k, axis=1)[:, n_cols - k, None]
+        above = scores > thresholds
+        ties = scores == thresholds
+        # Keep the first (k - above) ties of every row, so each row selects exactly k columns
+        needed = k - above.sum(axis=1, keepdims=True)
+        selected = above | (ties & (np.cumsum(ties, axis=1) <= needed))
+        candidates = np.nonzero(selected)[1].reshape(n_rows, k)
+    else:
+        candidates = np.tile(np.arange(n_cols), (n_rows, 1))
+
+    candidate_scores = np.take_along_axis(scores, candidates, axis=1)
+    order = np.lexsort((candidates, -candidate_scores), axis=1)
+    return np.take_along_axis(candidates, order, axis=1), np.take_along_axis(candidate_scores, order, axis=1)
+
+
 # =============================================================================
 # CONFIGURATION CONSTANTS
 # =============================================================================
@@ -160,7 +502,10 @@ EMBEDDING_DIMENSION = 384
 # File paths
 RAW_DATA_FILE = "ds_corpus.jsonl"
 CLEAN_DATA_FILE = "ds_corpus_clean.jsonl"
-EMBEDDINGS_FILE = "models/embeddings.pkl"
+EMBEDDINGS_ARTIFACT_DIR = "models/embeddings"  # versioned artifacts, see src/embedding_artifact.py
+EMBEDDINGS_MATRIX_FILE = "models/embeddings.npy"  # legacy flat matrix
+EMBEDDINGS_DOCS_FILE = "models/embeddings_docs.jsonl"  # legacy id/text sidecar
+EMBEDDINGS_FILE = "models/embeddings.pkl"  # legacy single-pickle format
 
 # Text processing
 MIN_CHAR_LENGTH = 150
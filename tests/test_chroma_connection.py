@@ -0,0 +1,115 @@
+"""ChromaConnection against the in-memory ChromaDB stand-in."""
+
+import pytest
+
+import src.semantic_search as semantic_search
+from src.chroma_stub import InMemoryChromaClient
+from src.semantic_search import ChromaConnection, COLLECTION_NAME
+
+
+@pytest.fixture
+def sleeps(monkeypatch):
+    """Records the backoff delays instead of sleeping."""
+    delays = []
+    monkeypatch.setattr(semantic_search.time, "sleep", delays.append)
+    return delays
+
+
+@pytest.fixture
+def client():
+    client = InMemoryChromaClient()
+    client.create_collection(COLLECTION_NAME)
+    client.requests = 0
+    return client
+
+
+def make_connection(client, **kwargs):
+    """Returns a connection to client and the list its factory appends every created client to."""
+    created = []
+
+    def factory():
+        created.append(client)
+        return client
+
+    return ChromaConnection(client_factory=factory, **kwargs), created
+
+
+def test_reconnects_with_backoff_after_failures(client, sleeps):
+    connection, created = make_connection(client, retries=3, backoff_initial=0.1, backoff_max=0.15)
+    client.fail_next(2)
+
+    _, collection = connection.get()
+
+    assert collection.name == COLLECTION_NAME
+    assert sleeps == [0.1, 0.15]
+    # A failed attempt drops the client, so every attempt builds a new one
+    assert len(created) == 3
+
+
+def test_gives_up_after_the_retry_budget(client, sleeps):
+    connection, _ = make_connection(client, retries=2, backoff_initial=0.1)
+    client.fail_next(3)
+
+    with pytest.raises(ConnectionError):
+        connection.get()
+    assert sleeps == [0.1, 0.2]
+
+
+def test_run_retries_exactly_once(client, sleeps):
+    connection, _ = make_connection(client)
+    calls = []
+
+    def flaky(collection):
+        calls.append(collection)
+        if len(calls) == 1:
+            raise RuntimeError("connection dropped")
+        return collection.count()
+
+    assert connection.run(flaky) == 0
+    assert len(calls) == 2
+
+    calls.clear()
+
+    def broken(collection):
+        calls.append(collection)
+        raise RuntimeError("still down")
+
+    with pytest.raises(RuntimeError):
+        connection.run(broken)
+    assert len(calls) == 2
+
+
+def test_is_healthy_uses_the_existing_client(client, sleeps):
+    connection, created = make_connection(client)
+    connection.get()
+    requests = client.requests
+
+    assert connection.is_healthy()
+    assert connection.is_healthy()
+    assert len(created) == 1
+    # One heartbeat per probe, no get_collection round trip
+    assert client.requests == requests + 2
+
+
+def test_is_healthy_failure_resets_the_handle(client, sleeps):
+    connection, _ = make_connection(client)
+    connection.get()
+    client.fail_next()
+
+    assert not connection.is_healthy()
+    assert connection._collection is None
+    assert connection.is_healthy()
+    assert sleeps == []
+
+
+def test_reset_reopens_the_collection_on_the_same_client(client, sleeps):
+    connection, created = make_connection(client)
+    connection.get()
+    requests = client.requests
+
+    connection.reset()
+    _, collection = connection.get()
+
+    assert collection.name == COLLECTION_NAME
+    assert len(created) == 1
+    assert client.requests == requests + 1
@@ -0,0 +1,110 @@
+"""ConcurrentUpserter and incremental_ingest against the in-memory ChromaDB stand-in."""
+
+import json
+
+import numpy as np
+import pytest
+
+import src.ingest as ingest
+from src.chroma_stub import InMemoryChromaClient
+from src.embedding_artifact import (EmbeddingArtifact, new_version_dir, publish, write_documents_table,
+                                    MATRIX_FILE, TABLE_FILE)
+from src.ingest import ConcurrentUpserter, incremental_ingest
+
+
+@pytest.fixture(autouse=True)
+def no_backoff(monkeypatch):
+    monkeypatch.setattr(ingest.time, "sleep", lambda seconds: None)
+
+
+def make_artifact(root, texts):
+    """Publishes an artifact of {id: text} with a deterministic 4-dim embedding per text."""
+    root.mkdir(parents=True, exist_ok=True)
+    corpus = root / "corpus.jsonl"
+    with open(corpus, 'w', encoding='utf-8') as f:
+        for doc_id, text in texts.items():
+            f.write(json.dumps({'id': doc_id, 'title': doc_id.upper(), 'url': None, 'text': text}) + "\n")
+    embeddings = np.array([[len(text), sum(map(ord, text)) % 97, 1.0, i] for i, text in enumerate(texts.values())],
+                          dtype=np.float32)
+
+    tmp_dir = new_version_dir(root / "embeddings")
+    np.save(tmp_dir / MATRIX_FILE, embeddings)
+    write_documents_table(corpus, tmp_dir / TABLE_FILE)
+    return EmbeddingArtifact(publish(tmp_dir, "test-model"))
+
+
+def make_records(n):
+    ids = [f"doc{i}" for i in range(n)]
+    return [(ids, [f"text {i}" for i in range(n)], np.arange(n * 2, dtype=np.float32).reshape(n, 2),
+             [{'title': doc_id} for doc_id in ids])]
+
+
+def record_upserts(monkeypatch, collection):
+    """Returns the list every id sent to collection.upsert is appended to."""
+    upserted = []
+    upsert = collection.upsert
+
+    def spy(ids, **kwargs):
+        upsert(ids=ids, **kwargs)
+        upserted.extend(ids)
+
+    monkeypatch.setattr(collection, "upsert", spy)
+    return upserted
+
+
+def test_upsert_retries_after_a_failure():
+    client = InMemoryChromaClient()
+    collection = client.create_collection("docs")
+    client.fail_next()
+
+    stats = ConcurrentUpserter(collection, max_workers=1).upsert(make_records(5))
+
+    assert stats['retries'] == 1
+    assert stats['records'] == 5
+    assert collection.count() == 5
+
+
+def test_upsert_splits_batches_the_server_rejects():
+    client = InMemoryChromaClient(max_batch_size=4)
+    collection = client.create_collection("docs")
+    upserter = ConcurrentUpserter(collection, max_workers=1, initial_batch_size=10, max_batch_size=16)
+
+    stats = upserter.upsert(make_records(10))
+
+    assert stats['records'] == 10
+    assert stats['retries'] == 0
+    assert upserter.max_batch_size <= 4
+    assert sorted(collection.get()['ids']) == sorted(f"doc{i}" for i in range(10))
+
+
+def test_rerun_without_changes_upserts_nothing(tmp_path, monkeypatch):
+    artifact = make_artifact(tmp_path, {'a': "alpha", 'b': "beta", 'c': "gamma"})
+    collection = InMemoryChromaClient().create_collection("docs")
+    first = incremental_ingest(collection, artifact, batch_size=2)
+    upserted = record_upserts(monkeypatch, collection)
+
+    second = incremental_ingest(collection, artifact, batch_size=2, manifest_path=str(tmp_path / "manifest.json"))
+
+    assert first['upserted'] == 3
+    assert (second['upserted'], second['deleted'], second['unchanged']) == (0, 0, 3)
+    assert second['upsert']['requests'] == 0
+    assert upserted == []
+    assert second['corpus_digest'] == first['corpus_digest']
+    assert json.loads((tmp_path / "manifest.json").read_text())['unchanged'] == 3
+
+
+def test_changes_upsert_and_delete_only_the_changed_ids(tmp_path, monkeypatch):
+    old = make_artifact(tmp_path / "old", {'a': "alpha", 'b': "beta", 'c': "gamma"})
+    new = make_artifact(tmp_path / "new", {'a': "alpha", 'b': "beta, revised", 'd': "delta"})
+    collection = InMemoryChromaClient().create_collection("docs")
+    incremental_ingest(collection, old)
+    upserted = record_upserts(monkeypatch, collection)
+
+    manifest = incremental_ingest(collection, new)
+
+    assert sorted(upserted) == ['b', 'd']
+    assert (manifest['upserted'], manifest['deleted'], manifest['unchanged']) == (2, 1, 1)
+    stored = collection.get(include=["documents", "metadatas"])
+    assert dict(zip(stored['ids'], stored['documents'])) == {'a': "alpha", 'b': "beta, revised", 'd': "delta"}
+    assert {doc_id: metadata['title'] for doc_id, metadata in zip(stored['ids'], stored['metadatas'])} == \
+        {'a': "A", 'b': "B", 'd': "D"}
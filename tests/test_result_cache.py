@@ -0,0 +1,35 @@
+"""Result cache backends hand out independent copies of the cached results."""
+
+import numpy as np
+import pytest
+
+from src.result_cache import MemoryBackend, ResultCache, SqliteBackend
+
+
+@pytest.fixture(params=["memory", "sqlite"])
+def cache(request, tmp_path):
+    backend = MemoryBackend() if request.param == "memory" else SqliteBackend(str(tmp_path / "cache.sqlite"))
+    return ResultCache(backend)
+
+
+def search(queries):
+    return [[{'id': f"{query}-1", 'similarity': np.float32(0.5), 'metadata': {'title': "Title"}}]
+            for query in queries]
+
+
+def test_returned_results_do_not_share_state_with_the_cache(cache):
+    first = cache.get_or_search_batch("semantic/test", ["q"], 1, {}, "v1", search)[0]
+    first[0]['metadata']['title'] = "changed"
+    first[0]['document'] = "attached"
+
+    hit = cache.get_or_search_batch("semantic/test", ["q"], 1, {}, "v1", search)[0]
+
+    assert hit == [{'id': "q-1", 'similarity': 0.5, 'metadata': {'title': "Title"}}]
+    assert cache.info()['hits'] == 1
+
+
+def test_repeated_queries_get_separate_copies(cache):
+    results = cache.get_or_search_batch("semantic/test", ["q", "Q "], 1, {}, "v1", search)
+    results[0][0]['metadata']['title'] = "changed"
+
+    assert results[1][0]['metadata'] == {'title': "Title"}
@@ -0,0 +1,60 @@
+import os
+import sys
+import time
+import numpy as np
+
+# Add the project root to Python path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.ann_index import IVFIndex, recall_at_k, ANN_INDEX_DIR
+from src.dense_index import l2_normalize
+from src.embedding_artifact import EmbeddingArtifact
+from src.utils import top_k_rows
+
+# --- Configuration ---
+N_LISTS = None  # default: 4 * sqrt(N)
+PQ_M = 0  # 0 = IVF-Flat; e.g. 48 for 8-dim PQ sub-vectors (48 bytes per document)
+N_EVAL_QUERIES = 500
+K = 10
+NPROBE_VALUES = [1, 2, 4, 8, 16, 32, 64]
+
+artifact = EmbeddingArtifact.open()
+embeddings = artifact.embeddings  # memory-mapped
+if not artifact.manifest.get('normalized', False):
+    embeddings = l2_normalize(embeddings)
+print(f"Loaded {len(embeddings)} embeddings of dimension {embeddings.shape[1]} (artifact {artifact.version}).")
+
+print("-" * 60)
+print("Building IVF index...")
+print("-" * 60)
+start = time.perf_counter()
+index = IVFIndex.build(embeddings, n_lists=N_LISTS, pq_m=PQ_M)
+# Row numbers refer to this artifact version; the ann backend checks it at search time
+index.source_version = artifact.version
+print(f"Built {index.n_lists} lists (pq_m={index.pq_m}) in {time.perf_counter() - start:.1f} s")
+
+index.save(ANN_INDEX_DIR)
+print(f"Index saved to '{ANN_INDEX_DIR}'")
+print("-" * 60)
+
+# --- Recall@k against exact search ---
+# Queries are corpus embeddings, so each query's own document is in both result lists.
+rng = np.random.default_rng(0)
+queries = embeddings[rng.choice(len(embeddings), size=min(N_EVAL_QUERIES, len(embeddings)), replace=False)]
+
+start = time.perf_counter()
+exact_rows, _ = top_k_rows(queries @ embeddings.T, K)
+exact_ms = (time.perf_counter() - start) * 1000 / len(queries)
+print(f"Exact search: {exact_ms:.3f} ms/query")
+
+index = IVFIndex.load(ANN_INDEX_DIR)
+rerank = embeddings if index.pq_m else None
+print(f"{'nprobe':>8} {'recall@' + str(K):>10} {'ms/query':>10}")
+for nprobe in NPROBE_VALUES:
+    if nprobe > index.n_lists:
+        break
+    start = time.perf_counter()
+    rows, _ = index.search(queries, K, nprobe=nprobe, rerank_vectors=rerank)
+    ms = (time.perf_counter() - start) * 1000 / len(queries)
+    print(f"{nprobe:>8} {recall_at_k(rows, list(exact_rows)):>10.3f} {ms:>10.3f}")
+print("-" * 60)
@@ -1,20 +1,39 @@
 import os
+import sys
 import json
 import joblib
-from sklearn.feature_extraction.text import TfidfVectorizer
+from sklearn.feature_extraction.text import CountVectorizer, TfidfVectorizer
+
+# Add the project root to Python path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.doc_store import build_doc_store, DOC_STORE_DIR
+from src.embedding_artifact import EmbeddingArtifact
+from src.inverted_index import InvertedIndex
+from src.tfidf_index import TfidfIndex
 
 # --- Configuration ---
 INPUT_PATH = "data/ds_corpus_clean.jsonl"
 OUTPUT_PATH = "models/tfidf_baseline.joblib"
 
-corpus = []
-ids = []
+# Prefer the embeddings artifact's document table, so the baseline indexes the
+# same documents, in the same row order, as the semantic search; its text
+# column is memory-mapped instead of parsed from JSON.
+try:
+    artifact = EmbeddingArtifact.open()
+    print(f"Reading documents from embeddings artifact {artifact.path}...")
+    corpus = artifact.documents
+    ids = artifact.ids.to_list()
+except FileNotFoundError:
+    print(f"No embeddings artifact; reading documents from {INPUT_PATH}...")
+    corpus = []
+    ids = []
 
-with open(INPUT_PATH, 'r', encoding='utf-8') as f:
-    for line in f:
-        data = json.loads(line)
-        corpus.append(data['text'])
-        ids.append(data['id'])
+    with open(INPUT_PATH, 'r', encoding='utf-8') as f:
+        for line in f:
+            data = json.loads(line)
+            corpus.append(data['text'])
+            ids.append(data['id'])
 
 print(f"Loaded {len(corpus)} documents.")
 
@@ -32,11 +51,21 @@ print("Vectorizer fitted successfully.")
 print(f"Matrix shape: {tfidf_matrix.shape}")
 print("-" * 60)
 
+# --- Build the BM25 postings ---
+# BM25 needs raw term counts, so re-count the corpus with the fitted analyzer and vocabulary.
+print("Building BM25 inverted index...")
+counter = CountVectorizer(analyzer=vectorizer.build_analyzer(), vocabulary=vectorizer.vocabulary_)
+bm25_index = InvertedIndex.build_bm25(counter.transform(corpus))
+print(f"BM25 postings: {len(bm25_index.docs)}")
+print("-" * 60)
+
 # --- Save the vectorizer ---
 # Save three things:
 # 1. The 'vectorizer' (so we can transform new queries the same way)
 # 2. The 'tfidf_matrix' (the "index" of all our documents)
 # 3. The 'ids' (to map the matrix rows back to our document IDs)
+# The same components plus the BM25 postings are also written to 'tfidf_index/'
+# as flat .npy files, which src/baseline.py memory-maps instead of unpickling.
 
 MODEL_DIR = 'models'
 os.makedirs(MODEL_DIR, exist_ok=True) # Create the directory if it doesn't exist
@@ -45,6 +74,20 @@ joblib.dump(vectorizer, os.path.join(MODEL_DIR, "tfidf_vectorizer.joblib"))
 joblib.dump(tfidf_matrix, os.path.join(MODEL_DIR, "tfidf_matrix.joblib"))
 joblib.dump(ids, os.path.join(MODEL_DIR, "tfidf_ids.joblib"))
 
+index = TfidfIndex.from_vectorizer(vectorizer, tfidf_matrix, ids, bm25=bm25_index)
+index.save(os.path.join(MODEL_DIR, "tfidf_index"))
+
 print(f"Baseline model components saved to '{MODEL_DIR}' directory.")
+print("-" * 60)
+
+# --- Build the document store ---
+# Search hits are hydrated (title, url, text) from this memory-mapped store
+# instead of a ChromaDB round trip, so the baseline needs no vector database.
+if os.path.exists(INPUT_PATH):
+    print("Building document store...")
+    n_docs = build_doc_store(INPUT_PATH, DOC_STORE_DIR)
+    print(f"Document store with {n_docs} documents saved to '{DOC_STORE_DIR}'.")
+else:
+    print(f"{INPUT_PATH} not found; skipping the document store.")
 print("Baseline build complete.")
 print("-" * 60)
\ No newline at end of file
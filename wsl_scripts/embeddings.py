@@ -1,47 +1,234 @@
+import itertools
 import json
+import math
+import multiprocessing
 import os
-import pickle
+import sys
 import numpy as np
 import torch
+from concurrent.futures import ProcessPoolExecutor
+from numpy.lib.format import open_memmap
 from tqdm import tqdm
 from transformers import AutoTokenizer, AutoModel
 
+# Add src directory to path to import utils
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+# The model and pooling are shared with the query encoder (src/query_encoder.py)
+# so queries and documents are embedded the same way.
+from utils import mean_pooling, token_budget_batches, MODEL_NAME, EMBEDDINGS_ARTIFACT_DIR
+from embedding_cache import EmbeddingCache, encoder_config
+from embedding_artifact import new_version_dir, write_documents_table, publish, discard, MATRIX_FILE, TABLE_FILE
+from onnx_encoder import load_onnx_encoder, ENCODER_BACKEND
+
 # --- Configuration ---
 # Define the input and output paths
 INPUT_PATH = "data/ds_corpus_clean.jsonl"
-OUTPUT_PATH = "models/embeddings.pkl"
+# Every run is published as a new version directory (normalized float32 .npy
+# matrix, Arrow document table, manifest) and becomes the CURRENT one
+ARTIFACT_DIR = EMBEDDINGS_ARTIFACT_DIR
+
+# Documents are read, tokenized and sorted by token length one window at a
+# time, then encoded in batches of similar length: a batch holds as many
+# documents as fit in MAX_TOKENS_PER_BATCH padded tokens (batch size x
+# longest document), instead of a fixed count padded to its longest member.
+WINDOW_SIZE = 4096
+MAX_TOKENS_PER_BATCH = 16384
+MAX_BATCH_SIZE = 256
+MAX_LENGTH = 512
+
+# CPU sharding: with EMBED_WORKERS > 1 the corpus is split into contiguous
+# shards, each embedded by its own process and model copy, and the shard
+# files are merged into the final matrix. EMBED_THREADS sets the PyTorch
+# intra-op threads per worker (0 = CPU cores / workers). Use
+# benchmarks/bench_embedding_workers.py to pick the layout for a machine.
+NUM_WORKERS = int(os.environ.get("EMBED_WORKERS", 1))
+THREADS_PER_WORKER = int(os.environ.get("EMBED_THREADS", 0))
+
+# Embeddings are cached by a hash of the text and encoder config, so a re-run
+# only encodes new or changed documents. Set EMBED_CACHE="" to disable.
+CACHE_PATH = os.environ.get("EMBED_CACHE", "models/embedding_cache.sqlite")
+
+
+def line_offsets(input_path):
+    """
+    Returns the byte offset of every non-blank line of a jsonl file, in one
+    pass over the raw bytes; its length is the number of documents.
+    """
+    offsets = []
+    position = 0
+    with open(input_path, 'rb') as f:
+        for line in f:
+            if line.strip():
+                offsets.append(position)
+            position += len(line)
+    return np.array(offsets, dtype=np.int64)
+
+
+def iter_batches(input_path, batch_size, offset=0, count=None):
+    """
+    Yields (ids, texts) batches of `count` documents (all if None) starting at
+    byte `offset` of a jsonl file, without reading or parsing what precedes it.
+    """
+    ids, texts = [], []
+    with open(input_path, 'rb') as f:
+        f.seek(offset)
+        lines = (line for line in f if line.strip())
+        for line in itertools.islice(lines, count):
+            data = json.loads(line)
+            ids.append(data.get('id'))
+            texts.append(data.get('text'))
+            if len(texts) == batch_size:
+                yield ids, texts
+                ids, texts = [], []
+    if texts:
+        yield ids, texts
 
-# Define the model to use
-MODEL_NAME = 'sentence-transformers/all-MiniLM-L6-v2'
-BATCH_SIZE = 64
 
-# --- Helper function for mean pooling ---
-def mean_pooling(model_output, attention_mask):
+def embed_range(input_path, output_path, start, stop, threads=0, device_name=None, worker=0,
+                cache_path=CACHE_PATH, backend=ENCODER_BACKEND, offset=0):
     """
-    Performs mean pooling on the token embeddings using PyTorch.    
-    This function takes the raw output from the transformer model and
-    averages the token embeddings, ignoring padding tokens, to create a
-    single, fixed-size sentence embedding.
+    Embeds documents [start, stop) of the corpus into a new .npy file;
+    document `start` begins at byte `offset` (see line_offsets()).
+
+    Runs in the main process, or as a sharding worker with its own model copy.
+    Documents found in the embedding cache skip the model. With the "onnx" or
+    "onnx-int8" backend the exported model runs with ONNX Runtime on CPU.
+
+    Returns:
+        Tuple of (real tokens, padded tokens, cache hits)
     """
-    token_embeddings = model_output[0]  # first item of model_output contains token embeddings
-    
-    # Expand attention mask to match embeddings shape
-    input_mask_expanded = attention_mask.unsqueeze(-1).expand(token_embeddings.size()).float()
-    
-    # Sum embeddings, ignoring padding tokens
-    sum_embeddings = torch.sum(token_embeddings * input_mask_expanded, 1)
-    
-    # Sum mask to get number of real tokens
-    sum_mask = torch.clamp(input_mask_expanded.sum(1), min=1e-9)
-    
-    # Return mean embeddings
-    return sum_embeddings / sum_mask
+    if threads:
+        torch.set_num_threads(threads)
+    cache = EmbeddingCache(cache_path, encoder_config(MODEL_NAME, "mean", MAX_LENGTH, backend)) if cache_path else None
+
+    # 1. Load the tokenizer and the model (exported ONNX model or Hugging Face Hub)
+    onnx_encoder = load_onnx_encoder(backend, threads)
+    if onnx_encoder is not None:
+        tokenizer = onnx_encoder.tokenizer
+        dimension = onnx_encoder.dimension
+    else:
+        tokenizer = AutoTokenizer.from_pretrained(MODEL_NAME)
+        model = AutoModel.from_pretrained(MODEL_NAME)
+        model.eval()
+
+        # Move model to GPU if available
+        device = torch.device(device_name or ('cuda' if torch.cuda.is_available() else 'cpu'))
+        model = model.to(device)
+        dimension = model.config.hidden_size
+
+    embeddings_matrix = open_memmap(output_path, mode='w+', dtype=np.float32, shape=(stop - start, dimension))
+
+    row = 0
+    real_tokens = 0
+    padded_tokens = 0
+    cache_hits = 0
+    windows = iter_batches(input_path, WINDOW_SIZE, offset, stop - start)
+    for _, window in tqdm(windows, total=math.ceil((stop - start) / WINDOW_SIZE),
+                          desc=f"worker {worker}", position=worker):
+
+        # Copy cached embeddings; only the misses go through the model
+        to_encode = np.arange(len(window))
+        if cache is not None:
+            keys = [cache.key(text) for text in window]
+            cached = cache.get_many(keys)
+            hits = np.array([i for i, key in enumerate(keys) if key in cached], dtype=np.intp)
+            if len(hits):
+                embeddings_matrix[row + hits] = np.stack([cached[keys[i]] for i in hits])
+            to_encode = np.array([i for i, key in enumerate(keys) if key not in cached], dtype=np.intp)
+            cache_hits += len(hits)
+        if not len(to_encode):
+            row += len(window)
+            continue
+
+        # 3. Tokenize the documents once, without padding
+        # This converts words to nums; the lengths decide the batches
+        encoded = tokenizer([window[i] for i in to_encode], truncation=True, max_length=MAX_LENGTH)
+        lengths = [len(input_ids) for input_ids in encoded['input_ids']]
+
+        for batch in token_budget_batches(lengths, MAX_TOKENS_PER_BATCH, MAX_BATCH_SIZE):
+            # Pad the batch to its own longest document and create attention masks
+            inputs = tokenizer.pad({key: [encoded[key][i] for i in batch] for key in encoded.keys()},
+                                   return_tensors='pt' if onnx_encoder is None else 'np')
+
+            if onnx_encoder is not None:
+                # 4-5. Run the ONNX model; pooling is done in numpy
+                batch_embeddings = onnx_encoder(inputs)
+            else:
+                # Move inputs to GPU
+                inputs = {k: v.to(device) for k, v in inputs.items()}
+
+                # 4. Pass the tokenized inputs to the model (inference mode).
+                with torch.no_grad():
+                    outputs = model(**inputs)
+
+                # 5. Pool the model output to get sentence embeddings
+                batch_embeddings = mean_pooling(outputs, inputs['attention_mask']).cpu().numpy()
+
+            # 6. Write the rows back in file order
+            embeddings_matrix[row + to_encode[batch]] = batch_embeddings
+            if cache is not None:
+                cache.put_many([keys[i] for i in to_encode[batch]], batch_embeddings)
+            real_tokens += sum(lengths[i] for i in batch)
+            padded_tokens += len(batch) * inputs['attention_mask'].shape[1]
+
+        row += len(window)
+
+    if row != stop - start:
+        raise RuntimeError(f"Expected {stop - start} documents but embedded {row}; was {input_path} modified?")
+
+    embeddings_matrix.flush()
+    del embeddings_matrix
+    if cache is not None:
+        cache.close()
+    return real_tokens, padded_tokens, cache_hits
+
+
+def merge_shards(shard_paths, output_path):
+    """Concatenates shard .npy files into one memory-mapped matrix and deletes the shards."""
+    shards = [np.load(path, mmap_mode='r') for path in shard_paths]
+    merged = open_memmap(output_path, mode='w+', dtype=np.float32,
+                         shape=(sum(len(shard) for shard in shards), shards[0].shape[1]))
+    row = 0
+    for shard in shards:
+        for start in range(0, len(shard), WINDOW_SIZE):
+            chunk = shard[start:start + WINDOW_SIZE]
+            merged[row:row + len(chunk)] = chunk
+            row += len(chunk)
+    merged.flush()
+    del merged, shards
+    for path in shard_paths:
+        os.remove(path)
+
+
+def normalize_rows(matrix_path):
+    """L2-normalizes the rows of a .npy matrix in place, one window at a time."""
+    matrix = open_memmap(matrix_path, mode='r+')
+    for start in range(0, len(matrix), WINDOW_SIZE):
+        chunk = matrix[start:start + WINDOW_SIZE]
+        chunk /= np.maximum(np.linalg.norm(chunk, axis=1, keepdims=True), 1e-12)
+    matrix.flush()
+    del matrix
+
 
 # --- Main ---
-def create_embeddings(input_path, output_path):
+def create_embeddings(input_path, artifact_dir=ARTIFACT_DIR, num_workers=NUM_WORKERS,
+                      threads_per_worker=THREADS_PER_WORKER, cache_path=CACHE_PATH, backend=ENCODER_BACKEND):
     """
     Reads a jsonl file, generates sentence embeddings using a Hugging Face
-    transformers model in TensorFlow, and saves them.
+    transformers model in PyTorch, and saves them as a new artifact version.
+
+    The corpus is streamed: each window of documents is encoded in length-sorted
+    batches whose rows are written straight back to their file-order positions
+    in a preallocated, memory-mapped .npy file, and the ids, titles, urls and
+    texts are streamed into an Arrow table, so peak memory depends on the
+    window size only. With num_workers > 1 the corpus is embedded on CPU by
+    that many processes. Documents already in the embedding cache (cache_path,
+    "" to disable) are not re-encoded. backend selects PyTorch ("torch") or
+    ONNX Runtime ("onnx", "onnx-int8").
+
+    Returns:
+        The published artifact version directory
     """
     print(f"Loading tokenizer and model: {MODEL_NAME}")
     print("This may take a while...")
@@ -50,87 +237,81 @@ def create_embeddings(input_path, output_path):
     print("Starting the embedding process...")
     print("-" * 50)
 
-    # 1. Load the tokenizer and the model from Hugging Face Hub
-    tokenizer = AutoTokenizer.from_pretrained(MODEL_NAME)
-    model = AutoModel.from_pretrained(MODEL_NAME)
-    
-    # Move model to GPU if available
-    device = torch.device('cuda' if torch.cuda.is_available() else 'cpu')
-    model = model.to(device)
-    print(f"Using device: {device}")
-
-    # 2. Load the jsonl file
+    # 2. Count the documents so the output matrix can be preallocated; their
+    # byte offsets let each shard seek straight to its first document
     print(f"Reading data from {input_path}...")
-    doc_ids = []
-    text_to_embed = []
-    with open(input_path, 'r', encoding='utf-8') as f:
-        for line in f:
-            data = json.loads(line)
-            doc_ids.append(data.get('id'))
-            text_to_embed.append(data.get('text'))
-    
-    print(f"Found {len(text_to_embed)} documents to embed.")
+    offsets = line_offsets(input_path)
+    n_docs = len(offsets)
+
+    print(f"Found {n_docs} documents to embed.")
     print("-" * 50)
     print("Starting the embedding process...")
- 
+
     # --- Embedding Generation ---
     print("-" * 50)
-    print(f"Generating embeddings in batches of size {BATCH_SIZE}...")
+    print(f"Generating embeddings in batches of up to {MAX_TOKENS_PER_BATCH} tokens...")
     print("This may take a while...")
     print("Please wait...")
     print("-" * 50)
 
-    all_embeddings = []
-    for i in tqdm(range(0, len(text_to_embed), BATCH_SIZE)):
-        batch = text_to_embed[i:i+BATCH_SIZE]
-
-        # 3. Tokenize the batch
-        # This converts words to nums and creates attention masks
-        inputs = tokenizer(batch,
-         padding=True, 
-         truncation=True, 
-         return_tensors='pt', 
-         max_length=512
-         )
-
-        # Move inputs to GPU
-        inputs = {k: v.to(device) for k, v in inputs.items()}
-
-        # 4. Pass the tokenized inputs to the model (inference mode).
-        with torch.no_grad():
-            outputs = model(**inputs)
-
-        # 5. Pool the model output to get sentence embeddings
-        batch_embeddings = mean_pooling(outputs, inputs['attention_mask'])
-
-        all_embeddings.append(batch_embeddings.cpu().numpy())
-
-    # Combine the embeddings into a single array
-    embeddings_matrix = np.vstack(all_embeddings)
-    print(f"Embeddings matrix shape: {embeddings_matrix.shape}")
-
-    # --- Saving the Output ---
-    # Package all data into a single dictionary for easy loading in the next step.
-    output_data = {
-        'ids': doc_ids,
-        'embeddings': embeddings_matrix,
-        'documents': text_to_embed  # Assuming 'texts_to_embed' holds your original text
-    }
-
-    # Create models directory if it doesn't exist
-    os.makedirs(os.path.dirname(output_path), exist_ok=True)
-    
-    print(f"Saving packaged data to {output_path}...")
-
-    with open(output_path, 'wb') as f_out:
-        pickle.dump(output_data, f_out)
-    
-    print(f"Data saved to {output_path}")
+    # Write into a temporary version directory that is renamed into place at
+    # the end, so a crash never leaves a matrix and a table that disagree
+    version_tmp = new_version_dir(artifact_dir)
+    matrix_path = str(version_tmp / MATRIX_FILE)
+
+    try:
+        num_workers = max(1, min(num_workers, n_docs))
+        print(f"Encoder backend: {backend}")
+        if num_workers == 1:
+            print(f"Using device: {'cuda' if torch.cuda.is_available() and backend == 'torch' else 'cpu'}")
+            real_tokens, padded_tokens, cache_hits = embed_range(input_path, matrix_path, 0, n_docs,
+                                                                 threads_per_worker, cache_path=cache_path,
+                                                                 backend=backend)
+        else:
+            threads = threads_per_worker or max(1, (os.cpu_count() or 1) // num_workers)
+            print(f"Using {num_workers} CPU workers with {threads} threads each")
+            bounds = np.linspace(0, n_docs, num_workers + 1).astype(int)
+            shard_paths = [f"{matrix_path}.shard{i}.tmp" for i in range(num_workers)]
+
+            # Spawn (not fork) so every worker starts with a fresh PyTorch runtime
+            context = multiprocessing.get_context("spawn")
+            with ProcessPoolExecutor(max_workers=num_workers, mp_context=context) as pool:
+                futures = [
+                    pool.submit(embed_range, input_path, shard_paths[i], int(bounds[i]), int(bounds[i + 1]),
+                                threads, 'cpu', i, cache_path, backend, int(offsets[bounds[i]]))
+                    for i in range(num_workers)
+                ]
+                token_counts = [future.result() for future in futures]
+            real_tokens, padded_tokens, cache_hits = (sum(counts) for counts in zip(*token_counts))
+
+            print("Merging shards...")
+            merge_shards(shard_paths, matrix_path)
+
+        # Store unit-length rows so readers can use the matrix as mapped
+        normalize_rows(matrix_path)
+
+        # 7. Write the ids, titles, urls and texts in the same order as the matrix rows
+        write_documents_table(input_path, version_tmp / TABLE_FILE)
+
+        print(f"Embeddings matrix shape: {np.load(matrix_path, mmap_mode='r').shape}")
+        print(f"Embedding cache: {cache_hits} of {n_docs} documents reused")
+        if padded_tokens:
+            print(f"Padding: {1 - real_tokens / padded_tokens:.1%} of {padded_tokens} encoded tokens")
+
+        # --- Saving the Output ---
+        version_dir = publish(version_tmp, MODEL_NAME, normalized=True, pooling="mean",
+                              max_length=MAX_LENGTH, backend=backend, source=str(input_path))
+    except BaseException:
+        discard(version_tmp)
+        raise
+
+    print(f"Embeddings artifact saved to {version_dir}")
     print("Done!")
     print("-" * 50)
     print("Embedding process completed successfully.")
     print("-" * 50)
+    return version_dir
 
 
 if __name__ == "__main__":
-    create_embeddings(INPUT_PATH, OUTPUT_PATH)
+    create_embeddings(INPUT_PATH)
@@ -0,0 +1,61 @@
+import os
+import sys
+import numpy as np
+import torch
+from transformers import AutoTokenizer, AutoModel
+
+# Add the project root to Python path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.onnx_encoder import export_onnx, cosine_deviation, OnnxEncoder, ONNX_MODEL_DIR
+from src.utils import mean_pooling, iter_jsonl, get_data_path, MODEL_NAME, CLEAN_DATA_FILE
+
+# --- Configuration ---
+QUANTIZE = True
+N_PARITY_DOCS = 256
+MAX_LENGTH = 512
+# Largest acceptable mean cosine deviation from the PyTorch embeddings
+PARITY_TOLERANCE = {'onnx': 1e-5, 'onnx-int8': 2e-2}
+
+print("-" * 60)
+print(f"Exporting {MODEL_NAME} to ONNX...")
+print("-" * 60)
+export_onnx(MODEL_NAME, ONNX_MODEL_DIR, quantize=QUANTIZE)
+print(f"Model saved to '{ONNX_MODEL_DIR}'")
+print("-" * 60)
+
+# --- Parity check against the PyTorch encoder ---
+corpus_path = get_data_path(CLEAN_DATA_FILE)
+texts = ["What is machine learning?", "ridge regression", "how does k-means clustering work"]
+if os.path.exists(corpus_path):
+    for record in iter_jsonl(corpus_path):
+        texts.append(record['text'])
+        if len(texts) == N_PARITY_DOCS:
+            break
+
+tokenizer = AutoTokenizer.from_pretrained(MODEL_NAME)
+model = AutoModel.from_pretrained(MODEL_NAME)
+model.eval()
+
+reference = []
+for i in range(0, len(texts), 32):
+    inputs = tokenizer(texts[i:i + 32], padding=True, truncation=True, return_tensors='pt', max_length=MAX_LENGTH)
+    with torch.no_grad():
+        reference.append(mean_pooling(model(**inputs), inputs['attention_mask']).numpy())
+reference = np.vstack(reference)
+
+print(f"Parity check on {len(texts)} texts (1 - cosine similarity to PyTorch):")
+failed = False
+for backend, quantized in [('onnx', False), ('onnx-int8', True)]:
+    if quantized and not QUANTIZE:
+        continue
+    encoder = OnnxEncoder(ONNX_MODEL_DIR, quantized=quantized)
+    candidate = np.vstack([encoder.encode(texts[i:i + 32], MAX_LENGTH) for i in range(0, len(texts), 32)])
+    deviation = cosine_deviation(reference, candidate)
+    ok = deviation.mean() <= PARITY_TOLERANCE[backend]
+    failed |= not ok
+    print(f"  {backend:<10} mean {deviation.mean():.2e}  max {deviation.max():.2e}  {'OK' if ok else 'ABOVE TOLERANCE'}")
+print("-" * 60)
+
+if failed:
+    sys.exit(1)